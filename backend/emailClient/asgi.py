@@ -2,6 +2,8 @@
 ASGI config for emailClient project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The push connections of /emails/events/, Server-Sent Events and WebSocket, are served
+by the events application of email_api, the other requests by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emailClient.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded by get_asgi_application
+from email_api.push import EVENTS_PATH, events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket' or (scope['type'] == 'http' and scope['path'] == EVENTS_PATH):
+        return await events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
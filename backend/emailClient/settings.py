@@ -72,7 +72,7 @@ WSGI_APPLICATION = 'emailClient.wsgi.application'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user_api.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -81,28 +81,113 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Users authenticated by a JWT are cached by id in every worker, instead of being read on every request.
+# A user saved in another worker, e.g. deactivated, is seen by this one after JWT_USER_CACHE_TTL seconds.
+JWT_USER_CACHE_SIZE = int(os.environ.get('JWT_USER_CACHE_SIZE', 10000))
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', 60))
+# Build the user of a request from the claims of its access token, without the database nor the cache.
+# A user deactivated after signing in keeps access until the token expires (ACCESS_TOKEN_LIFETIME).
+JWT_USER_FROM_CLAIMS = os.environ.get('JWT_USER_FROM_CLAIMS', 'false').lower() in ('1', 'true')
+# Revoked tokens are checked against a Bloom filter of every worker before the database.
+# The filter is sized for JWT_REVOCATION_CAPACITY tokens with a JWT_REVOCATION_ERROR_RATE false positive rate,
+# and a token revoked in another worker is refused by this one after JWT_REVOCATION_REFRESH seconds.
+JWT_REVOCATION_CAPACITY = int(os.environ.get('JWT_REVOCATION_CAPACITY', 100000))
+JWT_REVOCATION_ERROR_RATE = float(os.environ.get('JWT_REVOCATION_ERROR_RATE', 0.001))
+JWT_REVOCATION_REFRESH = int(os.environ.get('JWT_REVOCATION_REFRESH', 10))
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-"""DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Set DB_ENGINE=sqlite to run locally without PostgreSQL
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}"""
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.environ.get('DB_NAME'),
-        'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASSWORD'),
-        'HOST': os.environ.get('DB_HOST'),
-        'PORT': os.environ.get('DB_PORT'),
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME'),
+            'USER': os.environ.get('DB_USER'),
+            'PASSWORD': os.environ.get('DB_PASSWORD'),
+            'HOST': os.environ.get('DB_HOST'),
+            'PORT': os.environ.get('DB_PORT'),
+        }
     }
-}
 
 AUTH_USER_MODEL = 'user_api.User'
 
+# Maximum number of recipients of an email and number of emails inserted per query when sending it
+EMAIL_MAX_RECIPIENTS = int(os.environ.get('EMAIL_MAX_RECIPIENTS', 10000))
+EMAIL_BULK_CREATE_BATCH_SIZE = int(os.environ.get('EMAIL_BULK_CREATE_BATCH_SIZE', 500))
+
+# Number of emails read per database round trip when a list is streamed
+EMAIL_STREAM_CHUNK_SIZE = int(os.environ.get('EMAIL_STREAM_CHUNK_SIZE', 500))
+
+# Email bodies larger than this number of bytes are stored compressed with zlib
+EMAIL_BODY_COMPRESSION_THRESHOLD = int(os.environ.get('EMAIL_BODY_COMPRESSION_THRESHOLD', 1024))
+
+# Folders with more emails than DELETION_JOB_THRESHOLD, and mailboxes, are deleted in the background
+# in batches of DELETION_JOB_BATCH_SIZE rows. With DELETION_JOB_RUNNER='thread' the jobs run in a
+# thread of the web worker, with 'worker' they wait for the run_deletion_jobs command.
+DELETION_JOB_THRESHOLD = int(os.environ.get('DELETION_JOB_THRESHOLD', 1000))
+DELETION_JOB_BATCH_SIZE = int(os.environ.get('DELETION_JOB_BATCH_SIZE', 1000))
+DELETION_JOB_RUNNER = os.environ.get('DELETION_JOB_RUNNER', 'thread')
+
+# Deleted emails stay in the trash this number of days before the purge_deleted_emails command deletes them
+EMAIL_TRASH_RETENTION_DAYS = int(os.environ.get('EMAIL_TRASH_RETENTION_DAYS', 30))
+
+# Serve the email list, email detail, folder emails and folder list reads with async views.
+# Only enable it when the project is served by an ASGI server (emailClient.asgi), e.g. uvicorn.
+EMAIL_ASYNC_READ_VIEWS = os.environ.get('EMAIL_ASYNC_READ_VIEWS', 'false').lower() in ('1', 'true')
+
+# Pub/sub bus of the new email and status changed events pushed by /emails/events/ (ASGI only).
+# The in-memory bus only reaches the clients of the process that made the change, use
+# 'email_api.events.PostgresEventBus' (LISTEN/NOTIFY) when several workers serve the events.
+EMAIL_EVENT_BUS = os.environ.get('EMAIL_EVENT_BUS', 'email_api.events.InMemoryEventBus')
+EMAIL_EVENTS_CHANNEL = os.environ.get('EMAIL_EVENTS_CHANNEL', 'mailbox_events')
+# Events a client can fall behind by before they are dropped for a single resync event
+EMAIL_EVENTS_QUEUE_SIZE = int(os.environ.get('EMAIL_EVENTS_QUEUE_SIZE', 100))
+# Seconds between the keep-alive comments sent to idle clients
+EMAIL_EVENTS_HEARTBEAT = int(os.environ.get('EMAIL_EVENTS_HEARTBEAT', 25))
+
+# Cache of the mailbox list responses, local to every worker by default.
+# Use MAILBOX_CACHE_BACKEND='django.core.cache.backends.redis.RedisCache' and
+# MAILBOX_CACHE_LOCATION='redis://host:6379' to share it (requires the redis package).
+MAILBOX_CACHE_ALIAS = 'mailbox'
+# The hit and miss counters of the mailbox cache, kept apart so that evicting pages does not reset them.
+# With the local memory backend they count the requests of the worker that serves the stats only.
+MAILBOX_CACHE_STATS_ALIAS = 'mailbox-stats'
+MAILBOX_CACHE_BACKEND = os.environ.get(
+    'MAILBOX_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    MAILBOX_CACHE_ALIAS: {
+        'BACKEND': MAILBOX_CACHE_BACKEND,
+        'LOCATION': os.environ.get('MAILBOX_CACHE_LOCATION', 'mailbox'),
+        'TIMEOUT': int(os.environ.get('MAILBOX_CACHE_TIMEOUT', 300)),
+    },
+    MAILBOX_CACHE_STATS_ALIAS: {
+        'BACKEND': MAILBOX_CACHE_BACKEND,
+        'LOCATION': os.environ.get('MAILBOX_CACHE_LOCATION', 'mailbox-stats'),
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'stats',
+    },
+}
+if MAILBOX_CACHE_BACKEND.endswith('LocMemCache'):
+    # The least recently used entries are evicted once the cache is full
+    CACHES[MAILBOX_CACHE_ALIAS]['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('MAILBOX_CACHE_MAX_ENTRIES', 10000)),
+    }
+    # The counters never share the memory of the pages
+    CACHES[MAILBOX_CACHE_STATS_ALIAS]['LOCATION'] = 'mailbox-stats'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
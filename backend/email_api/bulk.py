@@ -0,0 +1,117 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from email_api.counters import apply_counter_delta
+from email_api.events import publish_mailbox_event
+from email_api.models import Email, FolderEmail
+from email_api.threads import apply_thread_deltas
+from email_api.versions import stamp_email_changes
+
+
+def set_emails_status(user, emails, read):
+    """
+    Method to mark many emails received by a user as read or unread in one UPDATE.
+    Parameters:
+        - user: The recipient of the emails, emails of other users are never changed.
+        - emails: Email queryset selecting the emails to change.
+        - read: The new status of the emails.
+    Returns:
+        - The ids of the emails whose status changed.
+    """
+    subquery, params = emails.values("id").query.sql_with_params()
+    table = Email._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET status = %s "
+                f"WHERE id IN ({subquery}) AND recipient_id = %s AND status = %s "
+                f"RETURNING id, priority, sender_id, thread_id",
+                [read, *params, user.id, not read])
+            rows = cursor.fetchall()
+
+        sign = -1 if read else 1
+        delta = Counter()
+        thread_deltas = defaultdict(Counter)
+        for _, priority, sender_id, thread_id in rows:
+            delta["unread"] += sign
+            delta[f"unread_{priority}"] += sign
+            if thread_id is not None:
+                # The user is user_a of the thread when their id is the lower one
+                thread_deltas[thread_id]["unread_a" if user.id <= sender_id else "unread_b"] += sign
+        apply_counter_delta(user.id, delta)
+        apply_thread_deltas(thread_deltas)
+        if rows:
+            stamp_email_changes([(user_id, row[0]) for row in rows for user_id in (user.id, row[2])])
+            publish_mailbox_event([user.id], {"type": "status_changed", "status": read, "count": len(rows)})
+
+    return sorted(row[0] for row in rows)
+
+
+class EmailsNotFound(Exception):
+    def __init__(self, ids):
+        self.ids = ids
+        super().__init__("Emails do not exist: {}".format(", ".join(map(str, ids))))
+
+
+def check_emails_owner(user, ids):
+    """
+    Method to check with one query that the user sent or received every email.
+    Raises:
+        - EmailsNotFound with the ids of the other emails.
+    """
+    owned = set(Email.objects.filter(Q(sender=user) | Q(recipient=user), id__in=ids)
+                .values_list("id", flat=True))
+    missing = sorted(set(ids) - owned)
+    if missing:
+        raise EmailsNotFound(missing)
+
+
+def add_emails_to_folder(user, folder, ids):
+    """
+    Method to file many emails of a user in one of their folders.
+    Emails already in the folder are skipped and not stamped, they did not change.
+    Parameters:
+        - user: The owner of the folder, who must have sent or received every email.
+        - folder: The folder.
+        - ids: The ids of the emails.
+    """
+    with transaction.atomic():
+        check_emails_owner(user, ids)
+        # Only the emails that were not in the folder yet change
+        existing = set(FolderEmail.objects.filter(folder=folder, email_id__in=ids).values_list("email_id", flat=True))
+        added = sorted(set(ids) - existing)
+        if added:
+            FolderEmail.objects.bulk_create(
+                [FolderEmail(folder=folder, email_id=email_id) for email_id in added],
+                ignore_conflicts=True, batch_size=1000)
+            stamp_email_changes([(user.id, email_id) for email_id in added])
+
+
+def remove_emails_from_folder(user, folder, ids):
+    """
+    Method to remove many emails from a folder of a user.
+    Returns:
+        - The number of emails removed from the folder.
+    """
+    with transaction.atomic():
+        # Only the emails that were in the folder changed
+        removed = list(FolderEmail.objects.select_for_update().filter(
+            folder=folder, email_id__in=ids).values_list("email_id", flat=True))
+        if removed:
+            FolderEmail.objects.filter(folder=folder, email_id__in=removed).delete()
+            stamp_email_changes([(user.id, email_id) for email_id in removed])
+    return len(removed)
+
+
+def move_emails_to_folder(user, source, target, ids):
+    """
+    Method to move many emails from a folder of a user to another one of their folders.
+    The emails are added to the target folder even if they were not in the source folder.
+    Returns:
+        - The number of emails removed from the source folder.
+    """
+    with transaction.atomic():
+        add_emails_to_folder(user, target, ids)
+        return remove_emails_from_folder(user, source, ids)
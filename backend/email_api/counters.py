@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from email_api.models import Email, MailboxCounter
+
+PRIORITIES = ("high", "normal", "low")
+
+
+def email_counter_delta(email, sign=1):
+    """
+    Method to compute what an email adds to the counters of its recipient.
+    Parameters:
+        - email: The email, only its status and priority are read.
+        - sign: 1 when the email is added to the mailbox, -1 when it is removed.
+    Returns:
+        - Counter with the delta of every counter field.
+    """
+    delta = Counter(total=sign)
+    if not email.status:
+        delta["unread"] += sign
+        delta[f"unread_{email.priority}"] += sign
+    return delta
+
+
+def apply_counter_delta(user_id, delta):
+    """
+    Method to add a delta to the counters of a user, creating them if needed.
+    Must be called inside the transaction that writes the emails.
+    Parameters:
+        - user_id: The id of the user who owns the counters.
+        - delta: Counter with the delta of every counter field.
+    """
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+    updates = {field: F(field) + value for field, value in delta.items()}
+    if MailboxCounter.objects.filter(user_id=user_id).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            MailboxCounter.objects.create(user_id=user_id, **delta)
+    except IntegrityError:
+        # The counters were created by a concurrent write
+        MailboxCounter.objects.filter(user_id=user_id).update(**updates)
+
+
+def apply_counter_delta_to_users(user_ids, delta):
+    """
+    Method to add the same delta to the counters of many users in a fixed number of queries.
+    Must be called inside the transaction that writes the emails.
+    Parameters:
+        - user_ids: The ids of the users who own the counters.
+        - delta: Counter with the delta of every counter field.
+    """
+    user_ids = list(user_ids)
+    if len(user_ids) == 1:
+        apply_counter_delta(user_ids[0], delta)
+        return
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta or not user_ids:
+        return
+    MailboxCounter.objects.bulk_create(
+        [MailboxCounter(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True, batch_size=1000)
+    MailboxCounter.objects.filter(user_id__in=user_ids).update(
+        **{field: F(field) + value for field, value in delta.items()})
+
+
+def rebuild_counters():
+    """
+    Method to rebuild the counters of every user from the emails table.
+    Returns:
+        - The number of mailboxes rebuilt.
+    """
+    unread = Q(status=False)
+    rows = Email.objects.values("recipient_id").annotate(
+        total=Count("id"),
+        unread=Count("id", filter=unread),
+        **{f"unread_{priority}": Count("id", filter=unread & Q(priority=priority))
+           for priority in PRIORITIES},
+    ).order_by()
+    counters = [MailboxCounter(user_id=row.pop("recipient_id"), **row)
+                for row in rows]
+    with transaction.atomic():
+        MailboxCounter.objects.all().delete()
+        MailboxCounter.objects.bulk_create(counters, batch_size=1000)
+    return len(counters)
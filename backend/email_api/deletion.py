@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from email_api.counters import apply_counter_delta, email_counter_delta
+from email_api.models import DeletionJob, Email, Folder, FolderEmail
+from email_api.threads import remove_emails_from_threads
+from email_api.versions import bump_mailbox_versions, mailbox_changes, stamp_email_changes
+from user_api.models import User
+
+
+def is_large_folder(folder):
+    """
+    Method to check with one bounded query if a folder has too many emails to be deleted in a request.
+    """
+    threshold = settings.DELETION_JOB_THRESHOLD
+    return FolderEmail.objects.filter(folder=folder).values("id")[:threshold + 1].count() > threshold
+
+
+def start_deletion_job(user, kind, target_id=None):
+    """
+    Method to create a deletion job, or reuse the unfinished job deleting the same rows,
+    and hand it to the background runner once the transaction commits.
+    The check and the creation run under a lock on the row of the user.
+    Parameters:
+        - user: The user who asked for the deletion.
+        - kind: DeletionJob.KIND_FOLDER or DeletionJob.KIND_MAILBOX.
+        - target_id: The primary key of the folder.
+    Returns:
+        - The DeletionJob.
+    """
+    with transaction.atomic():
+        # The row of the user is locked until the caller's transaction commits, so two concurrent
+        # requests cannot both miss the unfinished job and create one each
+        User.objects.select_for_update().filter(pk=user.pk).first()
+        job = DeletionJob.objects.filter(
+            user=user, kind=kind, target_id=target_id,
+            status__in=[DeletionJob.STATUS_PENDING, DeletionJob.STATUS_RUNNING]).first()
+        if job is not None:
+            return job
+        job = DeletionJob.objects.create(user=user, kind=kind, target_id=target_id)
+    if settings.DELETION_JOB_RUNNER == "thread":
+        transaction.on_commit(lambda: threading.Thread(
+            target=run_deletion_job_in_thread, args=(job.id,), daemon=True).start())
+    return job
+
+
+def run_deletion_job_in_thread(job_id):
+    try:
+        run_deletion_job(job_id)
+    finally:
+        # The thread has its own database connection
+        connection.close()
+
+
+def run_deletion_job(job_id):
+    """
+    Method to run a deletion job batch by batch, every batch in its own short transaction.
+    A job stopped halfway, e.g. by a restart, resumes where it stopped when it is run again.
+    Parameters:
+        - job_id: The primary key of the DeletionJob.
+    Returns:
+        - The DeletionJob with its final status.
+    """
+    job = DeletionJob.objects.get(id=job_id)
+    if job.status == DeletionJob.STATUS_DONE:
+        return job
+    if job.kind == DeletionJob.KIND_FOLDER:
+        remaining = FolderEmail.objects.filter(folder_id=job.target_id).count()
+        delete_batch = delete_folder_batch
+    else:
+        remaining = Email.all_objects.filter(recipient_id=job.user_id).count()
+        delete_batch = delete_mailbox_batch
+    DeletionJob.objects.filter(id=job.id).update(
+        status=DeletionJob.STATUS_RUNNING, total=F("deleted") + remaining)
+
+    size = settings.DELETION_JOB_BATCH_SIZE
+    try:
+        while delete_batch(job, size) == size:
+            pass
+        if job.kind == DeletionJob.KIND_FOLDER:
+            with transaction.atomic():
+                # Emails filed while the job ran are removed by the cascade
+                email_ids = FolderEmail.objects.filter(
+                    folder_id=job.target_id).values_list("email_id", flat=True)
+                stamp_email_changes([(job.user_id, email_id) for email_id in email_ids])
+                Folder.objects.filter(id=job.target_id, user_id=job.user_id).delete()
+                bump_mailbox_versions([job.user_id])
+        DeletionJob.objects.filter(id=job.id).update(status=DeletionJob.STATUS_DONE)
+    except Exception as e:
+        DeletionJob.objects.filter(id=job.id).update(status=DeletionJob.STATUS_FAILED, error=str(e))
+    job.refresh_from_db()
+    return job
+
+
+def delete_folder_batch(job, size):
+    """
+    Method to remove a batch of emails from the folder of a deletion job.
+    Returns:
+        - The number of emails removed.
+    """
+    with transaction.atomic():
+        rows = list(FolderEmail.objects.filter(folder_id=job.target_id)
+                    .order_by("id").values_list("id", "email_id")[:size])
+        if not rows:
+            return 0
+        deleted, _ = FolderEmail.objects.filter(id__in=[row[0] for row in rows]).delete()
+        DeletionJob.objects.filter(id=job.id).update(deleted=F("deleted") + deleted)
+        stamp_email_changes([(job.user_id, row[1]) for row in rows])
+    return len(rows)
+
+
+def delete_mailbox_batch(job, size):
+    """
+    Method to delete a batch of the emails received by the user of a deletion job, including
+    the emails in the trash, keeping the mailbox counters and the threads up to date.
+    Returns:
+        - The number of emails deleted.
+    """
+    with transaction.atomic():
+        emails = list(Email.all_objects.select_for_update().filter(recipient_id=job.user_id).order_by("id").only(
+            "id", "sender", "recipient", "status", "priority", "thread", "deleted_at")[:size])
+        if not emails:
+            return 0
+        Email.all_objects.filter(id__in=[email.id for email in emails]).delete()
+        # The emails in the trash were already removed from the counters and threads
+        live = [email for email in emails if email.deleted_at is None]
+        delta = Counter()
+        for email in live:
+            delta.update(email_counter_delta(email, -1))
+        apply_counter_delta(job.user_id, delta)
+        remove_emails_from_threads(live)
+        DeletionJob.objects.filter(id=job.id).update(deleted=F("deleted") + len(emails))
+        stamp_email_changes(mailbox_changes(emails), deleted=True)
+    return len(emails)
+
+
+def purge_deleted_emails(before, batch_size, pause=0):
+    """
+    Method to delete for good the emails moved to the trash before a date, in batches,
+    every batch in its own short transaction.
+    The emails in the trash were already removed from the counters and threads.
+    Parameters:
+        - before: The emails moved to the trash before this datetime are deleted.
+        - batch_size: The number of emails deleted per transaction.
+        - pause: The seconds to wait between batches, to leave room for the other queries.
+    Returns:
+        - The number of emails deleted.
+    """
+    purged = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Email.all_objects.filter(deleted_at__lt=before).order_by("deleted_at", "id")
+                        .values_list("id", "sender_id", "recipient_id")[:batch_size])
+            if not rows:
+                break
+            Email.all_objects.filter(id__in=[row[0] for row in rows]).delete()
+            bump_mailbox_versions([user_id for row in rows for user_id in row[1:]])
+        purged += len(rows)
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return purged
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+# Sent instead of the events a slow client missed, the client reloads its lists
+RESYNC_EVENT = {"type": "resync"}
+
+
+class InMemoryEventBus:
+    """
+    InMemoryEventBus class to fan out the mailbox events to the clients connected to this process.
+
+    Every subscriber is a bounded asyncio queue on the event loop of its connection. Events are
+    published from any thread, usually the one that committed the write, and handed to the loops
+    with call_soon_threadsafe, so an idle client only costs its queue.
+    Events published by other processes are not received, see PostgresEventBus.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, user_ids, event):
+        """
+        Method to send an event to the clients of the given users.
+        Parameters:
+            - user_ids: The ids of the users.
+            - event: The JSON serializable event.
+        """
+        self.deliver(user_ids, event)
+
+    def deliver(self, user_ids, event):
+        with self.lock:
+            subscriptions = [subscription for user_id in set(user_ids)
+                             for subscription in self.subscribers.get(user_id, ())]
+        for loop, queue in subscriptions:
+            try:
+                loop.call_soon_threadsafe(put_event, queue, event)
+            except RuntimeError:
+                # The loop of the connection is closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        """
+        Method to receive the events of a user while the context is open.
+        Yields:
+            - The asyncio queue the events are put in.
+        """
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(settings.EMAIL_EVENTS_QUEUE_SIZE))
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+        try:
+            yield subscription[1]
+        finally:
+            with self.lock:
+                self.subscribers[user_id].discard(subscription)
+                if not self.subscribers[user_id]:
+                    del self.subscribers[user_id]
+
+
+def put_event(queue, event):
+    if queue.full():
+        # The client does not keep up, drop the events it missed and ask it to reload
+        while not queue.empty():
+            queue.get_nowait()
+        event = RESYNC_EVENT
+    queue.put_nowait(event)
+
+
+class PostgresEventBus(InMemoryEventBus):
+    """
+    PostgresEventBus class to fan out the mailbox events to the clients of every process
+    with PostgreSQL LISTEN/NOTIFY.
+
+    Events are published with pg_notify on the EMAIL_EVENTS_CHANNEL channel. Every process runs
+    one listener thread with its own connection, started with the first subscriber, which hands
+    the notifications to the subscribers of the process.
+    A Redis bus would work the same way with PUBLISH and a SUBSCRIBE thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    # NOTIFY payloads must stay under 8000 bytes
+    USERS_PER_NOTIFY = 500
+
+    def publish(self, user_ids, event):
+        user_ids = sorted(set(user_ids))
+        with connections["default"].cursor() as cursor:
+            for start in range(0, len(user_ids), self.USERS_PER_NOTIFY):
+                payload = json.dumps({"users": user_ids[start:start + self.USERS_PER_NOTIFY], "event": event})
+                cursor.execute("SELECT pg_notify(%s, %s)", [settings.EMAIL_EVENTS_CHANNEL, payload])
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, daemon=True)
+                self.listener.start()
+        async with super().subscribe(user_id) as queue:
+            yield queue
+
+    def listen(self):
+        database = connections["default"]
+        while True:
+            try:
+                connection = database.get_new_connection(database.get_connection_params())
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{settings.EMAIL_EVENTS_CHANNEL}"')
+                while True:
+                    if select.select([connection], [], [], 30) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        data = json.loads(connection.notifies.pop(0).payload)
+                        self.deliver(data["users"], data["event"])
+            except Exception:
+                # Connect again, the events sent in between are lost
+                time.sleep(1)
+
+
+_event_bus = None
+
+
+def get_event_bus():
+    """
+    Method to get the event bus of the process, an instance of the EMAIL_EVENT_BUS class.
+    """
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = import_string(settings.EMAIL_EVENT_BUS)()
+    return _event_bus
+
+
+def publish_mailbox_event(user_ids, event):
+    """
+    Method to publish an event to the clients of users once the current transaction commits.
+    Parameters:
+        - user_ids: The ids of the users.
+        - event: The JSON serializable event, with its type.
+    """
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: get_event_bus().publish(user_ids, event), robust=True)
+
@@ -0,0 +1,124 @@
+import json
+import re
+import zlib
+from collections import defaultdict
+from email import policy
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.utils import format_datetime
+from io import BytesIO
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from email_api.models import Email, FolderEmail
+
+EXPORT_FORMATS = ("mbox", "ndjson")
+EXPORT_CONTENT_TYPES = {"mbox": "application/mbox", "ndjson": "application/x-ndjson"}
+
+MBOX_POLICY = policy.default.clone(linesep="\n")
+MBOXRD_FROM = re.compile(rb"^(>*From )", re.MULTILINE)
+
+
+def iter_export_chunks(user, after_id=0, chunk_size=None):
+    """
+    Method to read the emails sent or received by a user in chunks, ordered by id.
+    Every chunk is a separate keyset query, so no cursor is held open between chunks
+    and an interrupted export can be resumed after the id of the last exported email.
+    Parameters:
+        - user: The user whose mailbox is exported.
+        - after_id: Only export the emails with a greater id.
+        - chunk_size: The number of emails per chunk, EMAIL_STREAM_CHUNK_SIZE by default.
+    Returns:
+        - Generator of lists of (email, folder names) tuples.
+    """
+    chunk_size = chunk_size or settings.EMAIL_STREAM_CHUNK_SIZE
+    emails = Email.objects.select_related("sender", "recipient").filter(
+        Q(recipient=user) | Q(sender=user)).order_by("id")
+    while True:
+        chunk = list(emails.filter(id__gt=after_id)[:chunk_size])
+        if not chunk:
+            return
+        folders = defaultdict(list)
+        for email_id, name in FolderEmail.objects.filter(
+                email_id__in=[email.id for email in chunk], folder__user=user
+        ).order_by("folder__name").values_list("email_id", "folder__name"):
+            folders[email_id].append(name)
+        yield [(email, folders[email.id]) for email in chunk]
+        after_id = chunk[-1].id
+
+
+def render_ndjson(email, folders):
+    record = {
+        "id": email.id,
+        "sender": email.sender.email,
+        "recipient": email.recipient.email,
+        "subject": email.subject,
+        "body": email.body,
+        "timestamp": email.timestamp.isoformat(),
+        "status": email.status,
+        "priority": email.priority,
+        "folders": folders,
+    }
+    return json.dumps(record, cls=DjangoJSONEncoder).encode() + b"\n"
+
+
+def render_mbox(email, folders):
+    message = EmailMessage(policy=MBOX_POLICY)
+    message["From"] = email.sender.email
+    message["To"] = email.recipient.email
+    message["Subject"] = " ".join(email.subject.splitlines())
+    message["Date"] = format_datetime(email.timestamp)
+    message["Status"] = "RO" if email.status else "O"
+    message["X-Priority"] = email.priority
+    message["X-Email-Id"] = str(email.id)
+    if folders:
+        message["X-Folders"] = ", ".join(" ".join(name.splitlines()) for name in folders)
+    message.set_content(email.body)
+    output = BytesIO()
+    output.write(
+        f"From {email.sender.email} {email.timestamp.strftime('%a %b %d %H:%M:%S %Y')}\n".encode())
+    body = BytesIO()
+    BytesGenerator(body, mangle_from_=False, policy=MBOX_POLICY).flatten(message)
+    # mboxrd: lines starting with "From " or ">From ", ">>From "... get one more ">", so they
+    # do not split the mbox and the import removes exactly one
+    output.write(MBOXRD_FROM.sub(rb">\1", body.getvalue()))
+    output.write(b"\n")
+    return output.getvalue()
+
+
+RENDERERS = {"mbox": render_mbox, "ndjson": render_ndjson}
+
+
+def iter_export_blocks(user, export_format, after_id=0, chunk_size=None, compress=False):
+    """
+    Method to export the mailbox of a user as mbox or NDJSON, one block of bytes per chunk.
+    Parameters:
+        - user: The user whose mailbox is exported.
+        - export_format: mbox or ndjson.
+        - after_id: Resume the export after the email with this id.
+        - chunk_size: The number of emails read per query.
+        - compress: Compress the output with gzip.
+    Returns:
+        - Generator of (data, number of emails, id of the last email) tuples. Compressed blocks
+          are flushed at every chunk so an interrupted download can still be decompressed.
+    """
+    render = RENDERERS[export_format]
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    for chunk in iter_export_chunks(user, after_id, chunk_size):
+        data = b"".join(render(email, folders) for email, folders in chunk)
+        if compressor:
+            data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        after_id = chunk[-1][0].id
+        yield data, len(chunk), after_id
+    if compressor:
+        yield compressor.flush(), 0, after_id
+
+
+def export_mailbox(user, export_format, after_id=0, chunk_size=None, compress=False):
+    """
+    Method to export the mailbox of a user as a stream of bytes, see iter_export_blocks.
+    """
+    for data, _, _ in iter_export_blocks(user, export_format, after_id, chunk_size, compress):
+        yield data
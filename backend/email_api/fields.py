@@ -0,0 +1,91 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# The first byte of a stored value tells how the rest is encoded
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+
+def compress_text(text):
+    """
+    Method to encode a text for storage, compressed with zlib when it is larger than
+    EMAIL_BODY_COMPRESSION_THRESHOLD bytes and compressing it saves space.
+    Parameters:
+        - text: The text to store.
+    Returns:
+        - The stored bytes.
+    """
+    data = text.encode()
+    if len(data) > settings.EMAIL_BODY_COMPRESSION_THRESHOLD:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return ZLIB + compressed
+    return RAW + data
+
+
+def decompress_text(value):
+    """
+    Method to decode the bytes written by compress_text.
+    Parameters:
+        - value: The stored bytes.
+    Returns:
+        - The text.
+    """
+    value = bytes(value)
+    if value[:1] == ZLIB:
+        return zlib.decompress(value[1:]).decode()
+    return value[1:].decode()
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """
+    CompressedTextAttribute class to decompress the stored value the first time it is read.
+    Instances loaded from the database keep the stored bytes until the field is accessed.
+    It defines __set__ so it is called even when the value is in the instance __dict__.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = instance.__dict__[self.field.attname] = decompress_text(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    CompressedTextField class to store a text in a binary column, compressed above a size threshold.
+    The field reads and writes str like a TextField. The column cannot be searched in SQL,
+    and values()/values_list() return the stored bytes, to be read with decompress_text.
+    """
+
+    descriptor_class = CompressedTextAttribute
+
+    def get_internal_type(self):
+        return "BinaryField"
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        # Decompressed lazily by CompressedTextAttribute
+        if isinstance(value, memoryview):
+            return bytes(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -0,0 +1,48 @@
+EMAIL_FIELDS = ("id", "sender", "recipient", "subject", "snippet", "body",
+                "timestamp", "status", "priority", "thread", "in_reply_to")
+# The list views return the snippet instead of the body unless the body is asked for
+LIST_FIELDS = ("id", "sender", "recipient", "subject", "snippet", "timestamp", "status", "priority",
+               "thread", "in_reply_to")
+RELATED_FIELDS = ("sender", "recipient")
+
+
+class InvalidFields(Exception):
+    pass
+
+
+def get_list_fields(request):
+    """
+    Method to read the fields asked for with the fields query param, e.g. fields=id,subject.
+    Parameters:
+        - request: The request object.
+    Returns:
+        - The tuple of fields to return, LIST_FIELDS when the param is missing.
+    """
+    value = request.query_params.get("fields")
+    if value is None:
+        return LIST_FIELDS
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in EMAIL_FIELDS]
+    if unknown:
+        raise InvalidFields("Unknown fields: {}".format(", ".join(unknown)))
+    if not fields:
+        raise InvalidFields("At least one field is required")
+    return fields
+
+
+def only_fields(emails, fields):
+    """
+    Method to load only the columns needed by the given fields.
+    The id and timestamp are always loaded, they are used to order and paginate the emails.
+    Parameters:
+        - emails: The Email queryset.
+        - fields: The fields that are serialized.
+    Returns:
+        - The queryset with the sender and recipient joined only if they are serialized.
+    """
+    related = [name for name in RELATED_FIELDS if name in fields]
+    columns = {"id", "timestamp", *(name for name in fields if name not in related)}
+    columns.update(f"{name}__email" for name in related)
+    if related:
+        emails = emails.select_related(*related)
+    return emails.only(*columns)
@@ -0,0 +1,60 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from email_api.models import Email
+
+PRIORITIES = [value for value, _ in Email._meta.get_field("priority").choices]
+
+
+class InvalidFilters(Exception):
+    pass
+
+
+def parse_timestamp(value):
+    try:
+        timestamp = parse_datetime(value)
+        if timestamp is None:
+            date = parse_date(value)
+            if date is not None:
+                timestamp = parse_datetime(f"{date.isoformat()}T00:00:00Z")
+    except ValueError:
+        # Well formed, but not a real date, e.g. 2024-13-01
+        raise InvalidFilters(f"Invalid date '{value}'")
+    if timestamp is None:
+        raise InvalidFilters(f"Invalid date '{value}'")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+def filter_emails(emails, request):
+    """
+    Method to apply the filters of the email lists from the query params.
+    Parameters:
+        - emails: The Email queryset.
+        - request: The request object with the optional query params:
+            - subject: Emails whose subject contains this text
+            - status: true for read emails, false for unread emails
+            - priority: high, normal or low
+            - after, before: Emails sent at or after, and before, a date or datetime
+    Returns:
+        - The filtered queryset.
+    Raises:
+        - InvalidFilters if a filter value is not valid.
+    """
+    params = request.query_params
+    if params.get("subject"):
+        emails = emails.filter(subject__icontains=params["subject"])
+    if "status" in params:
+        if params["status"] not in ("true", "false"):
+            raise InvalidFilters("Status must be true or false")
+        emails = emails.filter(status=params["status"] == "true")
+    if "priority" in params:
+        if params["priority"] not in PRIORITIES:
+            raise InvalidFilters("Priority must be one of {}".format(", ".join(PRIORITIES)))
+        emails = emails.filter(priority=params["priority"])
+    if "after" in params:
+        emails = emails.filter(timestamp__gte=parse_timestamp(params["after"]))
+    if "before" in params:
+        emails = emails.filter(timestamp__lt=parse_timestamp(params["before"]))
+    return emails
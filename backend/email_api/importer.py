@@ -0,0 +1,266 @@
+import datetime
+import json
+import time
+from collections import Counter, defaultdict
+from email import policy
+from email.parser import BytesParser
+from email.utils import parseaddr, parsedate_to_datetime
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from email_api.counters import apply_counter_delta, email_counter_delta
+from email_api.models import Email, Folder, FolderEmail
+from email_api.search import update_search_index
+from email_api.threads import add_emails_to_threads, assign_threads
+from email_api.versions import mailbox_changes, stamp_email_changes
+from user_api.models import User
+
+PRIORITIES = ("high", "normal", "low")
+SUBJECT_MAX_LENGTH = Email._meta.get_field("subject").max_length
+
+
+def parse_timestamp(value):
+    """
+    Method to parse the timestamp of an NDJSON record, read in the current timezone when it has none.
+    Returns:
+        - The aware datetime, or None if the value is not a datetime.
+    """
+    try:
+        timestamp = parse_datetime(value)
+    except ValueError:
+        # Well formed, but not a real date, e.g. 2024-13-01
+        return None
+    if timestamp is not None and timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+class InvalidRecord(Exception):
+    """
+    Raised when a record of an archive cannot be imported.
+    """
+
+
+def ndjson_row_to_record(line):
+    """
+    Method to convert a line of an NDJSON archive to an email record.
+    Raises:
+        - ValueError, KeyError or TypeError if the line is not valid JSON, lacks the sender or the
+          recipient, or has a value of the wrong type. InvalidRecord if the timestamp is not valid.
+    """
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise TypeError("the record is not an object")
+    timestamp = None
+    if row.get("timestamp"):
+        if not isinstance(row["timestamp"], str):
+            raise TypeError("timestamp must be a string")
+        timestamp = parse_timestamp(row["timestamp"])
+        if timestamp is None:
+            raise InvalidRecord(f"invalid timestamp '{row['timestamp']}'")
+    record = {
+        "sender": row["sender"],
+        "recipient": row["recipient"],
+        "subject": row.get("subject", ""),
+        "body": row.get("body", ""),
+        "timestamp": timestamp,
+        "status": bool(row.get("status", False)),
+        "priority": row.get("priority", "normal"),
+        "folders": row.get("folders", []),
+    }
+    for field in ("sender", "recipient", "subject", "body", "priority"):
+        if not isinstance(record[field], str):
+            raise TypeError(f"{field} must be a string")
+    if not isinstance(record["folders"], list) or not all(isinstance(name, str) for name in record["folders"]):
+        raise TypeError("folders must be a list of strings")
+    return record
+
+
+def parse_ndjson(stream):
+    """
+    Method to parse an NDJSON archive, as written by the export, one email per line.
+    Parameters:
+        - stream: Binary file object.
+    Returns:
+        - Generator of email records, and of invalid records with only an error for the
+          lines that cannot be imported, so that one bad line does not stop the import.
+    """
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = ndjson_row_to_record(line)
+        except json.JSONDecodeError as e:
+            record = {"error": f"line {number}: invalid JSON, {e.msg}"}
+        except KeyError as e:
+            record = {"error": f"line {number}: missing {e.args[0]}"}
+        except (InvalidRecord, TypeError, ValueError) as e:
+            record = {"error": f"line {number}: {e}"}
+        yield record
+
+
+def parse_mbox(stream):
+    """
+    Method to parse an mbox archive without loading it, one message at a time.
+    Parameters:
+        - stream: Binary file object.
+    Returns:
+        - Generator of email records.
+    """
+    lines = []
+    for line in stream:
+        if line.startswith(b"From ") and (not lines or lines[-1] in (b"\n", b"\r\n")):
+            if lines:
+                yield mbox_message_to_record(lines)
+            lines = []
+            continue
+        # Undo the mboxrd escaping of the export, one ">" less on ">From ", ">>From "...
+        if line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+            line = line[1:]
+        lines.append(line)
+    if lines:
+        yield mbox_message_to_record(lines)
+
+
+def mbox_message_to_record(lines):
+    message = BytesParser(policy=policy.default).parsebytes(b"".join(lines))
+    body = message.get_body(preferencelist=("plain", "html"))
+    try:
+        timestamp = parsedate_to_datetime(message["Date"]) if message["Date"] else None
+    except (TypeError, ValueError):
+        timestamp = None
+    if timestamp is not None and timezone.is_naive(timestamp):
+        # Dates with a -0000 offset have no timezone
+        timestamp = timezone.make_aware(timestamp, datetime.timezone.utc)
+    folders = message.get("X-Folders")
+    return {
+        "sender": parseaddr(str(message.get("From", "")))[1],
+        "recipient": parseaddr(str(message.get("To", "")))[1],
+        "subject": str(message.get("Subject", "")),
+        "body": body.get_content().rstrip("\n") if body is not None else "",
+        "timestamp": timestamp,
+        "status": "R" in str(message.get("Status", "")),
+        "priority": str(message.get("X-Priority", "normal")),
+        "folders": [name.strip() for name in str(folders).split(",")] if folders else [],
+    }
+
+
+PARSERS = {"mbox": parse_mbox, "ndjson": parse_ndjson}
+
+
+class EmailImporter:
+    """
+    EmailImporter class to insert parsed email records in batches.
+
+    Addresses are resolved with one query per batch for the addresses not seen yet and
+    cached for the rest of the import. Every batch is written in its own transaction with
+    bulk_create, together with its threads, folder memberships, search index and mailbox counters.
+    Folder memberships are only imported for the folders of the owner, created if needed,
+    and for the emails the owner sent or received.
+    Invalid records are skipped and passed to on_invalid, e.g. to report them.
+    """
+
+    def __init__(self, batch_size, owner=None, on_invalid=None):
+        self.batch_size = batch_size
+        self.owner = owner
+        self.on_invalid = on_invalid
+        self.user_ids = {}
+        self.folder_ids = {}
+        self.imported = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.imported / elapsed if elapsed else 0.0
+
+    def run(self, records, progress=None):
+        """
+        Method to import every record.
+        Parameters:
+            - records: Iterable of email records.
+            - progress: Optional callable called with the importer after every batch.
+        """
+        batch = []
+        for record in records:
+            if "error" in record:
+                self.skipped += 1
+                if self.on_invalid:
+                    self.on_invalid(record)
+                continue
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self.import_batch(batch)
+            if progress:
+                progress(self)
+
+    def resolve_users(self, batch):
+        addresses = {record[field] for record in batch for field in ("sender", "recipient")}
+        missing = addresses.difference(self.user_ids)
+        if missing:
+            found = dict(User.objects.filter(email__in=missing).values_list("email", "id"))
+            for address in missing:
+                self.user_ids[address] = found.get(address)
+
+    def resolve_folders(self, names):
+        missing = set(names).difference(self.folder_ids)
+        if not missing:
+            return
+        for folder in Folder.objects.filter(user=self.owner, name__in=missing):
+            self.folder_ids.setdefault(folder.name, folder.id)
+        created = Folder.objects.bulk_create(
+            [Folder(user=self.owner, name=name) for name in missing.difference(self.folder_ids)])
+        for folder in created:
+            self.folder_ids[folder.name] = folder.id
+
+    def import_batch(self, batch):
+        self.resolve_users(batch)
+        emails = []
+        folders = []
+        for record in batch:
+            sender_id = self.user_ids.get(record["sender"])
+            recipient_id = self.user_ids.get(record["recipient"])
+            if sender_id is None or recipient_id is None:
+                self.skipped += 1
+                continue
+            emails.append(Email(
+                sender_id=sender_id,
+                recipient_id=recipient_id,
+                subject=record["subject"][:SUBJECT_MAX_LENGTH],
+                body=record["body"],
+                timestamp=record["timestamp"] or timezone.now(),
+                status=record["status"],
+                priority=record["priority"] if record["priority"] in PRIORITIES else "normal",
+            ))
+            # The folders of the owner only hold the emails the owner sent or received
+            owns = self.owner is not None and self.owner.id in (sender_id, recipient_id)
+            folders.append(record["folders"] if owns else [])
+
+        with transaction.atomic():
+            self.resolve_folders({name for names in folders for name in names})
+            assign_threads(emails)
+            emails = Email.objects.bulk_create(emails)
+            add_emails_to_threads(emails)
+            FolderEmail.objects.bulk_create(
+                [FolderEmail(email_id=email.id, folder_id=self.folder_ids[name])
+                 for email, names in zip(emails, folders) for name in names],
+                ignore_conflicts=True)
+            update_search_index(emails)
+
+            deltas = defaultdict(Counter)
+            for email in emails:
+                deltas[email.recipient_id].update(email_counter_delta(email))
+            for user_id, delta in deltas.items():
+                apply_counter_delta(user_id, delta)
+            stamp_email_changes(mailbox_changes(emails) + [
+                (self.owner.id, email.id) for email, names in zip(emails, folders) if names])
+
+        self.imported += len(emails)
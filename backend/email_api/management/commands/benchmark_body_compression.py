@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from email_api.fields import ZLIB, decompress_text
+from email_api.models import Email
+
+
+class Command(BaseCommand):
+    """
+    Command to measure the storage saved by the compressed email bodies and the read latency they add.
+    """
+
+    help = ("Read the stored email bodies and report their raw and stored sizes "
+            "and the time spent decompressing them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Only read the first emails, by id")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="The number of bodies read per query")
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        emails = compressed = raw_size = stored_size = 0
+        decompress_time = decode_time = 0.0
+        last_id = 0
+        while limit is None or emails < limit:
+            size = options["batch_size"] if limit is None else min(options["batch_size"], limit - emails)
+            # values_list returns the stored bytes, without decompressing them
+            rows = list(Email.objects.filter(id__gt=last_id).order_by("id")
+                        .values_list("id", "body")[:size])
+            if not rows:
+                break
+            for _, value in rows:
+                started = time.perf_counter()
+                text = decompress_text(value)
+                elapsed = time.perf_counter() - started
+                data = text.encode()
+                if value[:1] == ZLIB:
+                    compressed += 1
+                    decompress_time += elapsed
+                    # The time the same body takes to read when it is stored raw
+                    started = time.perf_counter()
+                    data.decode()
+                    decode_time += time.perf_counter() - started
+                raw_size += len(data)
+                stored_size += len(value)
+            emails += len(rows)
+            last_id = rows[-1][0]
+
+        saved = raw_size - stored_size
+        self.stdout.write(f"Emails: {emails}, compressed: {compressed}")
+        self.stdout.write(
+            f"Body size: raw {raw_size} bytes, stored {stored_size} bytes, "
+            f"saved {saved} bytes ({saved / raw_size * 100 if raw_size else 0:.1f}%)")
+        if compressed:
+            added = (decompress_time - decode_time) / compressed * 1e6
+            self.stdout.write(
+                f"Added read latency: {added:.1f} us per compressed body, "
+                f"{(decompress_time - decode_time) * 1e3:.1f} ms in total")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_total_relation_size(%s)", [Email._meta.db_table])
+                self.stdout.write(f"Table size with indexes and TOAST: {cursor.fetchone()[0]} bytes")
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from email_api.models import Folder
+from user_api.models import User
+
+
+class Command(BaseCommand):
+    """
+    Command to load test the email read endpoints of running servers, e.g. the same project
+    served by gunicorn (WSGI) and by uvicorn (ASGI, with EMAIL_ASYNC_READ_VIEWS=true):
+
+        gunicorn emailClient.wsgi:application -w 4 -b 127.0.0.1:8000
+        EMAIL_ASYNC_READ_VIEWS=true uvicorn emailClient.asgi:application --workers 4 --port 8001
+        python manage.py benchmark_read_views --user test@example.com \
+            --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001
+    """
+
+    help = ("Send concurrent GET requests to the email read endpoints of every target server "
+            "and report the requests per second and the p50 and p99 latencies.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="The email of the user the requests are sent as")
+        parser.add_argument("--target", action="append", required=True,
+                            help="name=base URL of a running server, repeat it to compare servers")
+        parser.add_argument("--path", action="append",
+                            help="The paths requested in turn, the hot read endpoints by default")
+        parser.add_argument("--concurrency", type=int, default=200, help="The number of concurrent clients")
+        parser.add_argument("--requests", type=int, default=5000, help="The number of requests per target")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options["user"]).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} does not exist")
+        token = str(RefreshToken.for_user(user).access_token)
+        paths = options["path"] or self.default_paths(user)
+
+        self.stdout.write(f"{'target':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for target in options["target"]:
+            name, _, url = target.partition("=")
+            if not url:
+                raise CommandError(f"Invalid target {target}, expected name=url")
+            latencies, errors, elapsed = asyncio.run(
+                run_load(url, paths, token, options["concurrency"], options["requests"]))
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<10}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 50) * 1e3:>10.1f}{percentile(latencies, 99) * 1e3:>10.1f}")
+
+    def default_paths(self, user):
+        paths = ["/emails/list/all/", "/folders/"]
+        folder = Folder.objects.filter(user=user).order_by("id").first()
+        if folder is not None:
+            paths.append(f"/emails/folders/{folder.id}/")
+        return paths
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def run_load(url, paths, token, concurrency, requests):
+    """
+    Method to send the requests with a fixed number of concurrent keep-alive connections.
+    Returns:
+        - The latency of every request in seconds, the number of failed requests and the total time.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    headers = (f"Host: {parts.netloc}\r\nAuthorization: Bearer {token}\r\n"
+               f"Accept: application/json\r\nConnection: keep-alive\r\n\r\n")
+    latencies = []
+    errors = 0
+    sent = 0
+
+    async def client():
+        nonlocal errors, sent
+        connection = None
+        while sent < requests:
+            path = paths[sent % len(paths)]
+            sent += 1
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection(host, port)
+                reader, writer = connection
+                writer.write(f"GET {path} HTTP/1.1\r\n{headers}".encode())
+                await writer.drain()
+                status, keep_alive = await read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status, keep_alive = 0, False
+            latencies.append(time.perf_counter() - started)
+            if not 200 <= status < 400:
+                errors += 1
+            if not keep_alive and connection is not None:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def read_response(reader):
+    """
+    Method to read an HTTP/1.1 response.
+    Returns:
+        - The status code and whether the connection can be reused.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ValueError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection") != "close"
@@ -0,0 +1,58 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from email_api.export import EXPORT_FORMATS, iter_export_blocks
+from user_api.models import User
+
+
+class Command(BaseCommand):
+    """
+    Command to export the mailbox of a user as mbox or NDJSON.
+    """
+
+    help = "Export every email sent or received by a user, with its folders, as mbox or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="The email address of the user")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="mbox")
+        parser.add_argument("--output", help="The output file, stdout by default")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument("--after", type=int, default=0,
+                            help="Resume an interrupted export after the email with this id, "
+                                 "the output file is appended to")
+        parser.add_argument("--chunk-size", type=int, help="The number of emails read per query")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options["email"])
+        except User.DoesNotExist:
+            raise CommandError(f"User with email '{options['email']}' does not exist")
+
+        mode = "ab" if options["after"] else "wb"
+        stream = open(options["output"], mode) if options["output"] else sys.stdout.buffer
+        # A resumed export appends a new gzip member, which gzip readers concatenate
+        output = gzip.GzipFile(fileobj=stream, mode=mode) if options["gzip"] else stream
+
+        last_id = options["after"]
+        count = 0
+        try:
+            for data, emails, block_last_id in iter_export_blocks(
+                    user, options["format"], last_id, options["chunk_size"]):
+                output.write(data)
+                output.flush()
+                # The resume point only moves once the whole block is written
+                count += emails
+                last_id = block_last_id
+        except KeyboardInterrupt:
+            raise CommandError(
+                f"Export interrupted after {count} emails, resume with --after {last_id}")
+        finally:
+            if output is not stream:
+                output.close()
+            if options["output"]:
+                stream.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {count} emails, the last exported id is {last_id}"))
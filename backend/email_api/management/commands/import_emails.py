@@ -0,0 +1,62 @@
+import gzip
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from email_api.importer import PARSERS, EmailImporter
+from user_api.models import User
+
+
+class Command(BaseCommand):
+    """
+    Command to import emails from an mbox or NDJSON archive.
+    """
+
+    help = ("Import emails from an mbox or NDJSON archive, keeping their original timestamps. "
+            "Emails whose sender or recipient is not a user, or whose timestamp is invalid, are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The archive to import, - for stdin, .gz files are decompressed")
+        parser.add_argument("--format", choices=PARSERS,
+                            help="The archive format, guessed from the file name by default")
+        parser.add_argument("--batch-size", type=int, default=settings.EMAIL_BULK_CREATE_BATCH_SIZE,
+                            help="The number of emails inserted per query")
+        parser.add_argument("--folders-owner",
+                            help="The email address of the user whose folders receive the emails "
+                                 "the user sent or received")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        export_format = options["format"] or ("mbox" if ".mbox" in path else "ndjson")
+
+        owner = None
+        if options["folders_owner"]:
+            try:
+                owner = User.objects.get(email=options["folders_owner"])
+            except User.DoesNotExist:
+                raise CommandError(f"User with email '{options['folders_owner']}' does not exist")
+
+        if path == "-":
+            stream = sys.stdin.buffer
+        elif path.endswith(".gz"):
+            stream = gzip.open(path, "rb")
+        else:
+            stream = open(path, "rb")
+
+        importer = EmailImporter(options["batch_size"], owner, on_invalid=self.report_invalid)
+        try:
+            importer.run(PARSERS[export_format](stream), progress=self.report)
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} emails, skipped {importer.skipped}, "
+            f"{importer.rate:.0f} rows/s"))
+
+    def report(self, importer):
+        self.stderr.write(f"{importer.imported} emails imported, {importer.rate:.0f} rows/s")
+
+    def report_invalid(self, record):
+        self.stderr.write(f"Skipped {record['error']}")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from email_api.deletion import purge_deleted_emails
+
+
+class Command(BaseCommand):
+    """
+    Command to delete for good the emails that stayed in the trash longer than the retention window.
+    """
+
+    help = ("Delete the emails moved to the trash more than EMAIL_TRASH_RETENTION_DAYS days ago, "
+            "in batches. Meant to be scheduled off-peak, e.g. nightly from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.EMAIL_TRASH_RETENTION_DAYS,
+                            help="Only delete the emails in the trash for more than this number of days")
+        parser.add_argument("--batch-size", type=int, default=settings.DELETION_JOB_BATCH_SIZE,
+                            help="The number of emails deleted per transaction")
+        parser.add_argument("--pause", type=float, default=0,
+                            help="The seconds to wait between batches")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        purged = purge_deleted_emails(before, options["batch_size"], options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} emails from the trash"))
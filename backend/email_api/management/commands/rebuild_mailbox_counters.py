@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from email_api.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    """
+    Command to rebuild the mailbox counters of every user from scratch.
+    """
+
+    help = "Rebuild the total and unread mailbox counters of every user from the emails table."
+
+    def handle(self, *args, **options):
+        count = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the mailbox counters of {count} users"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from email_api.deletion import run_deletion_job
+from email_api.models import DeletionJob
+
+
+class Command(BaseCommand):
+    """
+    Command to run the background deletions that are not finished.
+    """
+
+    help = ("Run the pending deletion jobs, and resume the running ones stopped by a restart. "
+            "Needed when DELETION_JOB_RUNNER is 'worker'.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Only run this deletion job")
+        parser.add_argument("--retry-failed", action="store_true", help="Also run the failed jobs again")
+
+    def handle(self, *args, **options):
+        statuses = [DeletionJob.STATUS_PENDING, DeletionJob.STATUS_RUNNING]
+        if options["retry_failed"]:
+            statuses.append(DeletionJob.STATUS_FAILED)
+        jobs = DeletionJob.objects.filter(status__in=statuses).order_by("id")
+        if options["job"] is not None:
+            jobs = jobs.filter(id=options["job"])
+        for job_id in jobs.values_list("id", flat=True):
+            job = run_deletion_job(job_id)
+            self.stdout.write(f"{job}")
+        self.stdout.write(self.style.SUCCESS("Deletion jobs finished"))
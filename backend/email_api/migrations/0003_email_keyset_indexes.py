@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0002_folder_folderemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(fields=['recipient', 'timestamp', 'id'], name='email_api_e_recipie_9e9c19_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(fields=['sender', 'timestamp', 'id'], name='email_api_e_sender__bc262f_idx'),
+        ),
+    ]
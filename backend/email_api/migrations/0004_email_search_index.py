@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the full-text search index of the database in use and fill it with the existing emails.
+    """
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX email_api_email_search_vector_gin "
+            "ON email_api_email USING gin (search_vector)")
+        schema_editor.execute(
+            "UPDATE email_api_email SET search_vector = "
+            "setweight(to_tsvector(COALESCE(subject, '')), 'A') || "
+            "setweight(to_tsvector(COALESCE(body, '')), 'B')")
+    elif schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE email_api_email_fts USING fts5(subject, body)")
+        schema_editor.execute(
+            "INSERT INTO email_api_email_fts (rowid, subject, body) "
+            "SELECT id, subject, body FROM email_api_email")
+        schema_editor.execute(
+            "CREATE TRIGGER email_api_email_fts_delete AFTER DELETE ON email_api_email "
+            "BEGIN DELETE FROM email_api_email_fts WHERE rowid = old.id; END")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS email_api_email_search_vector_gin")
+    elif schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "DROP TRIGGER IF EXISTS email_api_email_fts_delete")
+        schema_editor.execute("DROP TABLE IF EXISTS email_api_email_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0003_email_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
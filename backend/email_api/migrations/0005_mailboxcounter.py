@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_mailbox_counters(apps, schema_editor):
+    """
+    Count the emails already received by every user.
+    """
+    Email = apps.get_model('email_api', 'Email')
+    MailboxCounter = apps.get_model('email_api', 'MailboxCounter')
+    unread = Q(status=False)
+    rows = Email.objects.values('recipient_id').annotate(
+        total=Count('id'),
+        unread=Count('id', filter=unread),
+        unread_high=Count('id', filter=unread & Q(priority='high')),
+        unread_normal=Count('id', filter=unread & Q(priority='normal')),
+        unread_low=Count('id', filter=unread & Q(priority='low')),
+    ).order_by()
+    MailboxCounter.objects.bulk_create(
+        [MailboxCounter(user_id=row.pop('recipient_id'), **row) for row in rows],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0004_email_search_index'),
+        ('user_api', '0002_alter_user_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailboxCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='mailbox_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.IntegerField(default=0)),
+                ('unread', models.IntegerField(default=0)),
+                ('unread_high', models.IntegerField(default=0)),
+                ('unread_normal', models.IntegerField(default=0)),
+                ('unread_low', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_mailbox_counters, migrations.RunPython.noop),
+    ]
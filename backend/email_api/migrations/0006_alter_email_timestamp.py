@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0005_mailboxcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='email',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
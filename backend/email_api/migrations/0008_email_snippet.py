@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+from email_api.models.email import make_snippet
+
+
+def fill_snippets(apps, schema_editor):
+    """
+    Compute the snippet of the existing emails, one batch of ids at a time.
+    """
+    Email = apps.get_model('email_api', 'Email')
+    last_id = 0
+    while True:
+        emails = list(Email.objects.filter(id__gt=last_id).order_by('id').only('id', 'body')[:1000])
+        if not emails:
+            return
+        for email in emails:
+            email.snippet = make_snippet(email.body)
+        Email.objects.bulk_update(emails, ['snippet'])
+        last_id = emails[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0007_mailboxversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='snippet',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_snippets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:49
+
+import email_api.fields
+from django.db import migrations, models
+
+from email_api.fields import compress_text, decompress_text
+
+BATCH_SIZE = 1000
+
+
+def convert_bodies(apps, schema_editor, source, target, convert):
+    Email = apps.get_model('email_api', 'Email')
+    last_id = 0
+    while True:
+        emails = list(Email.objects.filter(id__gt=last_id).order_by('id').only('id', source)[:BATCH_SIZE])
+        if not emails:
+            return
+        for email in emails:
+            setattr(email, target, convert(getattr(email, source)))
+        Email.objects.bulk_update(emails, [target])
+        last_id = emails[-1].id
+
+
+def compress_bodies(apps, schema_editor):
+    """
+    Copy the existing bodies to the binary column, one batch of ids at a time.
+    """
+    convert_bodies(apps, schema_editor, 'body', 'body_data', compress_text)
+
+
+def decompress_bodies(apps, schema_editor):
+    convert_bodies(apps, schema_editor, 'body_data', 'body', decompress_text)
+
+
+def restore_search_delete_trigger(apps, schema_editor):
+    """
+    SQLite drops the triggers of a table when the table is rebuilt by a migration,
+    restore the trigger that keeps the FTS5 table in sync with the deleted emails.
+    """
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "DELETE FROM email_api_email_fts WHERE rowid NOT IN (SELECT id FROM email_api_email)")
+        schema_editor.execute(
+            "CREATE TRIGGER IF NOT EXISTS email_api_email_fts_delete AFTER DELETE ON email_api_email "
+            "BEGIN DELETE FROM email_api_email_fts WHERE rowid = old.id; END")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0008_email_snippet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='body_data',
+            field=models.BinaryField(null=True),
+        ),
+        # Nullable first so the text column can be added back empty when unapplied
+        migrations.AlterField(
+            model_name='email',
+            name='body',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+        migrations.RemoveField(
+            model_name='email',
+            name='body',
+        ),
+        migrations.RenameField(
+            model_name='email',
+            old_name='body_data',
+            new_name='body',
+        ),
+        migrations.AlterField(
+            model_name='email',
+            name='body',
+            field=email_api.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(restore_search_delete_trigger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from email_api.threads import normalize_subject
+
+BATCH_SIZE = 1000
+
+
+def fill_threads(apps, schema_editor):
+    """
+    Group the existing emails in threads by users and normalized subject, one batch of ids
+    at a time, then compute the aggregates of every thread in a single UPDATE.
+    """
+    Email = apps.get_model('email_api', 'Email')
+    Thread = apps.get_model('email_api', 'Thread')
+    threads = {}
+    last_id = 0
+    while True:
+        emails = list(Email.objects.filter(id__gt=last_id).order_by('id').only(
+            'id', 'subject', 'timestamp', 'sender_id', 'recipient_id')[:BATCH_SIZE])
+        if not emails:
+            break
+        keys = {}
+        for email in emails:
+            user_a, user_b = sorted((email.sender_id, email.recipient_id))
+            keys[email.id] = (user_a, user_b, normalize_subject(email.subject))
+        new = {}
+        for email in emails:
+            key = keys[email.id]
+            if key not in threads and key not in new:
+                new[key] = Thread(user_a_id=key[0], user_b_id=key[1], subject_key=key[2],
+                                  subject=email.subject, last_timestamp=email.timestamp)
+        for thread in Thread.objects.bulk_create(new.values()):
+            threads[(thread.user_a_id, thread.user_b_id, thread.subject_key)] = thread.id
+        for email in emails:
+            email.thread_id = threads[keys[email.id]]
+        Email.objects.bulk_update(emails, ['thread'])
+        last_id = emails[-1].id
+
+    emails = Email.objects.filter(thread=OuterRef('pk')).order_by()
+
+    def count(queryset):
+        return Coalesce(Subquery(
+            queryset.values('thread').annotate(count=Count('id')).values('count')), 0)
+
+    Thread.objects.update(
+        last_timestamp=Subquery(emails.order_by('-timestamp').values('timestamp')[:1]),
+        message_count=count(emails),
+        unread_a=count(emails.filter(status=False, recipient=OuterRef('user_a'))),
+        unread_b=count(emails.filter(status=False, recipient=OuterRef('user_b')).exclude(
+            recipient=OuterRef('user_a'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0009_email_compressed_body'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='in_reply_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='email_api.email'),
+        ),
+        migrations.CreateModel(
+            name='Thread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=100)),
+                ('subject_key', models.CharField(max_length=100)),
+                ('last_timestamp', models.DateTimeField()),
+                ('message_count', models.IntegerField(default=0)),
+                ('unread_a', models.IntegerField(default=0)),
+                ('unread_b', models.IntegerField(default=0)),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emails', to='email_api.thread'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(fields=['thread', 'timestamp', 'id'], name='email_api_e_thread__11e41d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['user_a', 'last_timestamp', 'id'], name='email_api_t_user_a__7d43c3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['user_b', 'last_timestamp', 'id'], name='email_api_t_user_b__08287b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='thread',
+            constraint=models.UniqueConstraint(fields=('user_a', 'user_b', 'subject_key'), name='unique_thread_participants_subject'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0010_thread'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='email',
+            name='email_api_e_recipie_18891a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('status', False)), fields=['recipient', 'timestamp', 'id'], name='email_unread_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0011_email_unread_partial_index'),
+    ]
+
+    operations = [
+        # The composite index is created before the index on folder alone is dropped
+        migrations.AddIndex(
+            model_name='folderemail',
+            index=models.Index(fields=['folder', 'email'], name='email_api_f_folder__04370e_idx'),
+        ),
+        migrations.AlterField(
+            model_name='folderemail',
+            name='folder',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='email_api.folder'),
+        ),
+    ]
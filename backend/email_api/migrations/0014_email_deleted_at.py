@@ -0,0 +1,61 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0013_deletionjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        # The partial indexes are created before the full ones they replace are dropped
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['recipient', 'timestamp', 'id'], name='email_recipient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['sender', 'timestamp', 'id'], name='email_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['thread', 'timestamp', 'id'], name='email_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['recipient', 'deleted_at', 'id'], name='email_trash_recipient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['sender', 'deleted_at', 'id'], name='email_trash_sender_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='email',
+            name='email_api_e_recipie_9e9c19_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='email',
+            name='email_api_e_sender__bc262f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='email',
+            name='email_api_e_thread__11e41d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='email',
+            name='email_unread_recipient_idx',
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('status', False)), fields=['recipient', 'timestamp', 'id'], name='email_unread_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_email_changes(apps, schema_editor):
+    """
+    Stamp the existing emails in the mailboxes of their sender, their recipient and the owners
+    of their folders, after the current mailbox versions, then move the versions to the last modseq.
+    """
+    tables = {name: apps.get_model('email_api', name)._meta.db_table
+              for name in ('Email', 'EmailChange', 'Folder', 'FolderEmail', 'MailboxVersion')}
+    schema_editor.execute(
+        "INSERT INTO {EmailChange} (user_id, email_id, modseq, deleted) "
+        "SELECT pairs.user_id, pairs.email_id, COALESCE(v.version, 0) + "
+        "ROW_NUMBER() OVER (PARTITION BY pairs.user_id ORDER BY pairs.email_id), pairs.deleted "
+        "FROM ("
+        "SELECT recipient_id AS user_id, id AS email_id, deleted_at IS NOT NULL AS deleted FROM {Email} "
+        "UNION SELECT sender_id, id, deleted_at IS NOT NULL FROM {Email} "
+        "UNION SELECT f.user_id, e.id, e.deleted_at IS NOT NULL FROM {FolderEmail} fe "
+        "JOIN {Folder} f ON f.id = fe.folder_id JOIN {Email} e ON e.id = fe.email_id"
+        ") pairs LEFT JOIN {MailboxVersion} v ON v.user_id = pairs.user_id".format(**tables))
+    schema_editor.execute(
+        "INSERT INTO {MailboxVersion} (user_id, version) "
+        "SELECT user_id, MAX(modseq) FROM {EmailChange} WHERE true GROUP BY user_id "
+        "ON CONFLICT (user_id) DO UPDATE SET version = excluded.version".format(**tables))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_api', '0014_email_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_id', models.BigIntegerField()),
+                ('modseq', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'modseq'], name='emailchange_user_modseq_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emailchange',
+            constraint=models.UniqueConstraint(fields=('user', 'email_id'), name='emailchange_user_email_uniq'),
+        ),
+        migrations.RunPython(fill_email_changes, migrations.RunPython.noop),
+    ]
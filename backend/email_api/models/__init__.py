@@ -1,3 +1,8 @@
 from .folder_email import FolderEmail
+from .thread import Thread
 from .folder import Folder
 from .email import Email
+from .mailbox_counter import MailboxCounter
+from .mailbox_version import MailboxVersion
+from .deletion_job import DeletionJob
+from .email_change import EmailChange
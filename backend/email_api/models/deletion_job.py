@@ -0,0 +1,57 @@
+from django.db import models
+from user_api.models import User
+
+
+class DeletionJob(models.Model):
+    """
+    DeletionJob model
+
+    Define a deletion of a large set of rows run in the background:
+    - user: The user who asked for the deletion
+    - kind: What is deleted (folder/mailbox)
+    - target_id: The primary key of the deleted folder, null for a mailbox
+    - status: The state of the job (pending/running/done/failed)
+    - total: The number of rows to delete when the job started
+    - deleted: The number of rows deleted so far
+    - error: The error that stopped a failed job
+    - created_at, updated_at: When the job was created and last updated
+
+    The rows are deleted in batches of DELETION_JOB_BATCH_SIZE, one short transaction
+    per batch (see email_api.deletion), so a job stopped halfway can be run again.
+
+    The __str__ method returns a string representation of the job.
+    - Delete {kind} {target_id}: {deleted}/{total} {status}
+    """
+
+    KIND_FOLDER = "folder"
+    KIND_MAILBOX = "mailbox"
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="deletion_jobs")
+    kind = models.CharField(max_length=10, choices=(
+        (KIND_FOLDER, "Folder"),
+        (KIND_MAILBOX, "Mailbox"),
+    ))
+    target_id = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, default=STATUS_PENDING, choices=(
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ))
+    total = models.IntegerField(default=0)
+    deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Delete {self.kind} {self.target_id}: {self.deleted}/{self.total} {self.status}"
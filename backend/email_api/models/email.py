@@ -1,6 +1,46 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
+from django.utils.html import strip_tags
+from email_api.fields import CompressedTextField
+from email_api.models.thread import Thread
 from user_api.models import User
 
+SNIPPET_LENGTH = 200
+
+
+def make_snippet(body):
+    """
+    Method to compute the preview of an email shown by the list views.
+    Returns:
+        - The first SNIPPET_LENGTH characters of the body as plain text, on a single line.
+    """
+    return " ".join(strip_tags(body or "").split())[:SNIPPET_LENGTH]
+
+
+class EmailManager(models.Manager):
+    """
+    EmailManager class to hide the emails in the trash, and to compute the snippet
+    of the emails inserted with bulk_create, which does not call save.
+    Email.all_objects also returns the emails in the trash.
+    """
+
+    def __init__(self, with_deleted=False):
+        super().__init__()
+        self.with_deleted = with_deleted
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.with_deleted:
+            return queryset
+        return queryset.filter(deleted_at__isnull=True)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for email in objs:
+            email.snippet = make_snippet(email.body)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Email(models.Model):
     """
@@ -8,25 +48,43 @@ class Email(models.Model):
 
     Define the email model with the following fields:
     - subject: The subject of the email
-    - body: The body of the email
-    - timestamp: The time the email was sent
+    - body: The body of the email, compressed in the database above EMAIL_BODY_COMPRESSION_THRESHOLD
+      bytes and decompressed the first time it is read
+    - timestamp: The time the email was sent, now by default (kept when importing emails)
     - status: The status of the email (read/unread)
     - sender: The user who sent the email
     - recipient: The user who received the email
     - priority: The priority of the email (high/normal/low)
+    - search_vector: The full-text search vector of the subject and body (PostgreSQL)
+    - thread: The conversation of the email, assigned when the email is created (see email_api.threads)
+    - in_reply_to: The email this email replies to, if any
+    - snippet: The beginning of the body as plain text, computed when the email is saved
+      so the list views do not need to load the body
+    - deleted_at: When the email was moved to the trash, null otherwise. Email.objects hides the
+      emails in the trash, they are deleted for good by the purge_deleted_emails command
 
     The model also defines indexes for efficient querying.
     - sender, recipient: For filtering emails by sender and recipient
-    - recipient, status: For filtering emails by recipient and status
+    - recipient, timestamp, id where status is false: For the unread emails of a user, newest first;
+      the index only holds the unread emails so it stays small as read emails pile up
     - timestamp: For sorting emails by timestamp
+    - recipient, timestamp, id / sender, timestamp, id: For the keyset pagination
+      of a user's mailbox (newest first) without sorting
+    - thread, timestamp, id: For reading the emails of a thread in order
+    The list indexes above only hold the emails that are not in the trash.
+    - recipient, deleted_at, id / sender, deleted_at, id where deleted_at is set: For the trash
+      of a user, most recently deleted first, and for the purge of the oldest emails in the trash
+
+    The full-text search index is created by the migrations depending on the database:
+    a GIN index on search_vector on PostgreSQL, an FTS5 virtual table on SQLite.
 
     The __str__ method returns a string representation of the email.
     - Email from {sender} to {recipient}: {subject}
     """
 
     subject = models.CharField(max_length=100)
-    body = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    body = CompressedTextField()
+    timestamp = models.DateTimeField(default=timezone.now)
     status = models.BooleanField(default=False)
     sender = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="+")
@@ -34,14 +92,45 @@ class Email(models.Model):
         User, on_delete=models.CASCADE, related_name="+")
     priority = models.CharField(max_length=10, choices=(
         ("high", "High"), ("normal", "Normal"), ("low", "Low")), default="normal")
+    search_vector = SearchVectorField(null=True, editable=False)
+    thread = models.ForeignKey(
+        Thread, on_delete=models.SET_NULL, null=True, blank=True, related_name="emails")
+    in_reply_to = models.ForeignKey(
+        "self", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    snippet = models.CharField(max_length=SNIPPET_LENGTH, blank=True, default="", editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = EmailManager()
+    all_objects = EmailManager(with_deleted=True)
 
     # Indexes for efficient querying
     class Meta:
         indexes = [
             models.Index(fields=["sender", "recipient"]),
-            models.Index(fields=["recipient", "status"]),
+            models.Index(fields=["recipient", "timestamp", "id"],
+                         condition=models.Q(status=False, deleted_at__isnull=True),
+                         name="email_unread_recipient_idx"),
             models.Index(fields=["timestamp"]),
+            models.Index(fields=["recipient", "timestamp", "id"], condition=models.Q(deleted_at__isnull=True),
+                         name="email_recipient_idx"),
+            models.Index(fields=["sender", "timestamp", "id"], condition=models.Q(deleted_at__isnull=True),
+                         name="email_sender_idx"),
+            models.Index(fields=["thread", "timestamp", "id"], condition=models.Q(deleted_at__isnull=True),
+                         name="email_thread_idx"),
+            models.Index(fields=["recipient", "deleted_at", "id"], condition=models.Q(deleted_at__isnull=False),
+                         name="email_trash_recipient_idx"),
+            models.Index(fields=["sender", "deleted_at", "id"], condition=models.Q(deleted_at__isnull=False),
+                         name="email_trash_sender_idx"),
         ]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.snippet = make_snippet(self.body)
+        elif "body" in update_fields:
+            self.snippet = make_snippet(self.body)
+            kwargs["update_fields"] = {*update_fields, "snippet"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Email from {self.sender} to {self.recipient}: {self.subject}"
@@ -0,0 +1,38 @@
+from django.db import models
+from user_api.models import User
+
+
+class EmailChange(models.Model):
+    """
+    EmailChange model
+
+    Define the last change of an email in the mailbox of a user, like the modseq of IMAP CONDSTORE:
+    - user: The user whose mailbox changed, the sender or the recipient of the email,
+      or the owner of the folder the email was filed in or removed from
+    - email_id: The primary key of the email, not a foreign key so that the row outlives the email
+    - modseq: The mailbox version of the user when the email last changed, unique in the mailbox
+    - deleted: True when the email was deleted or moved to the trash (tombstone)
+
+    The rows are written by email_api.versions.stamp_email_changes in the transaction of the
+    change, and read by the sync endpoint, which returns the rows with a modseq greater than
+    the one the client last saw.
+
+    The __str__ method returns a string representation of the change.
+    - Email {email_id} of {user}: modseq {modseq}
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="email_changes")
+    email_id = models.BigIntegerField()
+    modseq = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "email_id"], name="emailchange_user_email_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "modseq"], name="emailchange_user_modseq_idx"),
+        ]
+
+    def __str__(self):
+        return f"Email {self.email_id} of {self.user}: modseq {self.modseq}"
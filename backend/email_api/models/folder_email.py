@@ -11,16 +11,21 @@ class FolderEmail(models.Model):
     - email: The email in the folder foreign key
     - folder: The folder containing the email foreign key
 
-    The model also defines a unique constraint for email and folder.
+    The model also defines a unique constraint for email and folder, and an index on folder
+    and email to count and list the emails of a folder from the index.
     The __str__ method returns a string representation of the folder email.
     - {email} in {folder}
     """
 
     email = models.ForeignKey(Email, on_delete=models.CASCADE)
-    folder = models.ForeignKey(Folder, on_delete=models.CASCADE)
+    # Indexed by the (folder, email) index
+    folder = models.ForeignKey(Folder, on_delete=models.CASCADE, db_index=False)
 
     class Meta:
         unique_together = ["email", "folder"]
+        indexes = [
+            models.Index(fields=["folder", "email"]),
+        ]
 
     def __str__(self):
         return f"{self.email} in {self.folder}"
\ No newline at end of file
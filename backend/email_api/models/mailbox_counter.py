@@ -0,0 +1,31 @@
+from django.db import models
+from user_api.models import User
+
+
+class MailboxCounter(models.Model):
+    """
+    MailboxCounter model
+
+    Define the denormalized counters of the emails received by a user:
+    - user: The user who owns the mailbox
+    - total: The number of emails received
+    - unread: The number of unread emails received
+    - unread_high, unread_normal, unread_low: The number of unread emails by priority
+
+    The counters are kept up to date in the same transaction as the email write paths
+    (see email_api.counters) and can be rebuilt with the rebuild_mailbox_counters command.
+
+    The __str__ method returns a string representation of the counters.
+    - Mailbox of {user}: {unread}/{total} unread
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="mailbox_counter")
+    total = models.IntegerField(default=0)
+    unread = models.IntegerField(default=0)
+    unread_high = models.IntegerField(default=0)
+    unread_normal = models.IntegerField(default=0)
+    unread_low = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Mailbox of {self.user}: {self.unread}/{self.total} unread"
@@ -0,0 +1,27 @@
+from django.db import models
+from user_api.models import User
+
+
+class MailboxVersion(models.Model):
+    """
+    MailboxVersion model
+
+    Define the version of the mailbox of a user:
+    - user: The user who owns the mailbox
+    - version: Incremented every time an email sent or received by the user, or one of
+      the user's folders, changes
+
+    The version is used to build the ETag of the mailbox list endpoints. It is also the
+    modification sequence of the mailbox: it grows by one for every email that changes,
+    see EmailChange.
+
+    The __str__ method returns a string representation of the version.
+    - Mailbox of {user}: version {version}
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="mailbox_version")
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Mailbox of {self.user}: version {self.version}"
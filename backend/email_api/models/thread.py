@@ -0,0 +1,51 @@
+from django.db import models
+from user_api.models import User
+
+
+class Thread(models.Model):
+    """
+    Thread model
+
+    Define a conversation between two users (or a user and themself) with the following fields:
+    - subject: The subject of the first email of the thread
+    - subject_key: The normalized subject, without reply and forward prefixes (see email_api.threads)
+    - user_a, user_b: The participants, user_a having the lower id
+    - last_timestamp: The timestamp of the newest email of the thread
+    - message_count: The number of emails in the thread
+    - unread_a, unread_b: The number of unread emails received by user_a and by user_b
+      (in a thread with oneself only unread_a is used)
+
+    The aggregates are kept up to date in the same transaction as the email write paths,
+    so the thread list is read without looking at the emails.
+
+    The model also defines indexes for the keyset pagination of the threads of a user,
+    most recently active first, and a unique constraint on the participants and subject.
+
+    The __str__ method returns a string representation of the thread.
+    - Thread {subject} between {user_a} and {user_b}
+    """
+
+    subject = models.CharField(max_length=100)
+    subject_key = models.CharField(max_length=100)
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_timestamp = models.DateTimeField()
+    message_count = models.IntegerField(default=0)
+    unread_a = models.IntegerField(default=0)
+    unread_b = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_a", "user_b", "subject_key"], name="unique_thread_participants_subject"),
+        ]
+        indexes = [
+            models.Index(fields=["user_a", "last_timestamp", "id"]),
+            models.Index(fields=["user_b", "last_timestamp", "id"]),
+        ]
+
+    def unread_for(self, user):
+        return self.unread_a if user.id == self.user_a_id else self.unread_b
+
+    def __str__(self):
+        return f"Thread {self.subject} between {self.user_a} and {self.user_b}"
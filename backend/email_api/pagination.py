@@ -0,0 +1,189 @@
+import base64
+import heapq
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when the cursor or limit query params cannot be decoded.
+    """
+
+
+class EmailKeysetPagination:
+    """
+    EmailKeysetPagination class for keyset (cursor) pagination of emails.
+
+    Emails are ordered newest first by (timestamp, id). Instead of an OFFSET,
+    each page starts strictly after the (timestamp, id) of the last row of the
+    previous page, so the database walks the composite indexes straight to the
+    page and every page costs the same no matter how deep it is.
+
+    The cursor returned to the client is an opaque base64 token. A mailbox can be
+    made of several querysets (e.g. emails received and emails sent), each one is
+    read with its own index range scan and the results are merged in memory.
+    """
+
+    default_limit = 50
+    max_limit = 200
+    timestamp_field = "timestamp"
+    ordering = ("-timestamp", "-id")
+
+    def __init__(self):
+        self.next_cursor = None
+
+    def get_limit(self, request):
+        """
+        Method to read the page size from the ``limit`` query param.
+        """
+        limit = request.query_params.get("limit")
+        if limit is None:
+            return self.default_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise InvalidCursor("Limit must be a positive integer")
+        if limit < 1:
+            raise InvalidCursor("Limit must be a positive integer")
+        return min(limit, self.max_limit)
+
+    def get_timestamp(self, obj):
+        return getattr(obj, self.timestamp_field)
+
+    def encode_cursor(self, email):
+        payload = json.dumps(
+            {"ts": self.get_timestamp(email).isoformat(), "id": email.id})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            timestamp = parse_datetime(payload["ts"])
+            pk = int(payload["id"])
+        except (ValueError, TypeError, KeyError, UnicodeError):
+            raise InvalidCursor("Invalid cursor")
+        if timestamp is None:
+            raise InvalidCursor("Invalid cursor")
+        return timestamp, pk
+
+    def paginate_queryset(self, querysets, request):
+        """
+        Method to return one page of emails.
+        Parameters:
+            - querysets: An Email queryset or a list of them, their union is paginated.
+            - request: The request object with the optional cursor and limit query params.
+        Returns:
+            - The list of emails of the page. ``next_cursor`` is set if there are more.
+        Raises:
+            - InvalidCursor if the cursor or the limit are not valid.
+        """
+        querysets, limit = self.get_page_querysets(querysets, request)
+        return self.get_page([list(qs) for qs in querysets], limit)
+
+    async def apaginate_queryset(self, querysets, request):
+        """
+        Method to return one page of emails with the async ORM, see paginate_queryset.
+        """
+        querysets, limit = self.get_page_querysets(querysets, request)
+        results = []
+        for qs in querysets:
+            results.append([obj async for obj in qs])
+        return self.get_page(results, limit)
+
+    def get_page_querysets(self, querysets, request):
+        if not isinstance(querysets, (list, tuple)):
+            querysets = [querysets]
+        limit = self.get_limit(request)
+        cursor = request.query_params.get("cursor")
+
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            field = self.timestamp_field
+            after_cursor = Q(**{f"{field}__lte": timestamp}) & (
+                Q(**{f"{field}__lt": timestamp}) | Q(id__lt=pk))
+            querysets = [qs.filter(after_cursor) for qs in querysets]
+
+        return [qs.order_by(*self.ordering)[:limit + 1] for qs in querysets], limit
+
+    def get_page(self, results, limit):
+        if len(results) == 1:
+            merged = results[0]
+        else:
+            merged = []
+            for email in heapq.merge(
+                    *results, key=lambda email: (self.get_timestamp(email), email.id), reverse=True):
+                # An email sent to oneself is returned by more than one queryset
+                if not merged or merged[-1].id != email.id:
+                    merged.append(email)
+
+        page = merged[:limit]
+        self.next_cursor = self.encode_cursor(
+            page[-1]) if len(merged) > limit else None
+        return page
+
+
+class ThreadKeysetPagination(EmailKeysetPagination):
+    """
+    ThreadKeysetPagination class for keyset pagination of threads, most recently active first.
+    """
+
+    timestamp_field = "last_timestamp"
+    ordering = ("-last_timestamp", "-id")
+
+
+class TrashKeysetPagination(EmailKeysetPagination):
+    """
+    TrashKeysetPagination class for keyset pagination of the emails in the trash, most recently deleted first.
+    """
+
+    timestamp_field = "deleted_at"
+    ordering = ("-deleted_at", "-id")
+
+
+class EmailSearchPagination(EmailKeysetPagination):
+    """
+    EmailSearchPagination class for the pagination of ranked search results.
+
+    Results are ordered by relevance, which is computed for every match anyway,
+    so the opaque cursor holds the offset of the next page.
+    """
+
+    default_limit = 20
+    max_limit = 100
+
+    def encode_cursor(self, offset):
+        payload = json.dumps({"offset": offset})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            offset = int(payload["offset"])
+        except (ValueError, TypeError, KeyError, UnicodeError):
+            raise InvalidCursor("Invalid cursor")
+        if offset < 0:
+            raise InvalidCursor("Invalid cursor")
+        return offset
+
+    def paginate_search(self, search, request):
+        """
+        Method to return one page of search results.
+        Parameters:
+            - search: A callable taking an offset and a limit and returning the results.
+            - request: The request object with the optional cursor and limit query params.
+        Returns:
+            - The list of emails of the page. ``next_cursor`` is set if there are more.
+        Raises:
+            - InvalidCursor if the cursor or the limit are not valid.
+        """
+        limit = self.get_limit(request)
+        cursor = request.query_params.get("cursor")
+        offset = self.decode_cursor(cursor) if cursor else 0
+
+        results = search(offset, limit + 1)
+        page = results[:limit]
+        self.next_cursor = self.encode_cursor(
+            offset + limit) if len(results) > limit else None
+        return page
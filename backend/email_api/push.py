@@ -0,0 +1,167 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from email_api.events import get_event_bus
+from user_api.authentication import CachedJWTAuthentication
+
+EVENTS_PATH = "/emails/events/"
+
+# Milliseconds an EventSource waits before it reconnects
+RECONNECT_DELAY = 5000
+
+# Close codes of the WebSocket connections refused by the application
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+
+
+def authenticate_scope(scope):
+    """
+    Method to get the user of the access token of a connection, from the Authorization header
+    or from the token query param, since EventSource and WebSocket cannot set headers.
+    Returns:
+        - The active user, or None if the token is missing or invalid.
+    """
+    authentication = CachedJWTAuthentication()
+    headers = dict(scope.get("headers", ()))
+    raw_token = None
+    if b"authorization" in headers:
+        raw_token = authentication.get_raw_token(headers[b"authorization"])
+    if raw_token is None:
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+        raw_token = token[0].encode() if token else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    finally:
+        # The connection is not kept by the idle stream
+        connection.close()
+
+
+async def aauthenticate_scope(scope):
+    # Not thread sensitive, the connection does not hold a thread of its own
+    return await sync_to_async(authenticate_scope, thread_sensitive=False)(scope)
+
+
+def cors_headers(scope):
+    origin = dict(scope.get("headers", ())).get(b"origin")
+    if origin is None:
+        return []
+    if settings.CORS_ALLOW_ALL_ORIGINS or origin.decode() in getattr(settings, "CORS_ALLOWED_ORIGINS", ()):
+        return [(b"access-control-allow-origin", origin), (b"vary", b"origin")]
+    return []
+
+
+async def events_application(scope, receive, send):
+    """
+    ASGI application of /emails/events/, which pushes the new email and status changed events
+    of the user instead of polling the email list. It is served outside of the Django views,
+    so an idle connection only holds its event queue, not a thread nor a database connection.
+    The events are:
+        - new_email: An email was received, with its sender, subject and priority.
+        - status_changed: Emails were marked as read or unread, with their ids or their count.
+        - resync: Events were dropped because the client did not keep up, reload the lists.
+    HTTP requests get Server-Sent Events, named after their type, with a keep-alive comment every
+    EMAIL_EVENTS_HEARTBEAT seconds. WebSocket connections get one JSON message per event.
+    Parameters:
+        - scope: The ASGI scope of the connection.
+        - receive: The ASGI receive callable.
+        - send: The ASGI send callable.
+    """
+    if scope["type"] == "websocket":
+        await serve_websocket(scope, receive, send)
+    else:
+        await serve_event_stream(scope, receive, send)
+
+
+async def send_json_response(send, status, message, headers=()):
+    body = json.dumps({"message": message, "success": False, "status": status}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def serve_event_stream(scope, receive, send):
+    headers = cors_headers(scope)
+    if scope["method"] != "GET":
+        await send_json_response(send, 405, f"Method \"{scope['method']}\" not allowed.",
+                                 [(b"allow", b"GET"), *headers])
+        return
+    user = await aauthenticate_scope(scope)
+    if user is None:
+        await send_json_response(send, 401, "Authentication credentials were not provided or are invalid.",
+                                 [(b"www-authenticate", b'Bearer realm="api"'), *headers])
+        return
+
+    async with get_event_bus().subscribe(user.id) as queue:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # Do not let nginx buffer the events
+                (b"x-accel-buffering", b"no"),
+                *headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": f"retry: {RECONNECT_DELAY}\n\n".encode(),
+                    "more_body": True})
+
+        async def push():
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.EMAIL_EVENTS_HEARTBEAT)
+                    chunk = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                except asyncio.TimeoutError:
+                    chunk = ": heartbeat\n\n"
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+        await push_until_disconnect(push(), receive, "http.disconnect")
+
+
+async def serve_websocket(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if scope["path"] != EVENTS_PATH:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    user = await aauthenticate_scope(scope)
+    if user is None:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+
+    async with get_event_bus().subscribe(user.id) as queue:
+        await send({"type": "websocket.accept"})
+
+        async def push():
+            while True:
+                event = await queue.get()
+                await send({"type": "websocket.send", "text": json.dumps(event)})
+
+        await push_until_disconnect(push(), receive, "websocket.disconnect")
+
+
+async def push_until_disconnect(push, receive, disconnect):
+    """
+    Method to push events until the client disconnects, the messages of the client are ignored.
+    """
+    pusher = asyncio.create_task(push)
+    try:
+        while (await receive())["type"] != disconnect:
+            pass
+    finally:
+        pusher.cancel()
@@ -0,0 +1,110 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from email_api.versions import get_mailbox_version
+
+HITS_KEY = "mailbox-cache:hits"
+MISSES_KEY = "mailbox-cache:misses"
+
+
+def get_mailbox_cache():
+    return caches[settings.MAILBOX_CACHE_ALIAS]
+
+
+def mailbox_cache_key(request, name):
+    """
+    Method to build the cache key of a list response.
+    The key holds the mailbox version of the user, so every write to the mailbox of a user
+    bumps the version and invalidates all the cached pages of that user, and only them.
+    The date the user joined is part of the key in case a user id is ever reused.
+    """
+    user = request.user
+    page = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return (f"mailbox:{user.id}:{user.date_joined.timestamp()}:{get_mailbox_version(request)}:"
+            f"{name}:{request.accepted_renderer.format}:{page}")
+
+
+def get_stats_cache():
+    return caches[settings.MAILBOX_CACHE_STATS_ALIAS]
+
+
+def count(key):
+    cache = get_stats_cache()
+    # add only creates the counter if it is missing, so two workers never reset each other's counts
+    cache.add(key, 0)
+    cache.incr(key)
+
+
+async def acount(key):
+    cache = get_stats_cache()
+    await cache.aadd(key, 0)
+    await cache.aincr(key)
+
+
+def get_cache_stats():
+    """
+    Method to get the hit and miss counters of the mailbox cache.
+    They are kept in their own cache, see MAILBOX_CACHE_STATS_ALIAS, so that evicting pages does not reset them.
+    With the default local memory backend they are per process, they count the requests of the
+    worker that serves the stats; use a shared backend such as Redis for the totals of every worker.
+    """
+    cache = get_stats_cache()
+    return {
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+    }
+
+
+def cache_mailbox_response(view_method):
+    """
+    Decorator to cache the successful responses of a mailbox list view per user and per URL.
+    Streamed responses are never cached. Cached responses have the X-Cache: HIT header.
+    Async views must read the mailbox version first, see aget_mailbox_version.
+    """
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            cache = get_mailbox_cache()
+            key = mailbox_cache_key(request, view_method.__name__)
+            data = await cache.aget(key)
+            if data is not None:
+                await acount(HITS_KEY)
+                response = Response(data, status=status.HTTP_200_OK)
+                response["X-Cache"] = "HIT"
+                return response
+
+            await acount(MISSES_KEY)
+            response = await view_method(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                await cache.aset(key, response.data)
+                response["X-Cache"] = "MISS"
+            return response
+
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        cache = get_mailbox_cache()
+        key = mailbox_cache_key(request, view_method.__name__)
+        data = cache.get(key)
+        if data is not None:
+            count(HITS_KEY)
+            response = Response(data, status=status.HTTP_200_OK)
+            response["X-Cache"] = "HIT"
+            return response
+
+        count(MISSES_KEY)
+        response = view_method(self, request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+            response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+
+from email_api.fieldsets import EMAIL_FIELDS, only_fields
+from email_api.models.email import Email
+
+FTS_TABLE = "email_api_email_fts"
+
+# The subject weighs more than the body when ranking the results
+SQLITE_BM25_WEIGHTS = (10.0, 1.0)
+
+
+def update_search_index(emails):
+    """
+    Method to update the full-text search index of the given emails.
+    The subject and body are sent from Python because the body is stored compressed.
+    On PostgreSQL the search_vector column is recomputed with one UPDATE, each distinct
+    subject and body being sent once, on SQLite the rows of the FTS5 table are replaced.
+    Parameters:
+        - emails: The emails that were created or updated.
+    """
+    emails = list(emails)
+    if not emails:
+        return
+    if connection.vendor == "postgresql":
+        contents = defaultdict(list)
+        for email in emails:
+            contents[(email.subject, email.body)].append(email.id)
+        values = ", ".join(["(%s, %s, %s)"] * len(contents))
+        params = [value for (subject, body), ids in contents.items()
+                  for value in (ids, subject, body)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Email._meta.db_table} AS e SET search_vector = "
+                f"setweight(to_tsvector(COALESCE(v.subject, '')), 'A') || "
+                f"setweight(to_tsvector(COALESCE(v.body, '')), 'B') "
+                f"FROM (VALUES {values}) AS v(ids, subject, body) WHERE e.id = ANY(v.ids)",
+                params)
+    elif connection.vendor == "sqlite":
+        email_ids = [email.id for email in emails]
+        placeholders = ", ".join(["%s"] * len(email_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", email_ids)
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, subject, body) VALUES (%s, %s, %s)",
+                [(email.id, email.subject, email.body) for email in emails])
+
+
+def search_emails(user, text, offset, limit, fields=EMAIL_FIELDS):
+    """
+    Method to search the emails of a user by subject and body.
+    Parameters:
+        - user: The user whose sent and received emails are searched.
+        - text: The search terms.
+        - offset: The number of results to skip.
+        - limit: The maximum number of results to return.
+        - fields: The fields that are serialized, only their columns are loaded.
+    Returns:
+        - The list of matching emails, best ranked first.
+    """
+    if connection.vendor == "sqlite":
+        return _search_emails_sqlite(user, text, offset, limit, fields)
+
+    query = SearchQuery(text, search_type="websearch")
+    emails = only_fields(Email.objects, fields).filter(
+        Q(recipient=user) | Q(sender=user), search_vector=query
+    ).annotate(rank=SearchRank(F("search_vector"), query)).order_by("-rank", "-id")
+    return list(emails[offset:offset + limit])
+
+
+def _search_emails_sqlite(user, text, offset, limit, fields):
+    # Quote every term so user input is never parsed as FTS5 query syntax
+    terms = " ".join('"%s"' % term.replace('"', '""') for term in text.split())
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT e.id FROM {FTS_TABLE} "
+            f"JOIN email_api_email e ON e.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND (e.recipient_id = %s OR e.sender_id = %s) "
+            f"AND e.deleted_at IS NULL "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s), e.id DESC LIMIT %s OFFSET %s",
+            [terms, user.id, user.id, *SQLITE_BM25_WEIGHTS, limit, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    emails = only_fields(Email.objects, fields).in_bulk(ids)
+    return [emails[pk] for pk in ids if pk in emails]
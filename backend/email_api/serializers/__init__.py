@@ -1,3 +1,6 @@
 from .email_serializer import *
 from .folder_email_serializer import *
 from .folder_serializer import *
+from .mailbox_counter_serializer import *
+from .thread_serializer import *
+from .deletion_job_serializer import *
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+from email_api.models import DeletionJob
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeletionJob
+        fields = ["id",
+                  "kind",
+                  "target_id",
+                  "status",
+                  "total",
+                  "deleted",
+                  "error",
+                  "created_at",
+                  "updated_at",]
@@ -1,7 +1,13 @@
 from rest_framework import serializers
 from email_api.models.email import Email
+from email_api.counters import apply_counter_delta, apply_counter_delta_to_users, email_counter_delta
+from email_api.events import publish_mailbox_event
+from email_api.search import update_search_index
+from email_api.threads import add_emails_to_threads, assign_threads, thread_deltas, apply_thread_deltas
+from email_api.versions import mailbox_changes, stamp_email_changes
 from user_api.models import User
-from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
+from django.db import transaction
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,6 +17,10 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class EmailSerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to read and write emails.
+    The fields argument restricts the serialized fields, e.g. to the fields asked by a list view.
+    """
     sender_email = serializers.EmailField(write_only=True)
     recipient_email = serializers.EmailField(write_only=True)
     sender = UserSerializer(read_only=True)
@@ -24,27 +34,163 @@ class EmailSerializer(serializers.ModelSerializer):
                   "sender_email",
                   "recipient_email",
                   "subject",
+                  "snippet",
                   "body",
                   "timestamp",
                   "status",
-                  "priority",]
-        read_only_fields = ["timestamp",]
+                  "priority",
+                  "thread",
+                  "in_reply_to",]
+        read_only_fields = ["timestamp", "thread",]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
 
     def create(self, validated_data):
         sender_email = validated_data.pop("sender_email")
         recipient_email = validated_data.pop("recipient_email")
 
-        sender = self.get_user_by_email(sender_email, "Sender")
-        recipient = self.get_user_by_email(recipient_email, "Recipient")
+        return self.create_emails(sender_email, [recipient_email], validated_data)[0]
+
+    def create_emails(self, sender_email, recipient_emails, validated_data):
+        """
+        Method to send the same email to many recipients.
+        The sender and the recipients are resolved in one query and the emails are
+        inserted with bulk_create in batches of EMAIL_BULK_CREATE_BATCH_SIZE, in one transaction.
+        Every email joins the thread of the email it replies to, or of its users and subject.
+        Parameters:
+            - sender_email: The email address of the sender.
+            - recipient_emails: The email addresses of the recipients.
+            - validated_data: The other fields of the email.
+        Returns:
+            - The list of created emails, one per recipient.
+        """
+        recipient_emails = list(dict.fromkeys(recipient_emails))
+        users = self.get_users_by_email([sender_email, *recipient_emails])
+        if sender_email not in users:
+            raise serializers.ValidationError(
+                f"Sender with email '{sender_email}' does not exist")
+        unknown = [email for email in recipient_emails if email not in users]
+        if len(unknown) == 1:
+            raise serializers.ValidationError(
+                f"Recipient with email '{unknown[0]}' does not exist")
+        if unknown:
+            raise serializers.ValidationError(
+                "Recipients with emails {} do not exist".format(
+                    ", ".join(f"'{email}'" for email in unknown)))
+
+        sender = users[sender_email]
+        in_reply_to = validated_data.get("in_reply_to")
+        if in_reply_to is not None and sender.id not in (in_reply_to.sender_id, in_reply_to.recipient_id):
+            raise serializers.ValidationError(
+                "The sender can only reply to an email they sent or received")
+        recipients = [users[email] for email in recipient_emails]
+        emails = [Email(sender=sender, recipient=recipient, **validated_data)
+                  for recipient in recipients]
+        with transaction.atomic():
+            assign_threads(emails)
+            emails = Email.objects.bulk_create(
+                emails, batch_size=settings.EMAIL_BULK_CREATE_BATCH_SIZE)
+            add_emails_to_threads(emails)
+            update_search_index(emails)
+            apply_counter_delta_to_users(
+                [recipient.id for recipient in recipients], email_counter_delta(emails[0]))
+            stamp_email_changes(mailbox_changes(emails))
+            publish_mailbox_event([recipient.id for recipient in recipients], {
+                "type": "new_email",
+                "sender": sender.email,
+                "subject": emails[0].subject,
+                "priority": emails[0].priority,
+            })
+
+        return emails
 
-        email = Email.objects.create(
-            sender=sender, recipient=recipient, **validated_data)
+    def update(self, instance, validated_data):
+        # The thread of an email is chosen when it is sent
+        validated_data.pop("in_reply_to", None)
+        with transaction.atomic():
+            # The deltas are computed from the locked row, so two concurrent updates
+            # never remove the same old status or priority from the counters twice
+            instance = Email.objects.select_related("sender", "recipient").select_for_update(
+                of=("self",)).get(pk=instance.pk)
+            delta = email_counter_delta(instance, -1)
+            deltas = thread_deltas([instance], -1)
+            email = super().update(instance, validated_data)
+            update_search_index([email])
+            delta.update(email_counter_delta(email))
+            apply_counter_delta(email.recipient_id, delta)
+            for thread_id, thread_delta in thread_deltas([email]).items():
+                deltas[thread_id].update(thread_delta)
+            apply_thread_deltas(deltas)
+            stamp_email_changes(mailbox_changes([email]))
 
         return email
 
-    def get_user_by_email(self, email, user_type):
-        try:
-            return User.objects.get(email=email)
-        except ObjectDoesNotExist:
+    def get_users_by_email(self, emails):
+        return {user.email: user for user in User.objects.filter(email__in=emails)}
+
+
+class EmailMultiRecipientSerializer(EmailSerializer):
+    """
+    This serializer is used to send the same email to a list of recipients.
+    Saving it returns the list of created emails, one per recipient.
+    """
+    recipient_email = None
+    recipient_emails = serializers.ListField(
+        child=serializers.EmailField(), write_only=True, allow_empty=False,
+        max_length=settings.EMAIL_MAX_RECIPIENTS)
+
+    class Meta(EmailSerializer.Meta):
+        fields = ["id",
+                  "sender",
+                  "recipient",
+                  "sender_email",
+                  "recipient_emails",
+                  "subject",
+                  "snippet",
+                  "body",
+                  "timestamp",
+                  "status",
+                  "priority",
+                  "thread",
+                  "in_reply_to",]
+
+    def create(self, validated_data):
+        sender_email = validated_data.pop("sender_email")
+        recipient_emails = validated_data.pop("recipient_emails")
+
+        return self.create_emails(sender_email, recipient_emails, validated_data)
+
+    @property
+    def data(self):
+        return EmailSerializer(self.instance, many=True).data
+
+
+class TrashEmailSerializer(EmailSerializer):
+    """
+    This serializer is used to read the emails in the trash, with the time they were deleted.
+    """
+
+    class Meta(EmailSerializer.Meta):
+        fields = [*EmailSerializer.Meta.fields, "deleted_at"]
+
+
+class EmailBulkStatusSerializer(serializers.Serializer):
+    """
+    This serializer is used to validate the selection of emails whose status is changed in bulk.
+    The emails are selected by ids or by folder, optionally only those sent before a date.
+    """
+    status = serializers.BooleanField()
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=1000)
+    folder_id = serializers.IntegerField(required=False)
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if "ids" not in attrs and "folder_id" not in attrs:
             raise serializers.ValidationError(
-                f"{user_type} with email '{email}' does not exist")
+                "Either ids or folder_id is required")
+        return attrs
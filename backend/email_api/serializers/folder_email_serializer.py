@@ -28,4 +28,20 @@ class FolderEmailSerializer(serializers.ModelSerializer):
             return super().update(instance, validated_data)
         else:
             raise serializers.ValidationError(
-                "Email and folder are required fields")
\ No newline at end of file
+                "Email and folder are required fields")
+
+class FolderEmailBulkSerializer(serializers.Serializer):
+    """
+    This serializer is used to validate the emails added to, removed from or moved between folders in bulk.
+    The source_folder_id is only used to move the emails.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=1000)
+    folder_id = serializers.IntegerField()
+    source_folder_id = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get("source_folder_id") == attrs["folder_id"]:
+            raise serializers.ValidationError(
+                "The source and target folders must be different")
+        return attrs
@@ -3,9 +3,13 @@ from rest_framework import serializers
 from email_api.models.folder import Folder
 
 class FolderSerializer(serializers.ModelSerializer):
+    # Only returned by the folder list, where they are annotated
+    total = serializers.IntegerField(read_only=True)
+    unread = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Folder
-        fields = ["id", "name", "user"]
+        fields = ["id", "name", "user", "total", "unread"]
         read_only_fields = ["user",]
 
     def create(self, validated_data):
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+from email_api.models import MailboxCounter
+
+
+class MailboxCounterSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MailboxCounter
+        fields = ["total",
+                  "unread",
+                  "unread_high",
+                  "unread_normal",
+                  "unread_low",]
@@ -0,0 +1,27 @@
+from rest_framework import serializers
+
+from email_api.models import Thread
+
+
+class ThreadSerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to list the threads of the user in the request context.
+    The unread counter is the number of unread emails received by that user.
+    """
+    participants = serializers.SerializerMethodField()
+    unread = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Thread
+        fields = ["id",
+                  "subject",
+                  "participants",
+                  "last_timestamp",
+                  "message_count",
+                  "unread",]
+
+    def get_participants(self, thread):
+        return sorted({thread.user_a.email, thread.user_b.email})
+
+    def get_unread(self, thread):
+        return thread.unread_for(self.context["request"].user)
@@ -0,0 +1,79 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+from email_api.serializers import EmailSerializer
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    NDJSONRenderer class to accept the application/x-ndjson media type.
+    Streamed lists are written by stream_emails, other responses are rendered as a single JSON line.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, cls=DjangoJSONEncoder).encode() + b"\n"
+
+
+# Renderers of the views that can stream their emails
+STREAMING_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+
+def wants_stream(request):
+    """
+    Method to know if the client asked for a streamed response,
+    with the stream query param or the application/x-ndjson Accept header.
+    """
+    if request.query_params.get("stream") in ("1", "true"):
+        return True
+    return request.accepted_renderer.media_type == NDJSON_MEDIA_TYPE
+
+
+def stream_emails(emails, serializer_class=EmailSerializer, chunk_size=None, fields=None):
+    """
+    Method to stream emails as NDJSON, one serialized email per line.
+    The queryset is read in chunks with a server-side cursor, so the memory used does not
+    depend on the number of emails and the first line is sent as soon as the first chunk is read.
+    Parameters:
+        - emails: The Email queryset to stream.
+        - serializer_class: The serializer used for every email.
+        - chunk_size: The number of emails read per chunk, EMAIL_STREAM_CHUNK_SIZE by default.
+        - fields: The fields of every email, all of them by default.
+    Returns:
+        - StreamingHttpResponse with the application/x-ndjson content type.
+    """
+    chunk_size = chunk_size or settings.EMAIL_STREAM_CHUNK_SIZE
+    serializer = serializer_class(fields=fields)
+
+    def lines():
+        for email in emails.iterator(chunk_size=chunk_size):
+            yield json.dumps(serializer.to_representation(email), cls=DjangoJSONEncoder) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type=NDJSON_MEDIA_TYPE)
+
+
+def astream_emails(emails, serializer_class=EmailSerializer, chunk_size=None, fields=None):
+    """
+    Method to stream emails as NDJSON from an async view, see stream_emails.
+    The queryset is read with the async ORM, the response must be served by an ASGI server.
+    """
+    chunk_size = chunk_size or settings.EMAIL_STREAM_CHUNK_SIZE
+    serializer = serializer_class(fields=fields)
+
+    async def lines():
+        async for email in emails.aiterator(chunk_size=chunk_size):
+            yield json.dumps(serializer.to_representation(email), cls=DjangoJSONEncoder) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
+from email_api.fieldsets import only_fields
+from email_api.models import Email, EmailChange, FolderEmail
+from email_api.serializers import EmailSerializer
+
+
+class InvalidSince(Exception):
+    """
+    Raised when the since or limit query params of the delta sync are not valid.
+    """
+
+
+class EmailDeltaSync:
+    """
+    EmailDeltaSync class to return the emails that changed in the mailbox of a user after a modseq.
+
+    Every change of an email stamps it with the next modseq of the mailbox (see EmailChange),
+    so the changes are read from the (user, modseq) index and a sync costs time proportional
+    to the number of changes, not to the size of the mailbox. Modseqs are unique in a mailbox,
+    a page ends exactly after its last change and the next page starts from its modseq.
+    """
+
+    default_limit = 500
+    max_limit = 1000
+
+    def __init__(self):
+        self.modseq = 0
+        self.more = False
+
+    def get_since(self, request, version):
+        since = request.query_params.get("since", "0")
+        try:
+            since = int(since)
+        except ValueError:
+            raise InvalidSince("Since must be a modseq returned by a previous sync")
+        if since < 0 or since > version:
+            raise InvalidSince("Since must be a modseq returned by a previous sync")
+        return since
+
+    def get_limit(self, request):
+        limit = request.query_params.get("limit")
+        if limit is None:
+            return self.default_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise InvalidSince("Limit must be a positive integer")
+        if limit < 1:
+            raise InvalidSince("Limit must be a positive integer")
+        return min(limit, self.max_limit)
+
+    def get_changes(self, request, version, fields):
+        """
+        Method to get one page of the changes of the mailbox of the user of a request.
+        Parameters:
+            - request: The request object with the optional since and limit query params.
+            - version: The mailbox version of the user, the highest modseq.
+            - fields: The fields of the changed emails.
+        Returns:
+            - The changed emails, serialized with their modseq and the ids of the folders of
+              the user they are in, and the ids of the deleted emails. ``modseq`` is set to the
+              modseq to sync from next time and ``more`` tells if there are more changes.
+        Raises:
+            - InvalidSince if the since or limit query params are not valid.
+        """
+        user = request.user
+        since = self.get_since(request, version)
+        limit = self.get_limit(request)
+        changes = list(EmailChange.objects.filter(user=user, modseq__gt=since).order_by("modseq")
+                       .values_list("email_id", "modseq", "deleted")[:limit + 1])
+        self.more = len(changes) > limit
+        changes = changes[:limit]
+        self.modseq = changes[-1][1] if changes else since
+
+        changed_ids = [email_id for email_id, _, deleted in changes if not deleted]
+        emails = {}
+        folders = defaultdict(list)
+        if changed_ids:
+            emails = {email.id: email for email in only_fields(Email.objects, fields).filter(
+                Q(sender=user) | Q(recipient=user), id__in=changed_ids)}
+            for email_id, folder_id in FolderEmail.objects.filter(
+                    folder__user=user, email_id__in=changed_ids).values_list("email_id", "folder_id"):
+                folders[email_id].append(folder_id)
+
+        serializer = EmailSerializer(fields=fields)
+        changed = []
+        deleted = []
+        for email_id, modseq, _ in changes:
+            if email_id not in emails:
+                # Deleted, or deleted after it was stamped
+                deleted.append(email_id)
+                continue
+            data = serializer.to_representation(emails[email_id])
+            data["modseq"] = modseq
+            data["folders"] = sorted(folders[email_id])
+            changed.append(data)
+        return changed, deleted
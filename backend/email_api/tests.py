@@ -1,10 +1,40 @@
-from rest_framework.test import APITestCase
+import asyncio
+import gzip
+import json
+import mailbox
+import os
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 
-from .models import Email
+from .models import DeletionJob, Email, Folder, FolderEmail, MailboxCounter, Thread
 from user_api.models import User
 from .serializers import EmailSerializer
+from .counters import rebuild_counters
+from .deletion import run_deletion_job, start_deletion_job
+from .events import RESYNC_EVENT, InMemoryEventBus, get_event_bus
+from .push import events_application
+from .response_cache import get_mailbox_cache, get_stats_cache
+from .fieldsets import LIST_FIELDS
+from .views import (
+    AsyncEmailDetail, AsyncEmailList, AsyncFolderEmails, AsyncFolderList, EmailDetailsViewSet, read_async)
+from .fields import RAW, ZLIB
+from .models.email import SNIPPET_LENGTH
 
 
 class TestEmailList(APITestCase):
@@ -31,7 +61,7 @@ class TestEmailList(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Sort the expected data and response data before comparison
-        expected_data = EmailSerializer([email1, email2], many=True).data
+        expected_data = EmailSerializer([email1, email2], many=True, fields=LIST_FIELDS).data
         expected_data.sort(key=lambda x: x['id'])  # Sort by email id
         response_data = response.data["data"]
         response_data.sort(key=lambda x: x['id'])  # Sort by email id
@@ -90,7 +120,7 @@ class TestEmailList(APITestCase):
 
         # Check if the response data matches the expected serialized data
         expected_emails = Email.objects.filter(sender__email=sender_email)
-        expected_data = EmailSerializer(expected_emails, many=True).data
+        expected_data = EmailSerializer(expected_emails, many=True, fields=LIST_FIELDS).data
         self.assertEqual(response.data['data'], expected_data)
 
     def test_get_emails_by_status(self):
@@ -112,7 +142,7 @@ class TestEmailList(APITestCase):
 
         # Check if the response data matches the expected serialized data
         expected_emails = Email.objects.filter(status=True)
-        expected_data = EmailSerializer(expected_emails, many=True).data
+        expected_data = EmailSerializer(expected_emails, many=True, fields=LIST_FIELDS).data
         self.assertEqual(response.data['data'], expected_data)
 
     def test_update_email(self):
@@ -169,9 +199,10 @@ class TestEmailList(APITestCase):
         # Check if the request was successful (HTTP 204)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
-        # Check if the email was deleted successfully
+        # Check if the email was moved to the trash
         with self.assertRaises(Email.DoesNotExist):
-            email.refresh_from_db()
+            Email.objects.get(pk=email.pk)
+        self.assertIsNotNone(Email.all_objects.get(pk=email.pk).deleted_at)
 
         # Check if the response message is correct
         expected_message = "Email deleted successfully"
@@ -267,3 +298,2130 @@ class TestEmailList(APITestCase):
         # Check if the response message is correct
         expected_message = "Email does not exist"
         self.assertEqual(response.data['message'], expected_message)
+
+
+class TestEmailPagination(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_pages_are_ordered_and_complete(self):
+        """
+        Test that following next_cursor returns every email once, newest first
+        """
+
+        for i in range(5):
+            Email.objects.create(
+                subject=f'Received {i}', sender=self.other, recipient=self.user)
+            Email.objects.create(
+                subject=f'Sent {i}', sender=self.user, recipient=self.other)
+        Email.objects.create(
+            subject='To myself', sender=self.user, recipient=self.user)
+        Email.objects.create(
+            subject='Not mine', sender=self.other, recipient=self.other)
+
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/emails/list/all/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['data']), 3)
+            ids += [email['id'] for email in response.data['data']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        expected_ids = list(Email.objects.exclude(subject='Not mine')
+                            .order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected_ids)
+
+    def test_cursor_with_equal_timestamps(self):
+        """
+        Test that emails sharing the same timestamp are not skipped between pages
+        """
+
+        for i in range(4):
+            Email.objects.create(
+                subject=f'Email {i}', sender=self.other, recipient=self.user)
+        Email.objects.update(timestamp=Email.objects.first().timestamp)
+
+        first = self.client.get('/emails/list/all/', {'limit': 2})
+        second = self.client.get(
+            '/emails/list/all/', {'limit': 2, 'cursor': first.data['next_cursor']})
+
+        ids = [email['id'] for email in first.data['data'] + second.data['data']]
+        self.assertEqual(ids, sorted(
+            Email.objects.values_list('id', flat=True), reverse=True))
+        self.assertIsNone(second.data['next_cursor'])
+
+    def test_subject_filter_with_pagination(self):
+        """
+        Test that the subject filter is applied to every page
+        """
+
+        for i in range(3):
+            Email.objects.create(
+                subject=f'Invoice {i}', sender=self.other, recipient=self.user)
+            Email.objects.create(
+                subject=f'Hello {i}', sender=self.other, recipient=self.user)
+
+        response = self.client.get(
+            '/emails/list/all/', {'subject': 'invoice', 'limit': 2})
+        next_page = self.client.get(
+            '/emails/list/all/', {'subject': 'invoice', 'limit': 2,
+                                  'cursor': response.data['next_cursor']})
+
+        subjects = [email['subject']
+                    for email in response.data['data'] + next_page.data['data']]
+        self.assertEqual(subjects, ['Invoice 2', 'Invoice 1', 'Invoice 0'])
+
+    def test_invalid_cursor(self):
+        """
+        Test that an invalid cursor or limit returns a 400 Bad Request
+        """
+
+        response = self.client.get('/emails/list/all/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/emails/list/all/', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestEmailSearch(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self, subject, body, sender='test2@example.com', recipient='test@example.com'):
+        response = self.client.post('/emails/list/create/', {
+            "subject": subject,
+            "body": body,
+            "sender_email": sender,
+            "recipient_email": recipient,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['data']['id']
+
+    def test_search_subject_and_body_ranked(self):
+        """
+        Test that the search looks at subject and body and ranks subject matches first
+        """
+
+        body_match = self.send_email('Weekly report', 'The invoice is attached')
+        subject_match = self.send_email('Invoice March', 'Please pay')
+        self.send_email('Lunch', 'See you at noon')
+
+        response = self.client.get('/emails/search/', {'q': 'invoice'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [email['id'] for email in response.data['data']]
+        self.assertEqual(ids, [subject_match, body_match])
+
+    def test_search_index_follows_updates(self):
+        """
+        Test that an updated email is found by its new content only
+        """
+
+        email_id = self.send_email('Draft', 'first version')
+        response = self.client.put(f'/emails/detail/{email_id}/', {
+            "sender_email": "test2@example.com",
+            "recipient_email": "test@example.com",
+            "subject": "Draft",
+            "body": "second revision",
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/emails/search/', {'q': 'revision'})
+        self.assertEqual([email['id'] for email in response.data['data']], [email_id])
+        response = self.client.get('/emails/search/', {'q': 'first'})
+        self.assertEqual(response.data['data'], [])
+
+    def test_search_is_scoped_to_user(self):
+        """
+        Test that the search only returns emails sent or received by the user
+        """
+
+        mine = self.send_email('Project kickoff', 'agenda')
+        self.send_email('Project secret', 'agenda',
+                        sender='test2@example.com', recipient='test2@example.com')
+
+        response = self.client.get('/emails/search/', {'q': 'project'})
+        self.assertEqual([email['id'] for email in response.data['data']], [mine])
+
+    def test_search_pagination(self):
+        """
+        Test that search results are paginated with next_cursor
+        """
+
+        for i in range(3):
+            self.send_email(f'Newsletter {i}', 'news')
+
+        first = self.client.get('/emails/search/', {'q': 'newsletter', 'limit': 2})
+        second = self.client.get(
+            '/emails/search/', {'q': 'newsletter', 'limit': 2, 'cursor': first.data['next_cursor']})
+
+        self.assertEqual(len(first.data['data']), 2)
+        self.assertEqual(len(second.data['data']), 1)
+        self.assertIsNone(second.data['next_cursor'])
+
+    def test_search_without_terms(self):
+        """
+        Test that a search without terms returns a 400 Bad Request
+        """
+
+        response = self.client.get('/emails/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestEmailQueryBudget(APITestCase):
+    """
+    Test that every endpoint runs a fixed number of queries no matter how many emails are returned
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.others = [User.objects.create_user(
+            username=f'other{i}', email=f'other{i}@example.com', password='testpassword')
+            for i in range(3)]
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def create_emails(self, count):
+        for i in range(count):
+            other = self.others[i % len(self.others)]
+            received = Email.objects.create(
+                subject=f'Received {i}', body='body', sender=other, recipient=self.user)
+            Email.objects.create(
+                subject=f'Sent {i}', body='body', sender=self.user, recipient=other)
+            FolderEmail.objects.create(email=received, folder=self.folder)
+        return received
+
+    def assertQueryBudget(self, num, url):
+        for count in (1, 20):
+            Email.objects.all().delete()
+            self.create_emails(count)
+            # The emails are written without the API, so the cached pages are not invalidated
+            get_mailbox_cache().clear()
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertGreaterEqual(len(response.data['data']), count)
+
+    def test_get_all_emails_queries(self):
+        # The mailbox version, the received emails and the sent emails
+        self.assertQueryBudget(3, '/emails/list/all/')
+
+    def test_get_emails_by_sender_queries(self):
+        self.assertQueryBudget(1, '/emails/list/sender/test@example.com/')
+
+    def test_get_emails_by_recipient_queries(self):
+        self.assertQueryBudget(1, '/emails/list/recipient/test@example.com/')
+
+    def test_get_emails_by_status_queries(self):
+        self.assertQueryBudget(1, '/emails/list/status/false/')
+
+    def test_get_emails_by_folder_queries(self):
+        # The mailbox version, the folder and its emails
+        self.assertQueryBudget(3, f'/emails/folders/{self.folder.id}/')
+
+    def test_get_email_queries(self):
+        email = self.create_emails(1)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/emails/detail/{email.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_change_email_status_queries(self):
+        email = self.create_emails(1)
+        rebuild_counters()
+        # Lock the email, update it, the counters, the mailbox versions and changes, inside a savepoint
+        with self.assertNumQueries(7):
+            response = self.client.put(f'/emails/status/read/{email.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TestMailboxCounters(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self, priority='normal'):
+        response = self.client.post('/emails/list/create/', {
+            "subject": "Hello",
+            "body": "Hello",
+            "sender_email": "test2@example.com",
+            "recipient_email": "test@example.com",
+            "priority": priority,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['data']['id']
+
+    def get_counters(self):
+        response = self.client.get('/emails/counters/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_counters_follow_write_paths(self):
+        """
+        Test that creating, reading, updating and deleting emails keeps the counters up to date
+        """
+
+        self.assertEqual(self.get_counters()['total'], 0)
+
+        high = self.send_email('high')
+        low = self.send_email('low')
+        self.send_email('low')
+        self.assertEqual(self.get_counters(), {
+            'total': 3, 'unread': 3, 'unread_high': 1, 'unread_normal': 0, 'unread_low': 2})
+
+        # Reading an email twice only counts once
+        self.client.put(f'/emails/status/read/{high}/')
+        self.client.put(f'/emails/status/read/{high}/')
+        self.assertEqual(self.get_counters(), {
+            'total': 3, 'unread': 2, 'unread_high': 0, 'unread_normal': 0, 'unread_low': 2})
+
+        response = self.client.put(f'/emails/detail/{low}/', {
+            "sender_email": "test2@example.com",
+            "recipient_email": "test@example.com",
+            "subject": "Hello",
+            "body": "Hello",
+            "priority": "normal",
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_counters(), {
+            'total': 3, 'unread': 2, 'unread_high': 0, 'unread_normal': 1, 'unread_low': 1})
+
+        self.client.delete(f'/emails/detail/{low}/')
+        self.client.delete(f'/emails/detail/{high}/')
+        self.assertEqual(self.get_counters(), {
+            'total': 1, 'unread': 1, 'unread_high': 0, 'unread_normal': 0, 'unread_low': 1})
+
+    def test_update_of_a_stale_email(self):
+        """
+        Test that an update computes the counter deltas from the current row, not from the email
+        it was given, which a concurrent update may have changed since it was read
+        """
+
+        email_id = self.send_email('high')
+        stale = Email.objects.get(pk=email_id)
+        data = {
+            "sender_email": "test2@example.com",
+            "recipient_email": "test@example.com",
+            "subject": "Hello",
+            "body": "Hello",
+        }
+        response = self.client.put(f'/emails/detail/{email_id}/', {**data, "priority": "low"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        serializer = EmailSerializer(stale, data={**data, "priority": "normal"})
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        self.assertEqual(self.get_counters(), {
+            'total': 1, 'unread': 1, 'unread_high': 0, 'unread_normal': 1, 'unread_low': 0})
+        self.assertEqual(serializer.data['priority'], 'normal')
+
+    def test_rebuild_counters_command(self):
+        """
+        Test that the rebuild command recomputes the counters from the emails table
+        """
+
+        self.send_email('high')
+        Email.objects.create(subject='Imported', sender=self.other,
+                             recipient=self.user, priority='low')
+        Email.objects.create(subject='Imported', sender=self.other,
+                             recipient=self.user, status=True)
+
+        call_command('rebuild_mailbox_counters', stdout=StringIO())
+
+        self.assertEqual(self.get_counters(), {
+            'total': 3, 'unread': 2, 'unread_high': 1, 'unread_normal': 0, 'unread_low': 1})
+
+
+class TestEmailBulkChangeStatus(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_mark_as_read_by_ids(self):
+        """
+        Test that only the unread emails received by the user are changed and returned
+        """
+
+        unread = [Email.objects.create(subject='Unread', sender=self.other, recipient=self.user)
+                  for _ in range(3)]
+        read = Email.objects.create(
+            subject='Read', sender=self.other, recipient=self.user, status=True)
+        not_mine = Email.objects.create(
+            subject='Not mine', sender=self.user, recipient=self.other)
+        rebuild_counters()
+
+        ids = [email.id for email in unread] + [read.id, not_mine.id]
+        response = self.client.put(
+            '/emails/status/bulk/', {'status': True, 'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], sorted(email.id for email in unread))
+        self.assertEqual(Email.objects.filter(recipient=self.user, status=False).count(), 0)
+        not_mine.refresh_from_db()
+        self.assertFalse(not_mine.status)
+        self.assertEqual(self.client.get('/emails/counters/').data['data']['unread'], 0)
+
+    def test_bulk_mark_as_unread_by_folder_and_date(self):
+        """
+        Test that the emails of a folder sent before a date can be marked as unread
+        """
+
+        folder = Folder.objects.create(name='Work', user=self.user)
+        old = Email.objects.create(
+            subject='Old', sender=self.other, recipient=self.user, status=True)
+        new = Email.objects.create(
+            subject='New', sender=self.other, recipient=self.user, status=True)
+        outside = Email.objects.create(
+            subject='Outside', sender=self.other, recipient=self.user, status=True)
+        FolderEmail.objects.create(email=old, folder=folder)
+        FolderEmail.objects.create(email=new, folder=folder)
+
+        response = self.client.put('/emails/status/bulk/', {
+            'status': False, 'folder_id': folder.id, 'before': new.timestamp.isoformat(),
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [old.id])
+        self.assertEqual(
+            list(Email.objects.filter(status=False).values_list('id', flat=True)), [old.id])
+        outside.refresh_from_db()
+        self.assertTrue(outside.status)
+
+    def test_bulk_change_status_invalid_selection(self):
+        """
+        Test that a selection without ids nor folder, or with a folder of another user, is rejected
+        """
+
+        response = self.client.put(
+            '/emails/status/bulk/', {'status': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        folder = Folder.objects.create(name='Other', user=self.other)
+        response = self.client.put(
+            '/emails/status/bulk/', {'status': True, 'folder_id': folder.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestMultiRecipientEmail(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.recipients = [User.objects.create_user(
+            username=f'recipient{i}', email=f'recipient{i}@example.com', password='testpassword')
+            for i in range(5)]
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self, recipient_emails):
+        return self.client.post('/emails/list/create/', {
+            "subject": "Newsletter",
+            "body": "News of the week",
+            "sender_email": "test@example.com",
+            "recipient_emails": recipient_emails,
+        }, format='json')
+
+    def test_send_to_many_recipients(self):
+        """
+        Test that one email is created per recipient and returned in the response
+        """
+
+        addresses = [user.email for user in self.recipients]
+        response = self.send_email(addresses)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([email['recipient']['email'] for email in response.data['data']],
+                         addresses)
+        self.assertEqual(Email.objects.filter(sender=self.user).count(), 5)
+        for recipient in self.recipients:
+            self.client.force_authenticate(user=recipient)
+            self.assertEqual(self.client.get('/emails/counters/').data['data']['unread'], 1)
+
+    def test_unknown_recipients_are_reported_together(self):
+        """
+        Test that every unknown address is reported and no email is created
+        """
+
+        response = self.send_email(
+            ['recipient0@example.com', 'nobody@example.com', 'ghost@example.com'])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("'nobody@example.com', 'ghost@example.com'", str(response.data))
+        self.assertFalse(Email.objects.exists())
+
+    @override_settings(EMAIL_BULK_CREATE_BATCH_SIZE=2)
+    def test_send_queries_do_not_depend_on_recipients(self):
+        """
+        Test that the users are resolved in one query and the emails inserted in batches
+        """
+
+        # Users, savepoint, threads lookup, insert and read back, 3 inserts of 2 emails,
+        # thread aggregates, search index, 2 counters queries, mailbox versions and changes, release
+        search_index_queries = 2 if connection.vendor == 'sqlite' else 1
+        with self.assertNumQueries(14 + search_index_queries):
+            response = self.send_email([user.email for user in self.recipients])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class TestEmailStreaming(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def read_stream(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_stream_all_emails(self):
+        """
+        Test that every email of the user is streamed, newest first, with the stream query param
+        """
+
+        emails = [Email.objects.create(subject=f'Email {i}', sender=self.other, recipient=self.user)
+                  for i in range(3)]
+        Email.objects.create(subject='Not mine', sender=self.other, recipient=self.other)
+
+        rows = self.read_stream(self.client.get('/emails/list/all/', {'stream': 1}))
+
+        self.assertEqual([row['id'] for row in rows], [email.id for email in reversed(emails)])
+        self.assertEqual(rows[0], EmailSerializer(emails[-1], fields=LIST_FIELDS).data)
+
+    @override_settings(EMAIL_STREAM_CHUNK_SIZE=2)
+    def test_stream_folder_emails_with_accept_header(self):
+        """
+        Test that the emails of a folder are streamed with the application/x-ndjson Accept header
+        """
+
+        folder = Folder.objects.create(name='Work', user=self.user)
+        for i in range(5):
+            email = Email.objects.create(
+                subject=f'Email {i}', sender=self.other, recipient=self.user)
+            FolderEmail.objects.create(email=email, folder=folder)
+
+        rows = self.read_stream(self.client.get(
+            f'/emails/folders/{folder.id}/', HTTP_ACCEPT='application/x-ndjson'))
+
+        self.assertEqual(len(rows), 5)
+
+
+class TestMailboxExport(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+        self.emails = [Email.objects.create(
+            subject=f'Email {i}', body=f'From the body {i}', sender=self.other, recipient=self.user)
+            for i in range(5)]
+        FolderEmail.objects.create(email=self.emails[0], folder=self.folder)
+        Email.objects.create(subject='Not mine', sender=self.other, recipient=self.other)
+
+    def export(self, **params):
+        response = self.client.get('/emails/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    @override_settings(EMAIL_STREAM_CHUNK_SIZE=2)
+    def test_export_ndjson_with_folders(self):
+        """
+        Test that every email of the user is exported in id order with its folders
+        """
+
+        rows = [json.loads(line) for line in self.export(type='ndjson').splitlines()]
+
+        self.assertEqual([row['id'] for row in rows], [email.id for email in self.emails])
+        self.assertEqual(rows[0]['folders'], ['Work'])
+        self.assertEqual(rows[1]['folders'], [])
+        self.assertEqual(rows[0]['recipient'], 'test@example.com')
+
+    def test_export_mbox_gzip_and_resume(self):
+        """
+        Test that a gzip mbox export can be resumed after the last received email
+        """
+
+        content = gzip.decompress(self.export(type='mbox', gzip=1, after=self.emails[2].id))
+
+        with tempfile.NamedTemporaryFile(suffix='.mbox') as file:
+            file.write(content)
+            file.flush()
+            messages = list(mailbox.mbox(file.name))
+        self.assertEqual([int(message['X-Email-Id']) for message in messages],
+                         [self.emails[3].id, self.emails[4].id])
+        self.assertEqual(messages[0].get_payload().strip(), '>From the body 3')
+
+    def test_export_invalid_parameters(self):
+        """
+        Test that an unknown format or resume point returns a 400 Bad Request
+        """
+
+        response = self.client.get('/emails/export/', {'type': 'pst'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/emails/export/', {'after': 'last'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_mailbox_command_resume(self):
+        """
+        Test that the command appends the resumed export to the output file
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mailbox.ndjson.gz')
+            call_command('export_mailbox', 'test@example.com', '--format', 'ndjson', '--gzip',
+                         '--output', path, '--chunk-size', '2', stderr=StringIO())
+            call_command('export_mailbox', 'test@example.com', '--format', 'ndjson', '--gzip',
+                         '--output', path, '--after', str(self.emails[3].id), stderr=StringIO())
+            with gzip.open(path) as file:
+                ids = [json.loads(line)['id'] for line in file]
+
+        expected_ids = [email.id for email in self.emails]
+        self.assertEqual(ids, expected_ids + expected_ids[4:])
+
+
+class TestImportEmails(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def create_archive(self, export_format):
+        folder = Folder.objects.create(name='Archive', user=self.user)
+        emails = []
+        for i in range(5):
+            email = Email.objects.create(
+                subject=f'Email {i}', body=f'From line {i}\nsecond line', sender=self.other,
+                recipient=self.user, status=i % 2 == 0, priority='high',
+                timestamp=timezone.now() - timedelta(days=i))
+            FolderEmail.objects.create(email=email, folder=folder)
+            emails.append(email)
+        content = self.client.get('/emails/export/', {'type': export_format}).getvalue()
+        expected = [(email.subject, email.body, email.timestamp, email.status) for email in emails]
+        Email.objects.all().delete()
+        folder.delete()
+        return content, expected
+
+    def import_archive(self, export_format, content, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'archive.{export_format}')
+            with open(path, 'wb') as file:
+                file.write(content)
+            out = StringIO()
+            call_command('import_emails', path, '--batch-size', '2', *args,
+                         stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def assertImported(self, expected):
+        imported = [(email.subject, email.body, email.timestamp, email.status)
+                    for email in Email.objects.order_by('id')]
+        self.assertEqual(imported, expected)
+        folder = Folder.objects.get(name='Archive', user=self.user)
+        self.assertEqual(FolderEmail.objects.filter(folder=folder).count(), 5)
+        self.assertEqual(self.client.get('/emails/counters/').data['data']['unread_high'], 2)
+        response = self.client.get('/emails/search/', {'q': 'second'})
+        self.assertEqual(len(response.data['data']), 5)
+
+    def test_import_ndjson_archive(self):
+        """
+        Test that an NDJSON export is imported with its timestamps, status and folders
+        """
+
+        content, expected = self.create_archive('ndjson')
+
+        output = self.import_archive(
+            'ndjson', content, '--folders-owner', 'test@example.com')
+
+        self.assertIn('Imported 5 emails, skipped 0', output)
+        self.assertImported(expected)
+
+    def test_import_mbox_archive(self):
+        """
+        Test that an mbox export is imported with its timestamps, status and folders
+        """
+
+        content, expected = self.create_archive('mbox')
+        # Dates are exported with a precision of one second in mbox
+        expected = [(subject, body, timestamp.replace(microsecond=0), read)
+                    for subject, body, timestamp, read in expected]
+
+        self.import_archive('mbox', content, '--folders-owner', 'test@example.com')
+
+        self.assertImported(expected)
+
+    def test_import_reports_bad_lines(self):
+        """
+        Test that lines with invalid JSON, a missing key or a value of the wrong type are reported
+        and skipped, and that the valid lines around them are imported
+        """
+
+        def row(**fields):
+            return json.dumps({'sender': 'test2@example.com', 'recipient': 'test@example.com',
+                               'subject': 'Hello', 'body': 'Hello', **fields}).encode()
+
+        content = b'\n'.join([
+            row(subject='First'),
+            b'{"sender": "test2@example.com",',
+            json.dumps({'sender': 'test2@example.com', 'subject': 'No recipient'}).encode(),
+            row(timestamp=20240101),
+            b'[1, 2]',
+            row(subject='Last'),
+        ])
+
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as file:
+            file.write(content)
+            file.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_emails', file.name, '--batch-size', '1', stdout=out, stderr=err)
+
+        self.assertIn('Imported 2 emails, skipped 4', out.getvalue())
+        self.assertIn('Skipped line 2: invalid JSON', err.getvalue())
+        self.assertIn("Skipped line 3: missing recipient", err.getvalue())
+        self.assertIn('Skipped line 4: timestamp must be a string', err.getvalue())
+        self.assertIn('Skipped line 5: the record is not an object', err.getvalue())
+        self.assertEqual([email.subject for email in Email.objects.order_by('id')], ['First', 'Last'])
+
+    def test_folders_owner_only_files_own_emails(self):
+        """
+        Test that the emails the folders owner is not a party to are imported without folders
+        """
+
+        third = User.objects.create_user(
+            username='testuser3', email='test3@example.com', password='testpassword3')
+        content = b'\n'.join(json.dumps({
+            'sender': 'test2@example.com', 'recipient': recipient, 'subject': recipient,
+            'body': 'Hello', 'timestamp': '2024-01-01T00:00:00Z', 'folders': ['Archive'],
+        }).encode() for recipient in ['test@example.com', 'test3@example.com'])
+
+        output = self.import_archive('ndjson', content, '--folders-owner', 'test@example.com')
+
+        self.assertIn('Imported 2 emails, skipped 0', output)
+        folder = Folder.objects.get(name='Archive', user=self.user)
+        self.assertEqual([row.email.subject for row in FolderEmail.objects.filter(folder=folder)],
+                         ['test@example.com'])
+        response = self.client.get('/emails/sync/')
+        self.assertEqual([email['subject'] for email in response.data['data']['changed']], ['test@example.com'])
+        self.assertEqual(response.data['data']['deleted'], [])
+        self.assertTrue(Email.objects.filter(recipient=third).exists())
+
+    def test_mbox_round_trip_of_escaped_from_lines(self):
+        """
+        Test that body lines starting with "From " or ">From " are the same after an mbox export and import
+        """
+
+        body = 'From the start\n>From a quote\n>>From a quote of a quote\nFrom: not a header'
+        Email.objects.create(subject='Quoted', body=body, sender=self.other, recipient=self.user)
+        content = self.client.get('/emails/export/', {'type': 'mbox'}).getvalue()
+        self.assertIn(b'\n>>From a quote\n>>>From a quote of a quote\n', content)
+        Email.objects.all().delete()
+
+        self.import_archive('mbox', content)
+
+        self.assertEqual(Email.objects.get().body, body)
+
+    def test_import_skips_unknown_users(self):
+        """
+        Test that emails from or to unknown addresses are skipped
+        """
+
+        content = b'\n'.join(json.dumps({
+            'sender': sender, 'recipient': 'test@example.com', 'subject': 'Hello',
+            'body': 'Hello', 'timestamp': '2024-01-01T00:00:00Z',
+        }).encode() for sender in ['test2@example.com', 'nobody@example.com'])
+
+        output = self.import_archive('ndjson', content)
+
+        self.assertIn('Imported 1 emails, skipped 1', output)
+        self.assertEqual(Email.objects.get().timestamp.year, 2024)
+
+    def test_import_invalid_and_naive_timestamps(self):
+        """
+        Test that a record with an invalid timestamp is reported and skipped, and that a
+        timestamp without a timezone is imported in the current timezone
+        """
+
+        content = b'\n'.join(json.dumps({
+            'sender': 'test2@example.com', 'recipient': 'test@example.com', 'subject': subject,
+            'body': 'Hello', 'timestamp': timestamp,
+        }).encode() for subject, timestamp in [('Invalid', '2024-13-01T00:00:00'), ('Naive', '2024-01-01T10:00:00')])
+
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as file:
+            file.write(content)
+            file.flush()
+            out, err = StringIO(), StringIO()
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', RuntimeWarning)
+                call_command('import_emails', file.name, stdout=out, stderr=err)
+
+        self.assertIn('Imported 1 emails, skipped 1', out.getvalue())
+        self.assertIn("Skipped line 1: invalid timestamp '2024-13-01T00:00:00'", err.getvalue())
+        email = Email.objects.get()
+        self.assertEqual(email.subject, 'Naive')
+        self.assertEqual(email.timestamp, datetime(2024, 1, 1, 10, tzinfo=dt_timezone.utc))
+
+
+class TestConditionalGet(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self):
+        response = self.client.post('/emails/list/create/', {
+            "subject": "Hello",
+            "body": "Hello",
+            "sender_email": "test2@example.com",
+            "recipient_email": "test@example.com",
+        })
+        return response.data['data']['id']
+
+    def assertNotModified(self, url, etag):
+        # Only the mailbox version is read, the emails are neither queried nor serialized
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_email_list_etag(self):
+        """
+        Test that the email list answers 304 until an email of the user changes
+        """
+
+        email_id = self.send_email()
+        etag = self.client.get('/emails/list/all/')['ETag']
+        self.assertNotModified('/emails/list/all/', etag)
+
+        self.client.put(f'/emails/status/read/{email_id}/')
+        etag = self.assertModified('/emails/list/all/', etag)
+
+        self.client.delete(f'/emails/detail/{email_id}/')
+        etag = self.assertModified('/emails/list/all/', etag)
+
+        # Emails between other users do not change the mailbox
+        Email.objects.create(subject='Other', sender=self.other, recipient=self.other)
+        self.assertNotModified('/emails/list/all/', etag)
+
+    def test_folder_emails_etag(self):
+        """
+        Test that the folder emails answer 304 until the folder membership changes
+        """
+
+        email_id = self.send_email()
+        url = f'/emails/folders/{self.folder.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+
+        self.client.post('/emails/folders/', {'email': email_id, 'folder': self.folder.id})
+        etag = self.assertModified(url, etag)
+
+        self.client.delete(f'/emails/{email_id}/folders/{self.folder.id}/')
+        self.assertModified(url, etag)
+
+
+class TestMailboxCache(APITestCase):
+    def setUp(self):
+        get_mailbox_cache().clear()
+        get_stats_cache().clear()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self, sender='test2@example.com', recipient='test@example.com'):
+        response = self.client.post('/emails/list/create/', {
+            "subject": "Hello",
+            "body": "Hello",
+            "sender_email": sender,
+            "recipient_email": recipient,
+        })
+        return response.data['data']['id']
+
+    def test_email_list_cache_hit_and_invalidation(self):
+        """
+        Test that a list page is served from the cache until the mailbox of the user changes
+        """
+
+        email_id = self.send_email()
+        first = self.client.get('/emails/list/all/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        # Only the mailbox version is read
+        with self.assertNumQueries(1):
+            second = self.client.get('/emails/list/all/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        self.client.put(f'/emails/status/read/{email_id}/')
+        third = self.client.get('/emails/list/all/')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertTrue(third.data['data'][0]['status'])
+
+    def test_cache_is_per_user(self):
+        """
+        Test that a write only invalidates the cached pages of the users it concerns
+        """
+
+        self.send_email()
+        self.client.get('/emails/list/all/')
+        self.client.force_authenticate(user=self.other)
+        self.client.get('/emails/list/all/')
+
+        # An email between other users does not invalidate the cache of the first user
+        User.objects.create_user(
+            username='testuser3', email='test3@example.com', password='testpassword3')
+        self.send_email(sender='test2@example.com', recipient='test3@example.com')
+
+        self.assertEqual(self.client.get('/emails/list/all/')['X-Cache'], 'MISS')
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/emails/list/all/')['X-Cache'], 'HIT')
+
+    def test_folder_list_cache_and_stats(self):
+        """
+        Test that the folder list is cached, invalidated by folder writes and counted in the stats
+        """
+
+        self.client.get('/folders/')
+        self.assertEqual(self.client.get('/folders/')['X-Cache'], 'HIT')
+        self.client.post('/folders/', {'name': 'Work'})
+        response = self.client.get('/folders/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([folder['name'] for folder in response.data['data']], ['Work'])
+
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='adminpassword')
+        self.client.force_authenticate(user=admin)
+        stats = self.client.get('/emails/cache/stats/').data['data']
+        self.assertEqual(stats, {'hits': 1, 'misses': 2})
+
+        # Evicting the pages does not reset the counters
+        get_mailbox_cache().clear()
+        stats = self.client.get('/emails/cache/stats/').data['data']
+        self.assertEqual(stats, {'hits': 1, 'misses': 2})
+
+
+    def test_delete_empty_folder_invalidates_folder_list(self):
+        """
+        Test that deleting a folder without emails removes it from the cached folder list
+        """
+
+        folder = Folder.objects.create(name='Empty', user=self.user)
+        self.client.get('/folders/')
+        self.assertEqual(self.client.get('/folders/')['X-Cache'], 'HIT')
+
+        response = self.client.delete(f'/folders/{folder.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get('/folders/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['data'], [])
+
+
+class TestSparseFields(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_snippet_is_computed_on_write(self):
+        """
+        Test that the snippet is the beginning of the plain-text body, on create, bulk create and update
+        """
+
+        email = Email.objects.create(
+            subject='Hello', body='<p>Hello\n  <b>world</b></p> ' + 'x' * 500,
+            sender=self.other, recipient=self.user)
+        self.assertTrue(email.snippet.startswith('Hello world x'))
+        self.assertEqual(len(email.snippet), SNIPPET_LENGTH)
+
+        email.body = 'Short'
+        email.save(update_fields=['body'])
+        email.refresh_from_db()
+        self.assertEqual(email.snippet, 'Short')
+
+        response = self.client.post('/emails/list/create/', {
+            "subject": "Hello",
+            "body": "Many recipients",
+            "sender_email": "test@example.com",
+            "recipient_emails": ["test2@example.com"],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['data'][0]['snippet'], 'Many recipients')
+
+    def test_list_returns_snippet_without_loading_body(self):
+        """
+        Test that the list views return the snippet instead of the body and do not select the body
+        """
+
+        Email.objects.create(subject='Hello', body='The body', sender=self.other, recipient=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/emails/list/all/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['data'][0]), set(LIST_FIELDS))
+        self.assertEqual(response.data['data'][0]['snippet'], 'The body')
+        self.assertFalse(any('."body"' in query['sql'] for query in queries))
+
+    def test_fields_param(self):
+        """
+        Test that the fields query param selects the returned fields and the loaded columns
+        """
+
+        Email.objects.create(subject='Hello', body='The body', sender=self.other, recipient=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/emails/list/recipient/test@example.com/',
+                                       {'fields': 'id,subject'})
+        self.assertEqual(list(response.data['data'][0]), ['id', 'subject'])
+        self.assertEqual(len(queries), 1)
+        columns = queries[0]['sql'].split(' FROM ')[0]
+        self.assertNotIn('"snippet"', columns)
+        self.assertNotIn('user_api_user', columns)
+
+        response = self.client.get('/emails/list/all/', {'fields': 'subject,body,sender'})
+        self.assertEqual(response.data['data'][0], {
+            'sender': {'email': 'test2@example.com'}, 'subject': 'Hello', 'body': 'The body'})
+
+    def test_unknown_fields(self):
+        """
+        Test that unknown fields return a 400 Bad Request
+        """
+
+        response = self.client.get('/emails/list/all/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        folder = Folder.objects.create(name='Work', user=self.user)
+        response = self.client.get(f'/emails/folders/{folder.id}/', {'fields': ''})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(EMAIL_BODY_COMPRESSION_THRESHOLD=100)
+class TestBodyCompression(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+
+    def test_large_bodies_are_compressed(self):
+        """
+        Test that bodies above the threshold are stored compressed and read back unchanged
+        """
+
+        body = 'Weekly newsletter with the same words again and again. ' * 50
+        large = Email.objects.create(subject='Large', body=body, sender=self.user, recipient=self.user)
+        small = Email.objects.create(subject='Small', body='Hi', sender=self.user, recipient=self.user)
+
+        stored = dict(Email.objects.values_list('id', 'body'))
+        self.assertEqual(stored[large.id][:1], ZLIB)
+        self.assertLess(len(stored[large.id]), len(body) / 10)
+        self.assertEqual(stored[small.id], RAW + b'Hi')
+
+        email = Email.objects.get(id=large.id)
+        # The body is only decompressed when it is read
+        self.assertIsInstance(email.__dict__['body'], bytes)
+        self.assertEqual(email.body, body)
+        self.assertEqual(Email.objects.get(id=small.id).body, 'Hi')
+
+    def test_compressed_bodies_are_searchable(self):
+        """
+        Test that a compressed body is returned by the API and indexed for the search
+        """
+
+        body = 'Quarterly results are attached. ' * 20 + 'Kangaroo'
+        response = self.client.post('/emails/list/create/', {
+            "subject": "Report",
+            "body": body,
+            "sender_email": "test@example.com",
+            "recipient_email": "test@example.com",
+        })
+        email_id = response.data['data']['id']
+
+        response = self.client.get(f'/emails/detail/{email_id}/')
+        self.assertEqual(response.data['data']['body'], body)
+        response = self.client.get('/emails/search/', {'q': 'kangaroo'})
+        self.assertEqual([email['id'] for email in response.data['data']], [email_id])
+
+    def test_benchmark_command(self):
+        Email.objects.create(subject='Large', body='abc ' * 1000, sender=self.user, recipient=self.user)
+        output = StringIO()
+        call_command('benchmark_body_compression', stdout=output)
+        self.assertIn('Emails: 1, compressed: 1', output.getvalue())
+        self.assertIn('raw 4000 bytes', output.getvalue())
+
+
+class TestThreads(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def send_email(self, subject, sender='test2@example.com', recipient='test@example.com', **data):
+        response = self.client.post('/emails/list/create/', {
+            "subject": subject,
+            "body": "Hello",
+            "sender_email": sender,
+            "recipient_email": recipient,
+            **data,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['data']
+
+    def get_threads(self, **params):
+        response = self.client.get('/emails/threads/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_replies_join_the_thread(self):
+        """
+        Test that replies join the thread by subject or by in_reply_to and update its aggregates
+        """
+
+        first = self.send_email('Project plan')
+        reply = self.send_email('RE: project  plan', sender='test@example.com', recipient='test2@example.com')
+        answer = self.send_email('Changing the subject', in_reply_to=reply['id'])
+        other = self.send_email('Lunch')
+
+        self.assertEqual(first['thread'], reply['thread'])
+        self.assertEqual(first['thread'], answer['thread'])
+        self.assertNotEqual(first['thread'], other['thread'])
+
+        threads = self.get_threads()['data']
+        self.assertEqual([thread['id'] for thread in threads], [other['thread'], first['thread']])
+        self.assertEqual(threads[1]['subject'], 'Project plan')
+        self.assertEqual(threads[1]['participants'], ['test2@example.com', 'test@example.com'])
+        self.assertEqual(threads[1]['message_count'], 3)
+        # The reply sent by the user is unread for the other user only
+        self.assertEqual(threads[1]['unread'], 2)
+        self.assertEqual(Thread.objects.get(id=first['thread']).unread_for(self.other), 1)
+
+    def test_aggregates_follow_status_and_delete(self):
+        """
+        Test that reading and deleting emails update the thread aggregates
+        """
+
+        first = self.send_email('Invoice')
+        second = self.send_email('Re: Invoice')
+        thread_id = first['thread']
+
+        self.client.put(f'/emails/status/read/{first["id"]}/')
+        self.assertEqual(self.get_threads()['data'][0]['unread'], 1)
+        self.client.put('/emails/status/bulk/', {'status': True, 'ids': [second['id']]}, format='json')
+        self.assertEqual(self.get_threads()['data'][0]['unread'], 0)
+
+        self.client.delete(f'/emails/detail/{second["id"]}/')
+        thread = Thread.objects.get(id=thread_id)
+        self.assertEqual(thread.message_count, 1)
+        self.assertEqual(thread.last_timestamp, Email.objects.get(id=first['id']).timestamp)
+        self.client.delete(f'/emails/detail/{first["id"]}/')
+        self.assertFalse(Thread.objects.filter(id=thread_id).exists())
+
+    def test_thread_list_pagination_and_queries(self):
+        """
+        Test that the thread list is paginated and does not depend on the number of emails
+        """
+
+        for i in range(3):
+            self.send_email(f'Subject {i}')
+            self.send_email(f'Re: Subject {i}')
+
+        # The mailbox version and the threads where the user is user_a and user_b
+        with self.assertNumQueries(3):
+            first = self.get_threads(limit=2)
+        second = self.get_threads(limit=2, cursor=first['next_cursor'])
+
+        self.assertEqual(len(first['data']), 2)
+        self.assertEqual(len(second['data']), 1)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_thread_emails(self):
+        """
+        Test that the emails of a thread are listed only for its participants
+        """
+
+        first = self.send_email('Plan')
+        second = self.send_email('Re: Plan')
+        self.send_email('Secret', sender='test2@example.com', recipient='test2@example.com')
+        secret = Thread.objects.get(subject='Secret')
+
+        response = self.client.get(f'/emails/threads/{first["thread"]}/')
+        self.assertEqual([email['id'] for email in response.data['data']], [second['id'], first['id']])
+        response = self.client.get(f'/emails/threads/{secret.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestEmailStatusFilter(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_status_is_scoped_to_user(self):
+        """
+        Test that only the emails received by the user are returned, newest first, one page at a time
+        """
+
+        unread = [Email.objects.create(subject=f'Unread {i}', sender=self.other, recipient=self.user)
+                  for i in range(3)]
+        Email.objects.create(subject='Read', sender=self.other, recipient=self.user, status=True)
+        Email.objects.create(subject='Not mine', sender=self.user, recipient=self.other)
+
+        first = self.client.get('/emails/list/status/false/', {'limit': 2})
+        second = self.client.get('/emails/list/status/false/', {'limit': 2, 'cursor': first.data['next_cursor']})
+
+        ids = [email['id'] for email in first.data['data'] + second.data['data']]
+        self.assertEqual(ids, [email.id for email in reversed(unread)])
+        self.assertIsNone(second.data['next_cursor'])
+        response = self.client.get('/emails/list/status/true/')
+        self.assertEqual([email['subject'] for email in response.data['data']], ['Read'])
+
+    def test_unread_emails_use_partial_index(self):
+        """
+        Test with EXPLAIN that the unread emails of a user are read from the partial index
+        """
+
+        Email.objects.bulk_create(
+            [Email(subject=f'Email {i}', body='', sender=self.other, recipient=self.user, status=i % 10 != 0)
+             for i in range(1000)])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # The test table is too small for the planner to prefer an index scan on its own
+                cursor.execute('ANALYZE email_api_email')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+        plan = Email.objects.filter(recipient=self.user, status=False).order_by(
+            '-timestamp', '-id')[:50].explain()
+
+        self.assertIn('email_unread_recipient_idx', plan)
+
+
+class TestFolderCounts(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_folder_list_counts(self):
+        """
+        Test that the folder list returns the total and unread emails of every folder in one query
+        """
+
+        folders = [Folder.objects.create(name=f'Folder {i}', user=self.user) for i in range(5)]
+        for i, folder in enumerate(folders):
+            for j in range(i):
+                email = Email.objects.create(
+                    subject='Hello', sender=self.other, recipient=self.user, status=j % 2 == 1)
+                FolderEmail.objects.create(email=email, folder=folder)
+        Folder.objects.create(name='Not mine', user=self.other)
+
+        # The mailbox version and the annotated folders
+        with self.assertNumQueries(2):
+            response = self.client.get('/folders/')
+
+        self.assertEqual(
+            [(folder['name'], folder['total'], folder['unread']) for folder in response.data['data']],
+            [('Folder 0', 0, 0), ('Folder 1', 1, 1), ('Folder 2', 2, 1), ('Folder 3', 3, 2), ('Folder 4', 4, 2)])
+
+
+class TestEmailFilters(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+        now = timezone.now()
+        self.emails = []
+        for i in range(6):
+            email = Email.objects.create(
+                subject=f'Hello {i}', sender=self.other, recipient=self.user, status=i % 2 == 1,
+                priority=('high', 'normal', 'low')[i % 3])
+            Email.objects.filter(id=email.id).update(timestamp=now - timedelta(days=i))
+            FolderEmail.objects.create(email=email, folder=self.folder)
+            self.emails.append(email)
+        Email.objects.create(subject='Not in folder', sender=self.other, recipient=self.user)
+
+    def test_folder_emails_pagination(self):
+        """
+        Test that the folder emails are paginated newest first with the inbox envelope
+        """
+
+        url = f'/emails/folders/{self.folder.id}/'
+        response = self.client.get(url, {'limit': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], 'Emails retrieved successfully')
+        self.assertEqual([email['id'] for email in response.data['data']],
+                         [email.id for email in self.emails[:4]])
+        self.assertNotIn('body', response.data['data'][0])
+
+        response = self.client.get(url, {'limit': 4, 'cursor': response.data['next_cursor']})
+        self.assertEqual([email['id'] for email in response.data['data']],
+                         [email.id for email in self.emails[4:]])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_folder_emails_filters(self):
+        """
+        Test that the folder emails can be filtered by status, priority and date
+        """
+
+        url = f'/emails/folders/{self.folder.id}/'
+        now = timezone.now()
+
+        def ids(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [email['id'] for email in response.data['data']]
+
+        self.assertEqual(ids({'status': 'false'}), [email.id for email in self.emails[::2]])
+        self.assertEqual(ids({'priority': 'high'}), [self.emails[0].id, self.emails[3].id])
+        self.assertEqual(ids({'priority': 'low', 'status': 'true'}), [self.emails[5].id])
+        self.assertEqual(
+            ids({'after': (now - timedelta(days=3, hours=12)).isoformat(),
+                 'before': (now - timedelta(days=1, hours=12)).isoformat()}),
+            [self.emails[2].id, self.emails[3].id])
+        self.assertEqual(ids({'before': (now - timedelta(days=5)).date().isoformat()}),
+                         [])
+
+    def test_invalid_filters(self):
+        """
+        Test that invalid filter values return a bad request
+        """
+
+        for params in ({'status': 'yes'}, {'priority': 'urgent'}, {'after': 'yesterday'},
+                       {'after': '2024-13-01'}, {'before': '2024-02-30T10:00:00'}):
+            response = self.client.get(f'/emails/folders/{self.folder.id}/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertFalse(response.data['success'])
+            response = self.client.get('/emails/list/all/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_naive_datetime_filter(self):
+        """
+        Test that a datetime without a timezone is read in the current timezone, without a warning
+        """
+
+        after = (timezone.now() - timedelta(days=1, hours=12)).replace(tzinfo=None).isoformat()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.client.get('/emails/list/all/', {'after': after})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([email['id'] for email in response.data['data']],
+                         [Email.objects.get(subject='Not in folder').id, self.emails[0].id, self.emails[1].id])
+
+    def test_folder_emails_of_other_user(self):
+        """
+        Test that the emails of another user's folder are not returned
+        """
+
+        folder = Folder.objects.create(name='Theirs', user=self.other)
+        response = self.client.get(f'/emails/folders/{folder.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_inbox_filters(self):
+        """
+        Test that the inbox accepts the same filters as the folders
+        """
+
+        response = self.client.get('/emails/list/all/', {'status': 'true', 'priority': 'normal'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([email['id'] for email in response.data['data']], [self.emails[1].id])
+
+
+class TestFolderEmailBulk(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.inbox = Folder.objects.create(name='Inbox', user=self.user)
+        self.archive = Folder.objects.create(name='Archive', user=self.user)
+        Email.objects.bulk_create([
+            Email(subject=f'Hello {i}', sender=self.other, recipient=self.user) for i in range(50)])
+        self.ids = list(Email.objects.order_by('id').values_list('id', flat=True))
+
+    def folder_ids(self, folder):
+        return sorted(FolderEmail.objects.filter(folder=folder).values_list('email_id', flat=True))
+
+    def test_bulk_add_remove_and_move(self):
+        """
+        Test that many emails are added, removed and moved with a fixed number of queries
+        """
+
+        FolderEmail.objects.create(folder=self.inbox, email_id=self.ids[0])
+        # The folders, the owner check, the emails already in the folder, the insert, the mailbox
+        # version and changes, the savepoint and its release
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                '/emails/folders/bulk/add/', {'ids': self.ids, 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.folder_ids(self.inbox), self.ids)
+
+        response = self.client.post(
+            '/emails/folders/bulk/move/',
+            {'ids': self.ids[:20], 'source_folder_id': self.inbox.id, 'folder_id': self.archive.id},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['removed'], 20)
+        self.assertEqual(self.folder_ids(self.inbox), self.ids[20:])
+        self.assertEqual(self.folder_ids(self.archive), self.ids[:20])
+
+        response = self.client.post(
+            '/emails/folders/bulk/remove/', {'ids': self.ids[:30], 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.data['data']['removed'], 10)
+        self.assertEqual(self.folder_ids(self.inbox), self.ids[30:])
+
+    def test_bulk_add_stamps_only_added_emails(self):
+        """
+        Test that the emails already in the folder are not returned by the delta sync again
+        """
+
+        self.client.post('/emails/folders/bulk/add/', {'ids': self.ids[:10], 'folder_id': self.inbox.id},
+                         format='json')
+        modseq = self.client.get('/emails/sync/').data['modseq']
+
+        response = self.client.post(
+            '/emails/folders/bulk/add/', {'ids': self.ids[5:15], 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/emails/sync/', {'since': modseq})
+        self.assertEqual([email['id'] for email in response.data['data']['changed']], self.ids[10:15])
+
+        modseq = response.data['modseq']
+        self.client.post('/emails/folders/bulk/add/', {'ids': self.ids[:15], 'folder_id': self.inbox.id},
+                         format='json')
+        self.assertEqual(self.client.get('/emails/sync/').data['modseq'], modseq)
+
+    def test_bulk_add_checks_owner(self):
+        """
+        Test that no email is added when one of them is not the user's
+        """
+
+        email = Email.objects.create(subject='Private', sender=self.other, recipient=self.other)
+        response = self.client.post(
+            '/emails/folders/bulk/add/', {'ids': [*self.ids, email.id], 'folder_id': self.inbox.id},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['data'], [email.id])
+        self.assertEqual(self.folder_ids(self.inbox), [])
+
+    def test_bulk_invalid_folders(self):
+        """
+        Test that the folders must belong to the user and be different to move emails
+        """
+
+        folder = Folder.objects.create(name='Theirs', user=self.other)
+        response = self.client.post(
+            '/emails/folders/bulk/add/', {'ids': self.ids, 'folder_id': folder.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            '/emails/folders/bulk/move/',
+            {'ids': self.ids, 'source_folder_id': folder.id, 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            '/emails/folders/bulk/move/',
+            {'ids': self.ids, 'source_folder_id': self.inbox.id, 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            '/emails/folders/bulk/move/', {'ids': self.ids, 'folder_id': self.inbox.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FolderEmail.objects.count(), 0)
+
+
+@override_settings(DELETION_JOB_RUNNER='worker', DELETION_JOB_THRESHOLD=10, DELETION_JOB_BATCH_SIZE=4)
+class TestDeletionJobs(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_small_folder_is_deleted_in_the_request(self):
+        """
+        Test that a folder under the threshold is still deleted right away
+        """
+
+        folder = Folder.objects.create(name='Small', user=self.user)
+        email = Email.objects.create(subject='Hello', sender=self.other, recipient=self.user)
+        FolderEmail.objects.create(email=email, folder=folder)
+        response = self.client.delete(f'/folders/{folder.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Folder.objects.filter(id=folder.id).exists())
+        self.assertEqual(DeletionJob.objects.count(), 0)
+
+    def test_large_folder_is_deleted_in_batches(self):
+        """
+        Test that a large folder is deleted by a background job that reports its progress
+        """
+
+        folder = Folder.objects.create(name='Large', user=self.user)
+        Email.objects.bulk_create([
+            Email(subject=f'Hello {i}', sender=self.other, recipient=self.user) for i in range(11)])
+        FolderEmail.objects.bulk_create([FolderEmail(email=email, folder=folder) for email in Email.objects.all()])
+
+        response = self.client.delete(f'/folders/{folder.id}/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['data']['id']
+        self.assertEqual(response.data['data']['status'], 'pending')
+        # Asking again returns the same job
+        response = self.client.delete(f'/folders/{folder.id}/')
+        self.assertEqual(response.data['data']['id'], job_id)
+
+        # 3 batches of 4, 4 and 3 rows, then the folder with the cascade of its last rows
+        with CaptureQueriesContext(connection) as queries:
+            job = run_deletion_job(job_id)
+        deletes = [query for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 5)
+        self.assertEqual((job.status, job.total, job.deleted), ('done', 11, 11))
+        self.assertFalse(Folder.objects.filter(id=folder.id).exists())
+        self.assertEqual(Email.objects.count(), 11)
+
+        response = self.client.get(f'/emails/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['status'], 'done')
+        self.assertEqual(response.data['data']['deleted'], 11)
+
+    def test_mailbox_deletion(self):
+        """
+        Test that the mailbox deletion removes the received emails and updates the counters and threads
+        """
+
+        for i in range(6):
+            response = self.client.post('/emails/list/create/', {
+                'subject': f'Hello {i % 2}', 'body': 'Hi',
+                'sender_email': self.other.email, 'recipient_email': self.user.email})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        sent = Email.objects.create(subject='Sent', sender=self.user, recipient=self.other)
+        self.assertEqual(MailboxCounter.objects.get(user=self.user).total, 6)
+
+        response = self.client.delete('/emails/mailbox/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        out = StringIO()
+        call_command('run_deletion_jobs', stdout=out)
+        self.assertIn('6/6 done', out.getvalue())
+
+        self.assertEqual(list(Email.objects.values_list('id', flat=True)), [sent.id])
+        counters = MailboxCounter.objects.get(user=self.user)
+        self.assertEqual((counters.total, counters.unread), (0, 0))
+        self.assertFalse(Thread.objects.filter(subject__startswith='Hello').exists())
+
+    def test_job_of_other_user(self):
+        """
+        Test that the deletion jobs of other users are not returned
+        """
+
+        job = DeletionJob.objects.create(user=self.other, kind='mailbox')
+        response = self.client.get(f'/emails/jobs/{job.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite ignores select_for_update')
+@override_settings(DELETION_JOB_RUNNER='worker')
+class TestConcurrentDeletionJobs(APITransactionTestCase):
+    def test_concurrent_requests_start_one_job(self):
+        """
+        Test that two concurrent mailbox deletions of a user start a single job
+        """
+
+        user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        barrier = threading.Barrier(2)
+        job_ids = []
+
+        def start():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    job_ids.append(start_deletion_job(user, DeletionJob.KIND_MAILBOX).id)
+                    # Keep the transaction open while the other request checks for a job
+                    time.sleep(0.2)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=start) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(job_ids), 2)
+        self.assertEqual(len(set(job_ids)), 1)
+        self.assertEqual(DeletionJob.objects.count(), 1)
+
+
+class TestTrash(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+
+    def send(self, subject):
+        response = self.client.post('/emails/list/create/', {
+            'subject': subject, 'body': 'Hello',
+            'sender_email': self.other.email, 'recipient_email': self.user.email})
+        return response.data['data']['id']
+
+    def test_deleted_emails_are_hidden_and_restored(self):
+        """
+        Test that a deleted email leaves the lists, counters, folders and threads, and comes back when restored
+        """
+
+        first = self.send('Hello')
+        second = self.send('Re: Hello')
+        FolderEmail.objects.create(email_id=second, folder=self.folder)
+
+        response = self.client.delete(f'/emails/detail/{second}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get('/emails/list/all/')
+        self.assertEqual([email['id'] for email in response.data['data']], [first])
+        response = self.client.get(f'/emails/folders/{self.folder.id}/')
+        self.assertEqual(response.data['data'], [])
+        response = self.client.get('/folders/')
+        self.assertEqual((response.data['data'][0]['total'], response.data['data'][0]['unread']), (0, 0))
+        self.assertEqual(self.client.get(f'/emails/detail/{second}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(MailboxCounter.objects.get(user=self.user).total, 1)
+        thread = Thread.objects.get()
+        self.assertEqual((thread.message_count, thread.unread_for(self.user)), (1, 1))
+
+        response = self.client.get('/emails/trash/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([email['id'] for email in response.data['data']], [second])
+        self.assertIsNotNone(response.data['data'][0]['deleted_at'])
+
+        response = self.client.post(f'/emails/trash/{second}/restore/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/emails/list/all/')
+        self.assertEqual([email['id'] for email in response.data['data']], [second, first])
+        self.assertEqual(self.client.get('/folders/').data['data'][0]['total'], 1)
+        self.assertEqual(MailboxCounter.objects.get(user=self.user).total, 2)
+        self.assertEqual(Thread.objects.get().message_count, 2)
+        self.assertEqual(self.client.get('/emails/trash/').data['data'], [])
+
+    def test_restore_after_thread_is_deleted(self):
+        """
+        Test that an email whose thread was deleted with its last email gets a thread again
+        """
+
+        email_id = self.send('Hello')
+        self.client.delete(f'/emails/detail/{email_id}/')
+        self.assertFalse(Thread.objects.exists())
+
+        response = self.client.post(f'/emails/trash/{email_id}/restore/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        thread = Thread.objects.get()
+        self.assertEqual(Email.objects.get(id=email_id).thread_id, thread.id)
+        self.assertEqual(thread.message_count, 1)
+
+    def test_trash_of_other_user(self):
+        """
+        Test that the emails in the trash of other users are not listed or restored
+        """
+
+        email = Email.objects.create(
+            subject='Private', sender=self.other, recipient=self.other, deleted_at=timezone.now())
+        self.assertEqual(self.client.get('/emails/trash/').data['data'], [])
+        response = self.client.post(f'/emails/trash/{email.id}/restore/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_deleted_emails(self):
+        """
+        Test that the purge only deletes the emails in the trash for longer than the retention window
+        """
+
+        now = timezone.now()
+        Email.objects.bulk_create(
+            [Email(subject=f'Old {i}', sender=self.other, recipient=self.user,
+                   deleted_at=now - timedelta(days=40)) for i in range(5)] +
+            [Email(subject='Recent', sender=self.other, recipient=self.user, deleted_at=now - timedelta(days=1)),
+             Email(subject='Live', sender=self.other, recipient=self.user)])
+
+        out = StringIO()
+        call_command('purge_deleted_emails', '--batch-size', '2', stdout=out)
+        self.assertIn('Purged 5 emails', out.getvalue())
+        self.assertEqual(sorted(Email.all_objects.values_list('subject', flat=True)), ['Live', 'Recent'])
+
+    def test_list_uses_partial_index(self):
+        """
+        Test with EXPLAIN that the mailbox list is read from the partial index without the deleted emails
+        """
+
+        Email.objects.bulk_create(
+            [Email(subject=f'Email {i}', body='', sender=self.other, recipient=self.user if i % 10 == 0 else self.other,
+                   deleted_at=timezone.now() if i % 20 == 0 else None) for i in range(1000)])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # The test table is too small for the planner to prefer an index scan on its own
+                cursor.execute('ANALYZE email_api_email')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+
+        plan = Email.objects.filter(recipient=self.user).order_by('-timestamp', '-id')[:50].explain()
+
+        self.assertIn('email_recipient_idx', plan)
+
+
+class TestAsyncReadViews(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.factory = APIRequestFactory()
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+        now = timezone.now()
+        Email.objects.bulk_create(
+            [Email(subject=f'Hello {i}', body='Hi', sender=self.other, recipient=self.user, status=i % 2 == 0,
+                   timestamp=now - timedelta(minutes=i)) for i in range(5)] +
+            [Email(subject=f'Sent {i}', body='Hi', sender=self.user, recipient=self.other,
+                   timestamp=now - timedelta(minutes=i, seconds=30)) for i in range(3)])
+        FolderEmail.objects.bulk_create(
+            [FolderEmail(email=email, folder=self.folder) for email in Email.objects.filter(recipient=self.user)])
+
+    def call(self, view, method='get', params=None, headers=None, **kwargs):
+        request = getattr(self.factory, method)('/', params, **(headers or {}))
+        force_authenticate(request, user=self.user)
+        response = async_to_sync(view)(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_email_list_matches_sync_view(self):
+        """
+        Test that the async email list returns the same pages as the sync view
+        """
+
+        view = AsyncEmailList.as_view()
+        params = {'limit': 3}
+        while True:
+            response = self.call(view, params=params)
+            expected = self.client.get('/emails/list/all/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['data'], expected.data['data'])
+            self.assertEqual(response.data['next_cursor'], expected.data['next_cursor'])
+            if not response.data['next_cursor']:
+                break
+            params = {'limit': 3, 'cursor': response.data['next_cursor']}
+
+        self.assertEqual(self.call(view, params={'status': 'maybe'}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = async_to_sync(view)(self.factory.get('/'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_email_list_etag_and_cache(self):
+        """
+        Test that the async email list uses the mailbox ETag and response cache
+        """
+
+        get_mailbox_cache().clear()
+        view = AsyncEmailList.as_view()
+        response = self.call(view)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        etag = response['ETag']
+        self.assertEqual(self.call(view)['X-Cache'], 'HIT')
+        response = self.call(view, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_stream_emails(self):
+        """
+        Test that the async email list streams every email with the async ORM
+        """
+
+        response = self.call(AsyncEmailList.as_view(), params={'stream': 'true', 'fields': 'id,subject'})
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        lines = async_to_sync(read)().decode().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'subject'})
+
+    def test_folder_emails(self):
+        """
+        Test that the async folder emails return the same page as the sync view
+        """
+
+        view = AsyncFolderEmails.as_view()
+        response = self.call(view, params={'status': 'false'}, folder_id=self.folder.id)
+        expected = self.client.get(f'/emails/folders/{self.folder.id}/', {'status': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']), 2)
+        self.assertEqual(response.data['data'], expected.data['data'])
+
+        folder = Folder.objects.create(name='Theirs', user=self.other)
+        response = self.call(view, folder_id=folder.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_dates(self):
+        """
+        Test that the async lists answer a date that does not exist with a 400 Bad Request, like the sync views
+        """
+
+        params = {'after': '2024-13-01'}
+        response = self.call(AsyncEmailList.as_view(), params=params)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, self.client.get('/emails/list/all/', params).data)
+        response = self.call(AsyncFolderEmails.as_view(), params=params, folder_id=self.folder.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, self.client.get(f'/emails/folders/{self.folder.id}/', params).data)
+
+    def test_email_detail(self):
+        """
+        Test that the async email detail serves GET requests and the sync view serves the others
+        """
+
+        email = Email.objects.filter(recipient=self.user).first()
+        view = read_async(AsyncEmailDetail.as_view(), EmailDetailsViewSet.as_view(
+            {"get": "getEmail", "put": "updateEmail", "delete": "deleteEmail"}))
+        response = self.call(view, pk=email.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], EmailSerializer(email).data)
+        self.assertEqual(self.call(view, pk=0).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.call(view, method='delete', pk=email.id)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.call(view, pk=email.id).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_folder_list(self):
+        """
+        Test that the async folder list counts the emails of every folder
+        """
+
+        response = self.call(AsyncFolderList.as_view())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], self.client.get('/folders/').data['data'])
+        self.assertEqual((response.data['data'][0]['total'], response.data['data'][0]['unread']), (5, 2))
+
+
+class TestMailboxEvents(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+
+    def test_bus_delivers_events_from_other_threads(self):
+        """
+        Test that events published by another thread reach the subscribers of the user only
+        """
+
+        bus = InMemoryEventBus()
+
+        async def receive():
+            async with bus.subscribe(self.user.id) as queue, bus.subscribe(self.other.id) as other_queue:
+                publisher = threading.Thread(target=bus.publish, args=([self.user.id], {'type': 'test'}))
+                publisher.start()
+                event = await asyncio.wait_for(queue.get(), 5)
+                await asyncio.to_thread(publisher.join)
+                return event, other_queue.qsize()
+
+        self.assertEqual(async_to_sync(receive)(), ({'type': 'test'}, 0))
+        self.assertEqual(bus.subscribers, {})
+
+    @override_settings(EMAIL_EVENTS_QUEUE_SIZE=2)
+    def test_slow_client_gets_resync(self):
+        """
+        Test that a client that does not keep up gets a single resync event instead of the missed events
+        """
+
+        bus = InMemoryEventBus()
+
+        async def receive():
+            async with bus.subscribe(self.user.id) as queue:
+                for i in range(3):
+                    bus.publish([self.user.id], {'type': 'test', 'i': i})
+                await asyncio.sleep(0)
+                return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        self.assertEqual(async_to_sync(receive)(), [RESYNC_EVENT])
+
+    def test_events_published_on_commit(self):
+        """
+        Test that a new email and a status change are pushed to the recipient once committed
+        """
+
+        def send_and_read():
+            self.client.force_authenticate(user=self.other)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/emails/list/create/', {
+                    "subject": "Hello", "body": "Hi", "priority": "high",
+                    "sender_email": "test2@example.com", "recipient_email": "test@example.com"})
+            email = Email.objects.get(subject='Hello')
+            self.client.force_authenticate(user=self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(f'/emails/status/read/{email.pk}/')
+                # Already read, nothing changes
+                self.client.put(f'/emails/status/read/{email.pk}/')
+            return email
+
+        async def receive():
+            bus = get_event_bus()
+            async with bus.subscribe(self.user.id) as queue, bus.subscribe(self.other.id) as other_queue:
+                email = await sync_to_async(send_and_read)()
+                await asyncio.sleep(0)
+                return email, [queue.get_nowait() for _ in range(queue.qsize())], other_queue.qsize()
+
+        email, events, other_events = async_to_sync(receive)()
+        self.assertEqual(events, [
+            {'type': 'new_email', 'sender': 'test2@example.com', 'subject': 'Hello', 'priority': 'high'},
+            {'type': 'status_changed', 'ids': [email.id], 'status': True},
+        ])
+        self.assertEqual(other_events, 0)
+
+    def test_no_event_before_commit(self):
+        """
+        Test that nothing is pushed when the transaction of the email is not committed
+        """
+
+        async def receive():
+            async with get_event_bus().subscribe(self.user.id) as queue:
+                await sync_to_async(self.client.post)('/emails/list/create/', {
+                    "subject": "Hello", "body": "Hi",
+                    "sender_email": "test2@example.com", "recipient_email": "test@example.com"})
+                await asyncio.sleep(0)
+                return queue.qsize()
+
+        self.assertEqual(async_to_sync(receive)(), 0)
+
+
+class TestEventPush(APITransactionTestCase):
+    """
+    The push application authenticates in a thread of its own, outside of the test transaction.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def connect(self, scope, messages, publish=None):
+        """
+        Method to run the push application until the client sends all its messages.
+        The messages after the first one are sent once the application has subscribed.
+        Returns:
+            - The messages sent by the application.
+        """
+        sent = []
+        messages = list(messages)
+
+        async def receive():
+            if len(messages) > 1 or not get_event_bus().subscribers:
+                return messages.pop(0)
+            if publish is not None:
+                get_event_bus().publish([self.user.id], publish)
+            await asyncio.sleep(0.05)
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        async def run():
+            await asyncio.wait_for(events_application(scope, receive, send), 5)
+
+        async_to_sync(run)()
+        return sent
+
+    def test_event_stream(self):
+        """
+        Test that events are pushed as Server-Sent Events with the token of the query string
+        """
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/emails/events/', 'headers': [],
+                 'query_string': f'token={self.token}'.encode()}
+        sent = self.connect(scope, [{'type': 'http.disconnect'}], publish={'type': 'new_email', 'subject': 'Hi'})
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        body = b''.join(message['body'] for message in sent[1:]).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: new_email\ndata: {"type": "new_email", "subject": "Hi"}\n\n', body)
+        self.assertEqual(get_event_bus().subscribers, {})
+
+    def test_event_stream_requires_token(self):
+        """
+        Test that the event stream is refused without a valid token
+        """
+
+        for headers in ([], [(b'authorization', b'Bearer invalid')]):
+            scope = {'type': 'http', 'method': 'GET', 'path': '/emails/events/', 'headers': headers,
+                     'query_string': b''}
+            sent = self.connect(scope, [{'type': 'http.disconnect'}])
+            self.assertEqual(sent[0]['status'], 401)
+            self.assertEqual(json.loads(sent[1]['body'])['status'], 401)
+
+    def test_websocket(self):
+        """
+        Test that events are pushed as WebSocket messages
+        """
+
+        scope = {'type': 'websocket', 'path': '/emails/events/', 'headers': [],
+                 'query_string': f'token={self.token}'.encode()}
+        sent = self.connect(scope, [{'type': 'websocket.connect'}, {'type': 'websocket.disconnect'}],
+                            publish={'type': 'status_changed', 'ids': [1], 'status': True})
+
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        self.assertEqual(json.loads(sent[1]['text']), {'type': 'status_changed', 'ids': [1], 'status': True})
+
+        scope['query_string'] = b'token=invalid'
+        sent = self.connect(scope, [{'type': 'websocket.connect'}])
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4401}])
+
+
+class TestDeltaSync(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpassword')
+        self.other = User.objects.create_user(
+            username='testuser2', email='test2@example.com', password='testpassword2')
+        self.client.force_authenticate(user=self.user)
+        self.folder = Folder.objects.create(name='Work', user=self.user)
+
+    def send_email(self, subject, sender='test2@example.com', recipient='test@example.com'):
+        response = self.client.post('/emails/list/create/', {
+            "subject": subject, "body": "Hi", "sender_email": sender, "recipient_email": recipient})
+        return response.data['data']['id']
+
+    def sync(self, since, **params):
+        response = self.client.get('/emails/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sync_returns_changes_since_modseq(self):
+        """
+        Test that every kind of change is returned once after the modseq of the previous sync
+        """
+
+        first = self.send_email('First')
+        second = self.send_email('Second')
+        data = self.sync(0)
+        self.assertEqual([email['id'] for email in data['data']['changed']], [first, second])
+        self.assertEqual(data['data']['deleted'], [])
+        self.assertFalse(data['more'])
+        modseq = data['modseq']
+        self.assertEqual(self.sync(modseq)['data'], {'changed': [], 'deleted': []})
+
+        self.client.put(f'/emails/status/read/{first}/')
+        data = self.sync(modseq)
+        self.assertEqual([(email['id'], email['status']) for email in data['data']['changed']], [(first, True)])
+        modseq = data['modseq']
+
+        self.client.post('/emails/folders/', {'email': second, 'folder': self.folder.id})
+        data = self.sync(modseq)
+        self.assertEqual([(email['id'], email['folders']) for email in data['data']['changed']],
+                         [(second, [self.folder.id])])
+        modseq = data['modseq']
+
+        self.client.delete(f'/emails/detail/{first}/')
+        data = self.sync(modseq)
+        self.assertEqual(data['data'], {'changed': [], 'deleted': [first]})
+        modseq = data['modseq']
+
+        self.client.post(f'/emails/trash/{first}/restore/')
+        self.client.put('/emails/status/bulk/', {'status': False, 'ids': [first, second]}, format='json')
+        data = self.sync(modseq)
+        # Restored then marked as unread, the email is returned once with its last state
+        self.assertEqual([(email['id'], email['status']) for email in data['data']['changed']], [(first, False)])
+
+    def test_sync_is_per_mailbox(self):
+        """
+        Test that the changes of the sender and of other users are stamped in their own mailboxes
+        """
+
+        email = self.send_email('Hello')
+        self.send_email('Other', recipient='test2@example.com')
+        self.client.post('/emails/folders/', {'email': email, 'folder': self.folder.id})
+        self.assertEqual([change['id'] for change in self.sync(0)['data']['changed']], [email])
+
+        self.client.force_authenticate(user=self.other)
+        changed = self.sync(0)['data']['changed']
+        # Filing the email only changed the mailbox of the owner of the folder
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(changed[0]['folders'], [])
+
+    def test_sync_pages(self):
+        """
+        Test that following the modseq of every page returns every change once, in order
+        """
+
+        ids = [self.send_email(f'Hello {i}') for i in range(5)]
+        self.client.put('/emails/status/bulk/', {'status': True, 'ids': ids[:3]}, format='json')
+        seen = []
+        modseq = 0
+        while True:
+            data = self.sync(modseq, limit=2, fields='id')
+            seen += [email['id'] for email in data['data']['changed']]
+            modseq = data['modseq']
+            if not data['more']:
+                break
+        self.assertEqual(seen, ids[3:] + ids[:3])
+        self.assertEqual(set(data['data']['changed'][-1]), {'id', 'modseq', 'folders'})
+
+    def test_sync_queries_do_not_depend_on_mailbox_size(self):
+        """
+        Test that a sync reads the changes from the (user, modseq) index, whatever the mailbox size
+        """
+
+        self.send_email('Old')
+        modseq = self.sync(0)['modseq']
+        self.send_email('New')
+        # The mailbox version, the changes, the changed emails and their folders
+        with self.assertNumQueries(4):
+            data = self.sync(modseq)
+        self.assertEqual(len(data['data']['changed']), 1)
+
+    def test_invalid_since(self):
+        """
+        Test that since must be a modseq of the mailbox
+        """
+
+        self.send_email('Hello')
+        for since in ('abc', '-1', '1000'):
+            response = self.client.get('/emails/sync/', {'since': since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/emails/sync/', {'limit': '0'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
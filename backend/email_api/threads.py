@@ -0,0 +1,156 @@
+import re
+from collections import Counter, defaultdict
+
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from email_api.models import Email, Thread
+
+SUBJECT_KEY_LENGTH = Thread._meta.get_field("subject_key").max_length
+# Reply and forward prefixes, possibly repeated: "Re: Fwd: RE[2]: subject"
+REPLY_PREFIXES = re.compile(r"^(\s*(re|fwd?|aw|tr)\s*(\[\d+\])?\s*:)+", re.IGNORECASE)
+
+
+def normalize_subject(subject):
+    """
+    Method to compute the subject key of a thread.
+    Parameters:
+        - subject: The subject of an email.
+    Returns:
+        - The subject without reply and forward prefixes, case and extra whitespace.
+    """
+    subject = REPLY_PREFIXES.sub("", subject or "")
+    return " ".join(subject.split()).casefold()[:SUBJECT_KEY_LENGTH]
+
+
+def thread_key(email):
+    user_a, user_b = sorted((email.sender_id, email.recipient_id))
+    return user_a, user_b, normalize_subject(email.subject)
+
+
+def assign_threads(emails):
+    """
+    Method to assign new emails to their thread, creating the threads that do not exist yet.
+    An email replying to an email between the same users joins the thread of that email,
+    other emails join the thread with the same users and normalized subject.
+    Must be called before the emails are inserted, inside their transaction.
+    Parameters:
+        - emails: The new emails, with their sender, recipient, subject and in_reply_to.
+    """
+    pending = []
+    for email in emails:
+        reply = email.in_reply_to if email.in_reply_to_id else None
+        if reply is not None and reply.thread_id is not None and \
+                sorted((reply.sender_id, reply.recipient_id)) == sorted((email.sender_id, email.recipient_id)):
+            email.thread_id = reply.thread_id
+        else:
+            pending.append(email)
+    if not pending:
+        return
+
+    keys = {}
+    for email in pending:
+        keys.setdefault(thread_key(email), email)
+    threads = find_threads(keys)
+    missing = [key for key in keys if key not in threads]
+    if missing:
+        Thread.objects.bulk_create(
+            [Thread(user_a_id=key[0], user_b_id=key[1], subject_key=key[2],
+                    subject=keys[key].subject, last_timestamp=keys[key].timestamp)
+             for key in missing],
+            ignore_conflicts=True, batch_size=1000)
+        # Read back the ids, some threads may have been created by a concurrent write
+        threads.update(find_threads(missing))
+    for email in pending:
+        email.thread_id = threads[thread_key(email)]
+
+
+def find_threads(keys):
+    keys = set(keys)
+    users_a = {key[0] for key in keys}
+    users_b = {key[1] for key in keys}
+    subject_keys = {key[2] for key in keys}
+    rows = Thread.objects.filter(
+        user_a_id__in=users_a, user_b_id__in=users_b, subject_key__in=subject_keys
+    ).values_list("user_a_id", "user_b_id", "subject_key", "id")
+    return {row[:3]: row[3] for row in rows if row[:3] in keys}
+
+
+def thread_counter_delta(email, sign=1):
+    """
+    Method to compute what an email adds to the aggregates of its thread.
+    Parameters:
+        - email: The email, only its sender, recipient and status are read.
+        - sign: 1 when the email is added to the thread, -1 when it is removed.
+    Returns:
+        - Counter with the delta of every aggregate field.
+    """
+    delta = Counter(message_count=sign)
+    if not email.status:
+        # The lower user id is user_a, a thread with oneself only uses unread_a
+        side = "unread_a" if email.recipient_id <= email.sender_id else "unread_b"
+        delta[side] += sign
+    return delta
+
+
+def thread_deltas(emails, sign=1):
+    deltas = defaultdict(Counter)
+    for email in emails:
+        if email.thread_id is not None:
+            deltas[email.thread_id].update(thread_counter_delta(email, sign))
+    return deltas
+
+
+def delta_updates(deltas):
+    updates = {}
+    for field in ("message_count", "unread_a", "unread_b"):
+        whens = [When(id=thread_id, then=Value(delta[field]))
+                 for thread_id, delta in deltas.items() if delta[field]]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0))
+    return updates
+
+
+def apply_thread_deltas(deltas, timestamps=None):
+    """
+    Method to add deltas to the aggregates of many threads with a single UPDATE.
+    Must be called inside the transaction that writes the emails.
+    Parameters:
+        - deltas: Dict of thread id to Counter with the delta of every aggregate field.
+        - timestamps: Optional dict of thread id to the timestamp of its newest new email.
+    """
+    timestamps = timestamps or {}
+    updates = delta_updates(deltas)
+    if timestamps:
+        updates["last_timestamp"] = Greatest(F("last_timestamp"), Case(
+            *[When(id=thread_id, then=Value(timestamp)) for thread_id, timestamp in timestamps.items()],
+            default=F("last_timestamp")))
+    if updates:
+        Thread.objects.filter(id__in=[*deltas, *timestamps]).update(**updates)
+
+
+def add_emails_to_threads(emails):
+    """
+    Method to add the emails inserted after assign_threads to the aggregates of their threads.
+    """
+    timestamps = {}
+    for email in emails:
+        if email.thread_id is not None and (
+                email.thread_id not in timestamps or email.timestamp > timestamps[email.thread_id]):
+            timestamps[email.thread_id] = email.timestamp
+    apply_thread_deltas(thread_deltas(emails), timestamps)
+
+
+def remove_emails_from_threads(emails):
+    """
+    Method to remove deleted emails from the aggregates of their threads.
+    The last timestamp is read again from the remaining emails and empty threads are deleted.
+    Must be called after the emails are deleted, inside the same transaction.
+    """
+    deltas = thread_deltas(emails, -1)
+    if not deltas:
+        return
+    newest = Email.objects.filter(thread=OuterRef("pk")).order_by("-timestamp").values("timestamp")[:1]
+    Thread.objects.filter(id__in=list(deltas)).update(
+        last_timestamp=Coalesce(Subquery(newest), F("last_timestamp")), **delta_updates(deltas))
+    Thread.objects.filter(id__in=list(deltas), message_count__lte=0).delete()
@@ -1,13 +1,40 @@
+from django.conf import settings
 from rest_framework.urls import path
 
-from email_api.views import EmailChangeStatus, EmailListViewSet, EmailDetailsViewSet, FolderEmailViewSet
+from email_api.views import (
+    AsyncEmailDetail, AsyncEmailList, AsyncFolderEmails, DeletionJobDetail, EmailChangeStatus,
+    EmailBulkChangeStatus, EmailCacheStats, EmailCounters, EmailExport, EmailListViewSet,
+    EmailDetailsViewSet, EmailMailboxDeletion, EmailRestore, EmailThreadDetail, EmailThreads,
+    EmailSync, EmailTrash, FolderEmailViewSet, read_async)
+
+email_list_view = EmailListViewSet.as_view({"get": "getAllEmails"})
+email_detail_view = EmailDetailsViewSet.as_view(
+    {"get": "getEmail", "put": "updateEmail", "delete": "deleteEmail"})
+email_folder_view = FolderEmailViewSet.as_view({"get": "get_emails_by_folder"})
+if settings.EMAIL_ASYNC_READ_VIEWS:
+    email_list_view = AsyncEmailList.as_view()
+    email_detail_view = read_async(AsyncEmailDetail.as_view(), email_detail_view)
+    email_folder_view = AsyncFolderEmails.as_view()
 
 # urlpatterns for email operations
 urlpatterns = [
     path("status/read/<int:pk>/", EmailChangeStatus.as_view(),
          name="email-change-status"),
-    path("list/all/",
-         EmailListViewSet.as_view({"get": "getAllEmails"}), name="email-list"),
+    path("status/bulk/", EmailBulkChangeStatus.as_view(),
+         name="email-bulk-change-status"),
+    path("counters/", EmailCounters.as_view(), name="email-counters"),
+    path("cache/stats/", EmailCacheStats.as_view(), name="email-cache-stats"),
+    path("export/", EmailExport.as_view(), name="email-export"),
+    path("mailbox/", EmailMailboxDeletion.as_view(), name="email-mailbox-delete"),
+    path("jobs/<int:pk>/", DeletionJobDetail.as_view(), name="email-deletion-job"),
+    path("sync/", EmailSync.as_view(), name="email-sync"),
+    path("trash/", EmailTrash.as_view(), name="email-trash"),
+    path("trash/<int:pk>/restore/", EmailRestore.as_view(), name="email-restore"),
+    path("threads/", EmailThreads.as_view(), name="email-threads"),
+    path("threads/<int:pk>/", EmailThreadDetail.as_view(), name="email-thread-detail"),
+    path("list/all/", email_list_view, name="email-list"),
+    path("search/",
+         EmailListViewSet.as_view({"get": "searchEmails"}), name="email-search"),
     path("list/create/", EmailListViewSet.as_view(
         {"post": "createNewEmail"}), name="email-create"),
     path("list/sender/<str:sender_email>/",
@@ -16,11 +43,16 @@ urlpatterns = [
         {"get": "getEmailsByRecipient"}), name="email-recipient"),
     path("list/status/<str:value>/",
          EmailListViewSet.as_view({"get": "getEmailsByStatus"}), name="email-status"),
-    path("detail/<int:pk>/",
-         EmailDetailsViewSet.as_view({"get": "getEmail", "put": "updateEmail", "delete": "deleteEmail"}), name="email-detail"),
-    path("folders/<int:folder_id>/", FolderEmailViewSet.as_view({"get": "get_emails_by_folder"}), name="email-folder"),
+    path("detail/<int:pk>/", email_detail_view, name="email-detail"),
+    path("folders/<int:folder_id>/", email_folder_view, name="email-folder"),
     path("folders/", FolderEmailViewSet.as_view(
         {"post": "add_email_to_folder"}), name="email-folder-add"),
-    path("<int:email_id>/folders/<int:pk>/", FolderEmailViewSet.as_view(
+    path("folders/bulk/add/", FolderEmailViewSet.as_view(
+        {"post": "add_emails_to_folder"}), name="email-folder-bulk-add"),
+    path("folders/bulk/remove/", FolderEmailViewSet.as_view(
+        {"post": "remove_emails_from_folder"}), name="email-folder-bulk-remove"),
+    path("folders/bulk/move/", FolderEmailViewSet.as_view(
+        {"post": "move_emails_to_folder"}), name="email-folder-bulk-move"),
+    path("<int:email_id>/folders/<int:folder_id>/", FolderEmailViewSet.as_view(
         {"delete": "remove_email_from_folder"}), name="email-folder-remove"),
 ]
@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
+from email_api.views.async_views import AsyncFolderList, read_async
 from email_api.views.folder_views import FolderViewSet
 
 router = DefaultRouter()
 router.register(r"", FolderViewSet, basename="folder")
 urlpatterns = router.urls
-
+if settings.EMAIL_ASYNC_READ_VIEWS:
+    folder_list_view = read_async(
+        AsyncFolderList.as_view(), FolderViewSet.as_view({"get": "list", "post": "create"}))
+    urlpatterns = [path("", folder_list_view, name="folder-list"), *urlpatterns]
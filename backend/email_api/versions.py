@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.db import connection
+
+from email_api.models import EmailChange, MailboxVersion
+
+
+def bump_mailbox_versions(user_ids):
+    """
+    Method to increment the mailbox version of users whose emails or folders changed,
+    with a single upsert. Must be called inside the transaction that writes the change.
+    Parameters:
+        - user_ids: The ids of the users.
+    """
+    increment_mailbox_versions({user_id: 1 for user_id in user_ids})
+
+
+def increment_mailbox_versions(increments):
+    """
+    Method to add to the mailbox version of users with a single upsert.
+    Parameters:
+        - increments: The increment of every user id.
+    Returns:
+        - The new version of every user id.
+    """
+    user_ids = sorted(increments)
+    if not user_ids:
+        return {}
+    table = MailboxVersion._meta.db_table
+    values = ", ".join(["(%s, %s)"] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, version) VALUES {values} "
+            f"ON CONFLICT (user_id) DO UPDATE SET version = {table}.version + excluded.version "
+            f"RETURNING user_id, version",
+            [value for user_id in user_ids for value in (user_id, increments[user_id])])
+        return dict(cursor.fetchall())
+
+
+def mailbox_changes(emails):
+    """
+    Method to get the mailboxes an email appears in, the ones of its sender and its recipient.
+    Returns:
+        - The (user_id, email_id) pairs of the emails.
+    """
+    return [(user_id, email.id) for email in emails for user_id in (email.sender_id, email.recipient_id)]
+
+
+def stamp_email_changes(changes, deleted=False):
+    """
+    Method to give every changed email the next modification sequence of the mailboxes it changed in,
+    and bump the mailbox versions, the delta sync returns the emails stamped after the client's modseq.
+    Must be called inside the transaction that writes the change.
+    Parameters:
+        - changes: The (user_id, email_id) pairs, e.g. from mailbox_changes.
+        - deleted: True when the emails were deleted or moved to the trash.
+    """
+    email_ids = defaultdict(set)
+    for user_id, email_id in changes:
+        email_ids[user_id].add(email_id)
+    versions = increment_mailbox_versions({user_id: len(ids) for user_id, ids in email_ids.items()})
+    rows = []
+    for user_id, ids in email_ids.items():
+        # The emails of a user take the modseqs up to the new version, one each
+        first = versions[user_id] - len(ids) + 1
+        rows += [EmailChange(user_id=user_id, email_id=email_id, modseq=first + i, deleted=deleted)
+                 for i, email_id in enumerate(sorted(ids))]
+    EmailChange.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=["user", "email_id"],
+        update_fields=["modseq", "deleted"], batch_size=1000)
+
+
+def get_mailbox_version(request):
+    """
+    Method to get the mailbox version of the user of a request, read once per request.
+    """
+    if not hasattr(request, "_mailbox_version"):
+        request._mailbox_version = MailboxVersion.objects.filter(
+            user_id=request.user.id).values_list("version", flat=True).first() or 0
+    return request._mailbox_version
+
+
+async def aget_mailbox_version(request):
+    """
+    Method to read the mailbox version of the user of a request with the async ORM.
+    The async views call it before mailbox_etag and mailbox_cache_key, which then reuse it.
+    """
+    if not hasattr(request, "_mailbox_version"):
+        request._mailbox_version = await MailboxVersion.objects.filter(
+            user_id=request.user.id).values_list("version", flat=True).afirst() or 0
+    return request._mailbox_version
+
+
+def mailbox_etag(request, *args, **kwargs):
+    """
+    Method to compute the ETag of a mailbox list endpoint with a single primary key lookup.
+    The ETag changes with the mailbox version of the user and with the negotiated renderer.
+    """
+    version = get_mailbox_version(request)
+    return f"{request.user.id}-{version}-{request.accepted_renderer.format}"
@@ -1,4 +1,8 @@
 from .email_views import *
 from .folder_email_views import *
 from .folder_views import *
-
+from .thread_views import *
+from .deletion_views import *
+from .trash_views import *
+from .sync_views import *
+from .async_views import *
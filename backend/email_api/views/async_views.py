@@ -0,0 +1,210 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+
+from email_api.models import Email
+from email_api.pagination import EmailKeysetPagination
+from email_api.response_cache import cache_mailbox_response
+from email_api.serializers import EmailSerializer, FolderSerializer
+from email_api.streaming import STREAMING_RENDERER_CLASSES, astream_emails, wants_stream
+from email_api.versions import aget_mailbox_version, mailbox_etag
+from email_api.views.email_views import (
+    INVALID_LIST_PARAMS, email_list_response, get_email_list, invalid_email_list_response)
+from email_api.views.folder_email_views import (
+    folder_emails_error_response, folder_emails_response, get_folder_emails, user_folder)
+from email_api.views.folder_views import folder_list_response, folders_with_counts
+
+
+class AsyncAPIView(APIView):
+    """
+    AsyncAPIView class for DRF views whose handlers are coroutines, served by an ASGI server.
+
+    The authentication, permissions and throttles of DRF are synchronous, they run in a thread
+    with sync_to_async. The handlers then query the database with the async ORM, so the request
+    does not hold a thread while it waits on the database.
+    """
+
+    # method_decorator hides that the handlers are coroutines
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            await self.ainitial(request)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request):
+        """
+        Method to read with the async ORM what the decorators of the handler read synchronously.
+        """
+
+
+class AsyncMailboxAPIView(AsyncAPIView):
+    """
+    AsyncMailboxAPIView class for the async views with the ETag and the cache of the mailbox lists.
+    """
+
+    async def ainitial(self, request):
+        await aget_mailbox_version(request)
+
+
+def read_async(async_view, sync_view):
+    """
+    Method to serve the GET requests of a URL with an async view and its other methods
+    with the sync view, e.g. getEmail and updateEmail share the same URL.
+    Parameters:
+        - async_view: The view of the GET requests, from AsyncAPIView.as_view.
+        - sync_view: The view of the other requests.
+    Returns:
+        - The async view of the URL.
+    """
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    return csrf_exempt(view)
+
+
+class AsyncEmailList(AsyncMailboxAPIView):
+    """
+    AsyncEmailList class, the async version of EmailListViewSet.getAllEmails.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = STREAMING_RENDERER_CLASSES
+
+    @method_decorator(condition(etag_func=mailbox_etag))
+    @cache_mailbox_response
+    async def get(self, request):
+        """
+        Method to retrieve all emails, newest first, one page at a time.
+        Parameters:
+            - request: The request object with the query params of EmailListViewSet.getAllEmails.
+        Returns:
+            - response object with the emails data and the next_cursor if the emails are retrieved.
+        """
+        try:
+            fields, stream, querysets = get_email_list(request)
+            if stream is not None:
+                return astream_emails(stream, fields=fields)
+            paginator = EmailKeysetPagination()
+            emails = await paginator.apaginate_queryset(querysets, request)
+        except INVALID_LIST_PARAMS as e:
+            return invalid_email_list_response(e)
+        return email_list_response(emails, fields, paginator)
+
+
+class AsyncEmailDetail(AsyncAPIView):
+    """
+    AsyncEmailDetail class, the async version of EmailDetailsViewSet.getEmail.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        """
+        Method to retrieve an email.
+        Parameters:
+            - request: The request object.
+            - pk: The primary key of the email to be retrieved.
+        Returns:
+            - Response object with the email data if the email is retrieved successfully.
+        """
+
+        try:
+            email = await Email.objects.select_related("sender", "recipient").aget(pk=pk)
+        except Email.DoesNotExist:
+            return Response(
+                {
+                    "message": "Email does not exist",
+                    "success": False,
+                    "status": status.HTTP_404_NOT_FOUND
+                }, status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = EmailSerializer(email)
+        return Response(
+            {
+                "message": "Email retrieved successfully",
+                "data": serializer.data,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
+
+
+class AsyncFolderEmails(AsyncMailboxAPIView):
+    """
+    AsyncFolderEmails class, the async version of FolderEmailViewSet.get_emails_by_folder.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = STREAMING_RENDERER_CLASSES
+
+    @method_decorator(condition(etag_func=mailbox_etag))
+    async def get(self, request, folder_id):
+        """
+        Method to get the emails in a folder, newest first, one page at a time.
+        Parameters:
+            - request: The request object with the query params of
+              FolderEmailViewSet.get_emails_by_folder.
+            - folder_id: The primary key of the folder.
+        Returns:
+            - Response object with the emails data and the next_cursor.
+        """
+
+        if not await user_folder(request, folder_id).aexists():
+            return folder_emails_error_response("Folder does not exist", status.HTTP_404_NOT_FOUND)
+        paginator = EmailKeysetPagination()
+        try:
+            fields, emails = get_folder_emails(request, folder_id)
+            if wants_stream(request):
+                return astream_emails(emails.order_by(*paginator.ordering), fields=fields)
+            emails = await paginator.apaginate_queryset(emails, request)
+        except INVALID_LIST_PARAMS as e:
+            return folder_emails_error_response(str(e), status.HTTP_400_BAD_REQUEST)
+        return folder_emails_response(emails, fields, paginator)
+
+
+class AsyncFolderList(AsyncMailboxAPIView):
+    """
+    AsyncFolderList class, the async version of FolderViewSet.list.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @cache_mailbox_response
+    async def get(self, request):
+        """
+        Method to get all folders, with the number of emails and unread emails of every folder,
+        see folders_with_counts.
+        """
+        folders = [folder async for folder in folders_with_counts(request.user)]
+        serializer = FolderSerializer(folders, many=True, context={"request": request})
+        return folder_list_response(serializer.data)
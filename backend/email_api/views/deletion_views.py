@@ -0,0 +1,73 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
+
+from email_api.deletion import start_deletion_job
+from email_api.models import DeletionJob
+from email_api.serializers import DeletionJobSerializer
+
+
+class EmailMailboxDeletion(APIView):
+    """
+    EmailMailboxDeletion class to delete every email received by the user in the background.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request):
+        """
+        Method to start the deletion of the emails received by the user.
+        Parameters:
+            - request: The request object.
+        Returns:
+            - Response object with the deletion job, 202 Accepted.
+        """
+
+        with transaction.atomic():
+            job = start_deletion_job(request.user, DeletionJob.KIND_MAILBOX)
+        return Response(
+            {
+                "message": "Mailbox deletion started",
+                "data": DeletionJobSerializer(job).data,
+                "success": True,
+                "status": status.HTTP_202_ACCEPTED
+            }, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class DeletionJobDetail(APIView):
+    """
+    DeletionJobDetail class to follow the progress of a background deletion.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        """
+        Method to get a deletion job of the user.
+        Parameters:
+            - request: The request object.
+            - pk: The primary key of the deletion job.
+        Returns:
+            - Response object with the status, total and deleted rows of the job.
+        """
+
+        job = DeletionJob.objects.filter(id=pk, user=request.user).first()
+        if job is None:
+            return Response(
+                {
+                    "message": "Deletion job does not exist",
+                    "success": False,
+                    "status": status.HTTP_404_NOT_FOUND
+                }, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(
+            {
+                "message": "Deletion job retrieved successfully",
+                "data": DeletionJobSerializer(job).data,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
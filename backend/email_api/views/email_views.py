@@ -1,13 +1,80 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.db.models import Q
-
-from email_api.serializers import EmailSerializer
-from email_api.models.email import Email
+from django.utils import timezone
+
+from email_api.serializers import (
+    EmailSerializer, EmailBulkStatusSerializer, EmailMultiRecipientSerializer, MailboxCounterSerializer)
+from email_api.counters import apply_counter_delta, email_counter_delta
+from email_api.models import Email, Folder, MailboxCounter
+from email_api.bulk import set_emails_status
+from email_api.events import publish_mailbox_event
+from email_api.versions import mailbox_changes, mailbox_etag, stamp_email_changes
+from email_api.threads import apply_thread_deltas, remove_emails_from_threads, thread_deltas
+from email_api.response_cache import cache_mailbox_response, get_cache_stats
+from email_api.pagination import EmailKeysetPagination, EmailSearchPagination, InvalidCursor
+from email_api.search import search_emails
+from email_api.fieldsets import InvalidFields, get_list_fields, only_fields
+from email_api.filters import InvalidFilters, filter_emails
+from email_api.export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_mailbox
+from email_api.streaming import STREAMING_RENDERER_CLASSES, stream_emails, wants_stream
+
+
+# The errors of the query params of the email lists, answered with a 400 Bad Request
+INVALID_LIST_PARAMS = (InvalidCursor, InvalidFields, InvalidFilters)
+
+
+def get_email_list(request):
+    """
+    Method to read the query params of the email list and build its querysets,
+    shared by EmailListViewSet.getAllEmails and AsyncEmailList.
+    Parameters:
+        - request: The request object with the query params of getAllEmails.
+    Returns:
+        - The fields of every email, the queryset to stream, newest first, or None when a page
+          is requested, and the received and sent querysets to paginate.
+    Raises:
+        - InvalidFields or InvalidFilters if a query param is not valid.
+    """
+    user = request.user
+    fields = get_list_fields(request)
+    if wants_stream(request):
+        emails = only_fields(Email.objects, fields).filter(Q(recipient=user) | Q(sender=user))
+        return fields, filter_emails(emails, request).order_by(*EmailKeysetPagination.ordering), None
+    received = filter_emails(only_fields(Email.objects, fields).filter(recipient=user), request)
+    sent = filter_emails(only_fields(Email.objects, fields).filter(sender=user), request)
+    return fields, None, [received, sent]
+
+
+def email_list_response(emails, fields, paginator):
+    serializer = EmailSerializer(emails, many=True, fields=fields)
+    return Response(
+        {
+            "message": "Emails retrieved successfully",
+            "data": serializer.data,
+            "next_cursor": paginator.next_cursor,
+            "success": True,
+            "status": status.HTTP_200_OK
+        }, status=status.HTTP_200_OK
+    )
+
+
+def invalid_email_list_response(error):
+    return Response(
+        {
+            "message": str(error),
+            "success": False,
+            "status": status.HTTP_400_BAD_REQUEST
+        }, status=status.HTTP_400_BAD_REQUEST
+    )
 
 
 class EmailListViewSet(viewsets.GenericViewSet):
@@ -17,26 +84,88 @@ class EmailListViewSet(viewsets.GenericViewSet):
 
     serializer_class = EmailSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = STREAMING_RENDERER_CLASSES
 
+    @method_decorator(condition(etag_func=mailbox_etag))
+    @cache_mailbox_response
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def getAllEmails(self, request):
         """
-        Method to retrieve all emails.
+        Method to retrieve all emails, newest first, one page at a time.
+        Parameters:
+            - request: The request object with the optional query params:
+                - subject, status, priority, after, before: Filter the emails,
+                  see email_api.filters
+                - limit: The number of emails per page
+                - cursor: The next_cursor returned by the previous page
+                - fields: The comma separated fields of every email, the snippet
+                  is returned instead of the body by default
+                - stream: Stream every email as NDJSON instead of one page,
+                  also enabled by the application/x-ndjson Accept header
+        Returns:
+            - response object with the emails data and the next_cursor if the emails are retrieved.
+        """
+        try:
+            fields, stream, querysets = get_email_list(request)
+            if stream is not None:
+                return stream_emails(stream, fields=fields)
+            paginator = EmailKeysetPagination()
+            emails = paginator.paginate_queryset(querysets, request)
+        except INVALID_LIST_PARAMS as e:
+            return invalid_email_list_response(e)
+        return email_list_response(emails, fields, paginator)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def searchEmails(self, request):
+        """
+        Method to search the emails of the user by subject and body, best matches first.
         Parameters:
-            - request: The request object
+            - request: The request object with the query params:
+                - q: The search terms
+                - limit: The number of emails per page
+                - cursor: The next_cursor returned by the previous page
+                - fields: The comma separated fields of every email
         Returns:
-            - response object with the emails data if the emails are retrieved.
+            - Response object with the matching emails data and the next_cursor.
         """
         user = request.user
-        subject = request.query_params.get('subject')
-        emails = Email.objects.filter(Q(recipient=user) | Q(sender=user))
-        if subject:
-            emails = emails.filter(subject__icontains=subject)
-        serializer = EmailSerializer(emails, many=True)
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response(
+                {
+                    "message": "Search terms are required",
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            fields = get_list_fields(request)
+        except InvalidFields as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        paginator = EmailSearchPagination()
+        try:
+            emails = paginator.paginate_search(
+                lambda offset, limit: search_emails(user, text, offset, limit, fields), request)
+        except InvalidCursor as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = EmailSerializer(emails, many=True, fields=fields)
         return Response(
             {
                 "message": "Emails retrieved successfully",
                 "data": serializer.data,
+                "next_cursor": paginator.next_cursor,
                 "success": True,
                 "status": status.HTTP_200_OK
             }, status=status.HTTP_200_OK
@@ -48,11 +177,16 @@ class EmailListViewSet(viewsets.GenericViewSet):
         Method to create a new email.
         Parameters:
             - request: The request object with the email data to be created.
+              The email is sent to recipient_email, or to every address of recipient_emails.
         Returns:
-            - Response object with the email data if the email is created successfully.
+            - Response object with the email data if the email is created successfully,
+              or with the list of emails data when it is sent to recipient_emails.
         """
 
-        serializer = EmailSerializer(data=request.data)
+        if "recipient_emails" in request.data:
+            serializer = EmailMultiRecipientSerializer(data=request.data)
+        else:
+            serializer = EmailSerializer(data=request.data)
 
         if serializer.is_valid():
 
@@ -87,8 +221,18 @@ class EmailListViewSet(viewsets.GenericViewSet):
             - Response object with the emails data if the emails are retrieved.
         """
 
-        emails = Email.objects.filter(sender__email=sender_email)
-        serializer = EmailSerializer(emails, many=True)
+        try:
+            fields = get_list_fields(request)
+        except InvalidFields as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        emails = only_fields(Email.objects, fields).filter(sender__email=sender_email)
+        serializer = EmailSerializer(emails, many=True, fields=fields)
         return Response(
             {
                 "message": f"Emails sent by {sender_email} retrieved successfully",
@@ -103,14 +247,24 @@ class EmailListViewSet(viewsets.GenericViewSet):
         """
         Method to get all emails by a recipient user
         Parameters:
-            - request
+            - request: The request object with the optional fields query param
             - recipient_email: The email of the recipient user
         Returns:
             - Response object with the emails data if the emails are retrieved.
         """
 
-        emails = Email.objects.filter(recipient__email=recipient_email)
-        serializer = EmailSerializer(emails, many=True)
+        try:
+            fields = get_list_fields(request)
+        except InvalidFields as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        emails = only_fields(Email.objects, fields).filter(recipient__email=recipient_email)
+        serializer = EmailSerializer(emails, many=True, fields=fields)
         return Response(
             {
                 "message": f"Emails received by {recipient_email} retrieved successfully",
@@ -123,36 +277,43 @@ class EmailListViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def getEmailsByStatus(self, request, value):
         """
-        Method to get all emails by status
+        Method to get the emails received by the user with a status, newest first, one page at a time.
+        The unread emails are read from a partial index on the unread emails of every recipient.
         Parameters:
-            - request
+            - request: The request object with the optional query params:
+                - limit: The number of emails per page
+                - cursor: The next_cursor returned by the previous page
+                - fields: The comma separated fields of every email
             - value: The status of the email
         Returns:
-            - Response object with the emails data if the emails are retrieved.
+            - Response object with the emails data and the next_cursor if the emails are retrieved.
         """
 
-        if value == "true":
-            emails = Email.objects.filter(status=True)
-            serializer = EmailSerializer(emails, many=True)
-            return Response(
-                {
-                    "message": "Emails readed by retrieved successfully",
-                    "data": serializer.data,
-                    "success": True,
-                    "status": status.HTTP_200_OK
-                }, status=status.HTTP_200_OK
-            )
-        else:
-            emails = Email.objects.filter(status=False)
-            serializer = EmailSerializer(emails, many=True)
+        read = value == "true"
+        paginator = EmailKeysetPagination()
+        try:
+            fields = get_list_fields(request)
+            emails = paginator.paginate_queryset(
+                only_fields(Email.objects, fields).filter(recipient=request.user, status=read), request)
+        except (InvalidCursor, InvalidFields) as e:
             return Response(
                 {
-                    "message": "Emails unreaded retrieved successfully",
-                    "data": serializer.data,
-                    "success": True,
-                    "status": status.HTTP_200_OK
-                }, status=status.HTTP_200_OK
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
             )
+        serializer = EmailSerializer(emails, many=True, fields=fields)
+        return Response(
+            {
+                "message": "Emails readed by retrieved successfully" if read
+                else "Emails unreaded retrieved successfully",
+                "data": serializer.data,
+                "next_cursor": paginator.next_cursor,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
 
 
 class EmailDetailsViewSet(viewsets.GenericViewSet):
@@ -177,7 +338,7 @@ class EmailDetailsViewSet(viewsets.GenericViewSet):
         """
 
         try:
-            email = Email.objects.get(pk=pk)
+            email = Email.objects.select_related("sender", "recipient").get(pk=pk)
             serializer = EmailSerializer(email, data=request.data)
             if serializer.is_valid():
                 serializer.save()
@@ -210,7 +371,9 @@ class EmailDetailsViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['delete'], permission_classes=[IsAuthenticated])
     def deleteEmail(self, request, pk):
         """
-        Method to delete an email.
+        Method to delete an email by moving it to the trash.
+        The email is hidden from every list and deleted for good by the purge_deleted_emails
+        command once it is older than EMAIL_TRASH_RETENTION_DAYS.
         Parameters:
             - request: The request object.
             - pk: The primary key of the email to be deleted.
@@ -219,8 +382,14 @@ class EmailDetailsViewSet(viewsets.GenericViewSet):
         """
 
         try:
-            email = Email.objects.get(pk=pk)
-            email.delete()
+            with transaction.atomic():
+                email = Email.objects.select_for_update().get(pk=pk)
+                email.deleted_at = timezone.now()
+                email.save(update_fields=["deleted_at"])
+                apply_counter_delta(
+                    email.recipient_id, email_counter_delta(email, -1))
+                remove_emails_from_threads([email])
+                stamp_email_changes(mailbox_changes([email]), deleted=True)
             return Response(
                 {
                     "message": "Email deleted successfully",
@@ -249,7 +418,7 @@ class EmailDetailsViewSet(viewsets.GenericViewSet):
         """
 
         try:
-            email = Email.objects.get(pk=pk)
+            email = Email.objects.select_related("sender", "recipient").get(pk=pk)
             serializer = EmailSerializer(email)
             return Response(
                 {
@@ -287,9 +456,22 @@ class EmailChangeStatus(APIView):
         """
 
         try:
-            email = Email.objects.get(pk=pk)
-            email.status = True
-            email.save()
+            with transaction.atomic():
+                email = Email.objects.select_related("sender", "recipient").select_for_update(
+                    of=("self",)).get(pk=pk)
+                if not email.status:
+                    delta = email_counter_delta(email, -1)
+                    deltas = thread_deltas([email], -1)
+                    email.status = True
+                    email.save(update_fields=["status"])
+                    delta.update(email_counter_delta(email))
+                    apply_counter_delta(email.recipient_id, delta)
+                    for thread_id, thread_delta in thread_deltas([email]).items():
+                        deltas[thread_id].update(thread_delta)
+                    apply_thread_deltas(deltas)
+                    stamp_email_changes(mailbox_changes([email]))
+                    publish_mailbox_event([email.recipient_id], {
+                        "type": "status_changed", "ids": [email.id], "status": True})
             serializer = EmailSerializer(email)
             return Response(
                 {
@@ -308,4 +490,166 @@ class EmailChangeStatus(APIView):
                 }, status=status.HTTP_404_NOT_FOUND
             )
 
-    
\ No newline at end of file
+
+class EmailBulkChangeStatus(APIView):
+    """
+    EmailBulkChangeStatus class to mark many emails as read or unread at once.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request):
+        """
+        Method to change the status of many emails received by the user.
+        Parameters:
+            - request: The request object with the data:
+                - status: true to mark the emails as read, false to mark them as unread
+                - ids: The ids of the emails, and/or
+                - folder_id: The folder of the emails
+                - before: Only change the emails sent before this date
+        Returns:
+            - Response object with the ids of the emails whose status changed.
+        """
+
+        serializer = EmailBulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "message": serializer.errors,
+                    "success": False,
+                    "data": serializer.errors,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        data = serializer.validated_data
+
+        emails = Email.objects.all()
+        if "ids" in data:
+            emails = emails.filter(id__in=data["ids"])
+        if "folder_id" in data:
+            if not Folder.objects.filter(id=data["folder_id"], user=request.user).exists():
+                return Response(
+                    {
+                        "message": "Folder does not exist",
+                        "success": False,
+                        "status": status.HTTP_404_NOT_FOUND
+                    }, status=status.HTTP_404_NOT_FOUND
+                )
+            emails = emails.filter(folderemail__folder_id=data["folder_id"])
+        if "before" in data:
+            emails = emails.filter(timestamp__lt=data["before"])
+
+        updated_ids = set_emails_status(request.user, emails, data["status"])
+        return Response(
+            {
+                "message": "Emails read status changed successfully",
+                "data": updated_ids,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
+
+
+class EmailCounters(APIView):
+    """
+    EmailCounters class to get the mailbox counters of the user.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Method to get the total and unread counters of the emails received by the user.
+        Parameters:
+            - request: The request object.
+        Returns:
+            - Response object with the counters data.
+        """
+
+        counters = MailboxCounter.objects.filter(user=request.user).first()
+        if counters is None:
+            counters = MailboxCounter(user=request.user)
+        serializer = MailboxCounterSerializer(counters)
+        return Response(
+            {
+                "message": "Email counters retrieved successfully",
+                "data": serializer.data,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
+
+
+class EmailExport(APIView):
+    """
+    EmailExport class to export the mailbox of the user.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Method to export every email sent or received by the user, with its folders, as a stream.
+        Parameters:
+            - request: The request object with the optional query params:
+                - type: mbox (default) or ndjson
+                - gzip: Compress the export with gzip
+                - after: Resume an interrupted export after the email with this id
+                  (the X-Email-Id header in mbox, the id field in NDJSON)
+        Returns:
+            - StreamingHttpResponse with the exported emails ordered by id.
+        """
+
+        export_format = request.query_params.get('type', 'mbox')
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        try:
+            after_id = int(request.query_params.get('after', 0))
+        except ValueError:
+            after_id = None
+        if export_format not in EXPORT_FORMATS or after_id is None or after_id < 0:
+            return Response(
+                {
+                    "message": "Invalid export parameters",
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        filename = f"mailbox.{export_format}"
+        if compress:
+            content_type = "application/gzip"
+            filename += ".gz"
+        else:
+            content_type = EXPORT_CONTENT_TYPES[export_format]
+        response = StreamingHttpResponse(
+            export_mailbox(request.user, export_format, after_id, compress=compress),
+            content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class EmailCacheStats(APIView):
+    """
+    EmailCacheStats class to get the hit and miss counters of the mailbox list cache.
+    With the default local memory cache they count the requests of the worker that answers, see get_cache_stats.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Method to get the number of list responses served from the cache and computed.
+        Parameters:
+            - request: The request object.
+        Returns:
+            - Response object with the hits and misses counters.
+        """
+
+        return Response(
+            {
+                "message": "Cache stats retrieved successfully",
+                "data": get_cache_stats(),
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
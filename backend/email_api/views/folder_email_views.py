@@ -3,43 +3,105 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
 from email_api.models import Folder, FolderEmail, Email
 
-from email_api.serializers import FolderEmailSerializer, EmailSerializer
+from email_api.serializers import FolderEmailSerializer, FolderEmailBulkSerializer, EmailSerializer
+from email_api.bulk import (
+    EmailsNotFound, add_emails_to_folder, move_emails_to_folder, remove_emails_from_folder)
+from email_api.fieldsets import get_list_fields, only_fields
+from email_api.filters import filter_emails
+from email_api.pagination import EmailKeysetPagination
+from email_api.streaming import STREAMING_RENDERER_CLASSES, stream_emails, wants_stream
+from email_api.versions import mailbox_etag, stamp_email_changes
+from email_api.views.email_views import INVALID_LIST_PARAMS
+
+def get_folder_emails(request, folder_id):
+    """
+    Method to read the query params of the folder emails and build their queryset,
+    shared by FolderEmailViewSet.get_emails_by_folder and AsyncFolderEmails.
+    Parameters:
+        - request: The request object with the query params of get_emails_by_folder.
+        - folder_id: The primary key of the folder, see user_folder.
+    Returns:
+        - The fields of every email and the filtered queryset of the emails in the folder.
+    Raises:
+        - InvalidFields or InvalidFilters if a query param is not valid.
+    """
+    fields = get_list_fields(request)
+    emails = filter_emails(
+        only_fields(Email.objects, fields).filter(folderemail__folder_id=folder_id), request)
+    return fields, emails
+
+
+def user_folder(request, folder_id):
+    return Folder.objects.filter(id=folder_id, user=request.user)
+
+
+def folder_emails_response(emails, fields, paginator):
+    serializer = EmailSerializer(emails, many=True, fields=fields)
+    return Response({
+        "message": "Emails retrieved successfully",
+        "data": serializer.data,
+        "next_cursor": paginator.next_cursor,
+        "status": status.HTTP_200_OK,
+        "success": True
+    }, status=status.HTTP_200_OK)
+
+
+def folder_emails_error_response(message, status_code):
+    return Response({
+        "message": message,
+        "data": message,
+        "status": status_code,
+        "success": False
+    }, status=status_code)
+
 
 class FolderEmailViewSet(viewsets.ModelViewSet):
     
     serializer_class = FolderEmailSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = STREAMING_RENDERER_CLASSES
     queryset = FolderEmail.objects.all()
 
+    @method_decorator(condition(etag_func=mailbox_etag))
     @action(detail=False, methods=['get'])
     def get_emails_by_folder(self, request, folder_id):
         """
-        Method to get all emails in a folder.
+        Method to get the emails in a folder, newest first, one page at a time.
+        The emails are read with a single join on the folder emails.
+        Parameters:
+            - request: The request object with the same optional query params as the inbox:
+                - subject, status, priority, after, before: Filter the emails
+                - limit: The number of emails per page
+                - cursor: The next_cursor returned by the previous page
+                - fields: The comma separated fields of every email, the snippet
+                  is returned instead of the body by default
+                - stream: Stream every email as NDJSON instead of one page,
+                  also enabled by the application/x-ndjson Accept header
+            - folder_id: The primary key of the folder.
+        Returns:
+            - Response object with the emails data and the next_cursor.
         """
 
+        paginator = EmailKeysetPagination()
         try:
-            user = request.user
-            folder = Folder.objects.get(id=folder_id, user=user)
-            folder_emails = FolderEmail.objects.filter(folder=folder)
-            email_ids = folder_emails.values_list("email_id", flat=True)
-            emails = Email.objects.filter(id__in=email_ids)
-            serializer = EmailSerializer(emails, many=True)
-            return Response({
-                "data": serializer.data,
-                "status": status.HTTP_200_OK,
-                "success": True
-            }, status=status.HTTP_200_OK)
-        except Folder.DoesNotExist:
-            return Response({
-                "data": "Folder does not exist",
-                "status": status.HTTP_404_NOT_FOUND,
-                "success": False
-            }, status=status.HTTP_404_NOT_FOUND)
+            if not user_folder(request, folder_id).exists():
+                return folder_emails_error_response("Folder does not exist", status.HTTP_404_NOT_FOUND)
+            fields, emails = get_folder_emails(request, folder_id)
+            if wants_stream(request):
+                return stream_emails(emails.order_by(*paginator.ordering), fields=fields)
+            emails = paginator.paginate_queryset(emails, request)
+            return folder_emails_response(emails, fields, paginator)
+        except INVALID_LIST_PARAMS as e:
+            return folder_emails_error_response(str(e), status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
+                "message": str(e),
                 "data": str(e),
                 "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
                 "success": False
@@ -53,7 +115,9 @@ class FolderEmailViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                folder_email = serializer.save()
+                stamp_email_changes([(folder_email.folder.user_id, folder_email.email_id)])
             return Response({
                 "data": serializer.data,
                 "status": status.HTTP_201_CREATED,
@@ -74,7 +138,9 @@ class FolderEmailViewSet(viewsets.ModelViewSet):
             user = request.user
             folder = Folder.objects.get(id=folder_id, user=user)
             folder_email = FolderEmail.objects.get(folder=folder, email_id=email_id)
-            folder_email.delete()
+            with transaction.atomic():
+                folder_email.delete()
+                stamp_email_changes([(user.id, folder_email.email_id)])
             return Response({
                 "message": "Email removed from folder",
                 "status": status.HTTP_204_NO_CONTENT,
@@ -99,10 +165,101 @@ class FolderEmailViewSet(viewsets.ModelViewSet):
                 "success": False
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def bulk_change(self, request, change):
+        serializer = FolderEmailBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                "message": serializer.errors,
+                "data": serializer.errors,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False
+            }, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        folder_ids = {data["folder_id"], data.get("source_folder_id", data["folder_id"])}
+        folders = {folder.id: folder for folder in Folder.objects.filter(id__in=folder_ids, user=request.user)}
+        if len(folders) < len(folder_ids):
+            return Response({
+                "message": "Folder does not exist",
+                "status": status.HTTP_404_NOT_FOUND,
+                "success": False
+            }, status=status.HTTP_404_NOT_FOUND)
+        ids = list(dict.fromkeys(data["ids"]))
+        try:
+            result = change(folders, data, ids)
+        except EmailsNotFound as e:
+            return Response({
+                "message": str(e),
+                "data": e.ids,
+                "status": status.HTTP_404_NOT_FOUND,
+                "success": False
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "message": "Folder emails changed successfully",
+            "data": {"ids": ids, **result},
+            "status": status.HTTP_200_OK,
+            "success": True
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def add_emails_to_folder(self, request):
+        """
+        Method to add many emails to a folder, emails already in the folder are kept.
+        Parameters:
+            - request: The request object with the data:
+                - ids: The ids of the emails sent or received by the user
+                - folder_id: The folder of the user
+        Returns:
+            - Response object with the ids of the emails.
+        """
 
+        def change(folders, data, ids):
+            add_emails_to_folder(request.user, folders[data["folder_id"]], ids)
+            return {}
 
+        return self.bulk_change(request, change)
 
+    @action(detail=False, methods=['post'])
+    def remove_emails_from_folder(self, request):
+        """
+        Method to remove many emails from a folder.
+        Parameters:
+            - request: The request object with the data:
+                - ids: The ids of the emails
+                - folder_id: The folder of the user
+        Returns:
+            - Response object with the ids of the emails and the number of emails removed.
+        """
 
+        def change(folders, data, ids):
+            return {"removed": remove_emails_from_folder(request.user, folders[data["folder_id"]], ids)}
 
+        return self.bulk_change(request, change)
 
-        
+    @action(detail=False, methods=['post'])
+    def move_emails_to_folder(self, request):
+        """
+        Method to move many emails from a folder to another one.
+        Parameters:
+            - request: The request object with the data:
+                - ids: The ids of the emails sent or received by the user
+                - source_folder_id: The folder of the user the emails are removed from
+                - folder_id: The folder of the user the emails are added to
+        Returns:
+            - Response object with the ids of the emails and the number of emails
+              removed from the source folder.
+        """
+
+        if "source_folder_id" not in request.data:
+            return Response({
+                "message": "source_folder_id is required",
+                "data": {"source_folder_id": ["This field is required."]},
+                "status": status.HTTP_400_BAD_REQUEST,
+                "success": False
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        def change(folders, data, ids):
+            removed = move_emails_to_folder(
+                request.user, folders[data["source_folder_id"]], folders[data["folder_id"]], ids)
+            return {"removed": removed}
+
+        return self.bulk_change(request, change)
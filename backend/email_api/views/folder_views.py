@@ -4,8 +4,35 @@ from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
-from email_api.models import Folder
-from email_api.serializers import FolderSerializer
+from django.db import transaction
+from django.db.models import Count, Q
+
+from email_api.models import DeletionJob, Folder, FolderEmail
+from email_api.serializers import DeletionJobSerializer, FolderSerializer
+from email_api.deletion import is_large_folder, start_deletion_job
+from email_api.response_cache import cache_mailbox_response
+from email_api.versions import bump_mailbox_versions, stamp_email_changes
+
+def folders_with_counts(user):
+    """
+    Method to build the queryset of the folders of a user, with the number of emails and unread
+    emails of every folder counted in the same query, shared by FolderViewSet.list and AsyncFolderList.
+    The emails in the trash are not counted.
+    """
+    live = Q(folderemail__email__deleted_at__isnull=True)
+    return Folder.objects.filter(user=user).annotate(
+        total=Count("folderemail", filter=live),
+        unread=Count("folderemail", filter=live & Q(folderemail__email__status=False)),
+    ).order_by("id")
+
+
+def folder_list_response(data):
+    return Response({
+        "data": data,
+        "status": status.HTTP_200_OK,
+        "success": True
+    }, status=status.HTTP_200_OK)
+
 
 class FolderViewSet(viewsets.ModelViewSet):
 
@@ -13,17 +40,14 @@ class FolderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Folder.objects.all()
     
+    @cache_mailbox_response
     def list(self, request):
         """
-        Method to get all folders.
+        Method to get all folders, with the number of emails and unread emails of every folder
+        counted in the same query. The emails in the trash are not counted.
         """
-        folders = Folder.objects.filter(user=request.user)
-        serializer = self.get_serializer(folders, many=True)
-        return Response({
-            "data": serializer.data,
-            "status": status.HTTP_200_OK,
-            "success": True
-        }, status=status.HTTP_200_OK)
+        serializer = self.get_serializer(folders_with_counts(request.user), many=True)
+        return folder_list_response(serializer.data)
 
     def create(self, request):
         """
@@ -31,7 +55,9 @@ class FolderViewSet(viewsets.ModelViewSet):
         """
         serializer = self.get_serializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                bump_mailbox_versions([request.user.id])
             return Response({
                 "message": "Folder created successfully",
                 "data": serializer.data,
@@ -45,13 +71,37 @@ class FolderViewSet(viewsets.ModelViewSet):
             "success": False
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            folder = serializer.save()
+            bump_mailbox_versions([folder.user_id])
+
     def destroy(self, request, pk=None):
         """
         Method to delete a folder.
+        Folders with more than DELETION_JOB_THRESHOLD emails are deleted in the background,
+        the response is then 202 Accepted with the deletion job to follow its progress.
         """
         folder = Folder.objects.filter(id=pk, user=request.user).first()
+        if folder and is_large_folder(folder):
+            with transaction.atomic():
+                job = start_deletion_job(request.user, DeletionJob.KIND_FOLDER, folder.id)
+            return Response({
+                "message": "Folder deletion started",
+                "data": DeletionJobSerializer(job).data,
+                "status": status.HTTP_202_ACCEPTED,
+                "success": True
+            }, status=status.HTTP_202_ACCEPTED)
         if folder:
-            folder.delete()
+            with transaction.atomic():
+                email_ids = FolderEmail.objects.filter(folder=folder).values_list("email_id", flat=True)
+                changes = [(request.user.id, email_id) for email_id in email_ids]
+                if changes:
+                    stamp_email_changes(changes)
+                else:
+                    # No email changed, the folder list of the user still did
+                    bump_mailbox_versions([request.user.id])
+                folder.delete()
             return Response({
                 "message": "Folder deleted successfully",
                 "status": status.HTTP_204_NO_CONTENT,
@@ -0,0 +1,54 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from email_api.fieldsets import InvalidFields, get_list_fields
+from email_api.sync import EmailDeltaSync, InvalidSince
+from email_api.versions import get_mailbox_version
+
+
+class EmailSync(APIView):
+    """
+    EmailSync class to get what changed in the mailbox of the user since the last sync,
+    instead of downloading the lists again.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Method to get the emails that changed after a modseq, in the order they changed.
+        Parameters:
+            - request: The request object with the optional query params:
+                - since: The modseq returned by the previous sync, 0 for the first sync
+                - limit: The number of changes per page
+                - fields: The comma separated fields of every changed email, the snippet
+                  is returned instead of the body by default
+        Returns:
+            - Response object with the changed emails, with their modseq and folders, the ids of
+              the deleted emails, the modseq to sync from next time and whether there are more changes.
+        """
+
+        sync = EmailDeltaSync()
+        try:
+            fields = get_list_fields(request)
+            changed, deleted = sync.get_changes(request, get_mailbox_version(request), fields)
+        except (InvalidSince, InvalidFields) as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {
+                "message": "Changes retrieved successfully",
+                "data": {"changed": changed, "deleted": deleted},
+                "modseq": sync.modseq,
+                "more": sync.more,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
@@ -0,0 +1,111 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from email_api.fieldsets import InvalidFields, get_list_fields, only_fields
+from email_api.models import Email, Thread
+from email_api.pagination import EmailKeysetPagination, InvalidCursor, ThreadKeysetPagination
+from email_api.serializers import EmailSerializer, ThreadSerializer
+from email_api.versions import mailbox_etag
+
+
+class EmailThreads(APIView):
+    """
+    EmailThreads class to list the conversations of the user.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(condition(etag_func=mailbox_etag))
+    def get(self, request):
+        """
+        Method to get the threads of the user, most recently active first, one page at a time.
+        The thread aggregates are read from the threads table, the emails are not scanned.
+        Parameters:
+            - request: The request object with the optional query params:
+                - limit: The number of threads per page
+                - cursor: The next_cursor returned by the previous page
+        Returns:
+            - Response object with the threads data and the next_cursor.
+        """
+
+        user = request.user
+        threads = Thread.objects.select_related("user_a", "user_b")
+        paginator = ThreadKeysetPagination()
+        try:
+            page = paginator.paginate_queryset(
+                [threads.filter(user_a=user), threads.filter(user_b=user)], request)
+        except InvalidCursor as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = ThreadSerializer(page, many=True, context={"request": request})
+        return Response(
+            {
+                "message": "Threads retrieved successfully",
+                "data": serializer.data,
+                "next_cursor": paginator.next_cursor,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
+
+
+class EmailThreadDetail(APIView):
+    """
+    EmailThreadDetail class to read the emails of a conversation.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(condition(etag_func=mailbox_etag))
+    def get(self, request, pk):
+        """
+        Method to get the emails of a thread of the user, newest first, one page at a time.
+        Parameters:
+            - request: The request object with the optional limit, cursor and fields query params.
+            - pk: The primary key of the thread.
+        Returns:
+            - Response object with the emails data and the next_cursor.
+        """
+
+        user = request.user
+        if not Thread.objects.filter(Q(user_a=user) | Q(user_b=user), pk=pk).exists():
+            return Response(
+                {
+                    "message": "Thread does not exist",
+                    "success": False,
+                    "status": status.HTTP_404_NOT_FOUND
+                }, status=status.HTTP_404_NOT_FOUND
+            )
+        paginator = EmailKeysetPagination()
+        try:
+            fields = get_list_fields(request)
+            emails = paginator.paginate_queryset(
+                only_fields(Email.objects, fields).filter(thread_id=pk), request)
+        except (InvalidCursor, InvalidFields) as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = EmailSerializer(emails, many=True, fields=fields)
+        return Response(
+            {
+                "message": "Emails retrieved successfully",
+                "data": serializer.data,
+                "next_cursor": paginator.next_cursor,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
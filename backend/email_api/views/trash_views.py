@@ -0,0 +1,114 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
+from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from email_api.counters import apply_counter_delta, email_counter_delta
+from email_api.fieldsets import InvalidFields, get_list_fields, only_fields
+from email_api.models import Email
+from email_api.pagination import InvalidCursor, TrashKeysetPagination
+from email_api.serializers import EmailSerializer, TrashEmailSerializer
+from email_api.threads import add_emails_to_threads, assign_threads
+from email_api.versions import mailbox_changes, mailbox_etag, stamp_email_changes
+
+
+class EmailTrash(APIView):
+    """
+    EmailTrash class to list the deleted emails of the user.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(condition(etag_func=mailbox_etag))
+    def get(self, request):
+        """
+        Method to get the emails sent or received by the user that are in the trash,
+        most recently deleted first, one page at a time.
+        Parameters:
+            - request: The request object with the optional query params:
+                - limit: The number of emails per page
+                - cursor: The next_cursor returned by the previous page
+                - fields: The comma separated fields of every email, the snippet
+                  is returned instead of the body by default
+        Returns:
+            - Response object with the emails data, with their deleted_at, and the next_cursor.
+        """
+
+        user = request.user
+        paginator = TrashKeysetPagination()
+        try:
+            fields = (*get_list_fields(request), "deleted_at")
+            trash = only_fields(Email.all_objects, fields).filter(deleted_at__isnull=False)
+            page = paginator.paginate_queryset(
+                [trash.filter(recipient=user), trash.filter(sender=user)], request)
+        except (InvalidCursor, InvalidFields) as e:
+            return Response(
+                {
+                    "message": str(e),
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                }, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = TrashEmailSerializer(page, many=True, fields=fields)
+        return Response(
+            {
+                "message": "Emails retrieved successfully",
+                "data": serializer.data,
+                "next_cursor": paginator.next_cursor,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
+
+
+class EmailRestore(APIView):
+    """
+    EmailRestore class to move an email of the user out of the trash.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        """
+        Method to restore an email from the trash, back in the counters and the thread it had.
+        Parameters:
+            - request: The request object.
+            - pk: The primary key of the email in the trash.
+        Returns:
+            - Response object with the email data if the email is restored successfully.
+        """
+
+        user = request.user
+        with transaction.atomic():
+            email = Email.all_objects.select_for_update().filter(
+                Q(sender=user) | Q(recipient=user), pk=pk, deleted_at__isnull=False).first()
+            if email is None:
+                return Response(
+                    {
+                        "message": "Email does not exist in the trash",
+                        "success": False,
+                        "status": status.HTTP_404_NOT_FOUND
+                    }, status=status.HTTP_404_NOT_FOUND
+                )
+            email.deleted_at = None
+            update_fields = ["deleted_at"]
+            if email.thread_id is None:
+                # The thread was deleted with its last email
+                assign_threads([email])
+                update_fields.append("thread")
+            email.save(update_fields=update_fields)
+            apply_counter_delta(email.recipient_id, email_counter_delta(email))
+            add_emails_to_threads([email])
+            stamp_email_changes(mailbox_changes([email]))
+        return Response(
+            {
+                "message": "Email restored successfully",
+                "data": EmailSerializer(email).data,
+                "success": True,
+                "status": status.HTTP_200_OK
+            }, status=status.HTTP_200_OK
+        )
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class UserApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user_api'
+
+    def ready(self):
+        from .authentication import invalidate_cached_user
+        from .models import User
+
+        post_save.connect(invalidate_cached_user, sender=User, dispatch_uid='invalidate_cached_user_on_save')
+        post_delete.connect(invalidate_cached_user, sender=User, dispatch_uid='invalidate_cached_user_on_delete')
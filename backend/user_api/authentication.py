@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .revocation import revocation_list
+
+User = get_user_model()
+
+# The claims added to the tokens to build the user of a request without the database
+USER_CLAIMS = ("username", "email", "is_staff", "date_joined")
+
+
+class UserCache:
+    """
+    UserCache class, a bounded LRU cache of users by id whose entries expire after a TTL.
+
+    The field values are cached, not the instances, so every request gets its own User
+    and the related objects a view loads on it are not shared between requests.
+    The cache is local to the process: the entry of a user is removed when the user is saved
+    or deleted in the same process, the other processes see the change after the TTL.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.field_names = [field.attname for field in User._meta.concrete_fields]
+
+    def get(self, user_id):
+        """
+        Method to get a cached user.
+        Returns:
+            - A new User instance, or None if the user is not cached or the entry expired.
+        """
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        return User.from_db("default", self.field_names, values)
+
+    def set(self, user_id, user):
+        values = tuple(getattr(user, name) for name in self.field_names)
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Receiver of the post_save and post_delete signals of the User model, e.g. when a user is deactivated.
+    """
+    user_cache.invalidate(str(instance.pk))
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    UserRefreshToken class, a refresh token whose access tokens carry the USER_CLAIMS,
+    so that CachedJWTAuthentication can build the user from them with JWT_USER_FROM_CLAIMS.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["username"] = user.username
+        token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        token["date_joined"] = user.date_joined.isoformat()
+        return token
+
+
+def get_claims_user(validated_token):
+    """
+    Method to build the user of a token from its claims, without the database.
+    The User is not loaded, only its id, username, email, is_staff and date_joined are set,
+    which is what the views read, and it can be used in queries and as a foreign key.
+    Returns:
+        - The User, or None if the token was issued without the USER_CLAIMS.
+    """
+    if any(claim not in validated_token for claim in USER_CLAIMS):
+        return None
+    user = User(
+        id=validated_token[api_settings.USER_ID_CLAIM],
+        username=validated_token["username"],
+        email=validated_token["email"],
+        is_staff=validated_token["is_staff"],
+        date_joined=parse_datetime(validated_token["date_joined"]),
+        is_active=True,
+    )
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    CachedJWTAuthentication class, the JWTAuthentication of simplejwt without the User query of every request.
+
+    With JWT_USER_FROM_CLAIMS the user is built from the claims of the token. Otherwise, or for
+    tokens issued without the claims, the user is read from the user_cache and only loaded from
+    the database when it is missing or expired, with the checks of JWTAuthentication.
+    In both cases the tokens revoked by a logout are refused, see user_api.revocation.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_("Token is revoked"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if settings.JWT_USER_FROM_CLAIMS:
+            user = get_claims_user(validated_token)
+            if user is not None:
+                return user
+
+        user = user_cache.get(user_id)
+        if user is None:
+            # Inactive and unknown users are refused and not cached
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+            return user
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed")
+        return user
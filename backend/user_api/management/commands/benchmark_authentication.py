@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from user_api.authentication import CachedJWTAuthentication, UserRefreshToken, user_cache
+from user_api.models import User
+
+
+class Command(BaseCommand):
+    """
+    Command to measure the time and the queries the authentication of a request costs with
+    the JWTAuthentication of simplejwt, with the user cache and with the token claims user.
+    """
+
+    help = ("Authenticate the same access token many times with every authentication and report "
+            "the time and the number of queries per request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="The email of the user the token is issued to")
+        parser.add_argument("--requests", type=int, default=10000, help="The number of requests per authentication")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options["user"]).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} does not exist")
+        token = str(UserRefreshToken.for_user(user).access_token)
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        user_cache.clear()
+        self.stdout.write(f"{'authentication':<20}{'us/request':>12}{'queries/request':>17}")
+        for name, authentication, from_claims in (
+                ("jwt", JWTAuthentication(), False),
+                ("cached", CachedJWTAuthentication(), False),
+                ("claims", CachedJWTAuthentication(), True)):
+            with override_settings(JWT_USER_FROM_CLAIMS=from_claims):
+                elapsed, queries = self.run(authentication, request, options["requests"])
+            self.stdout.write(f"{name:<20}{elapsed / options['requests'] * 1e6:>12.1f}"
+                              f"{queries / options['requests']:>17.3f}")
+
+    def run(self, authentication, request, requests):
+        """
+        Method to authenticate the request many times.
+        Returns:
+            - The total time in seconds and the number of queries, counted on a separate run
+              since capturing the queries slows them down.
+        """
+        started = time.perf_counter()
+        for _ in range(requests):
+            authentication.authenticate(Request(request))
+        elapsed = time.perf_counter() - started
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                authentication.authenticate(Request(request))
+        return elapsed, len(queries)
@@ -3,3 +3,29 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(verbose_name='emails', unique=True, max_length=255)
+
+
+class RevokedToken(models.Model):
+    """
+    RevokedToken model
+
+    Define a token that was revoked before it expired, e.g. when the user signed out:
+    - jti: The unique identifier claim of the token
+    - user: The user the token was issued to
+    - expires_at: When the token expires, after which the row is no longer needed
+    - revoked_at: When the token was revoked, read by the periodic refresh of the revocation filters
+
+    The rows are loaded in the Bloom filter of user_api.revocation, which is checked on every
+    authenticated request before the table.
+
+    The __str__ method returns a string representation of the revoked token.
+    - Token {jti} of {user}
+    """
+
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="revoked_tokens")
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Token {self.jti} of {self.user}"
@@ -0,0 +1,156 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+# Revocations committed this long before the last refresh are read again by the next one,
+# for the transactions that were still running and the clocks of the other servers
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+class BloomFilter:
+    """
+    BloomFilter class, a set of strings that answers "maybe" or "no" in a fixed number of bits.
+
+    The bits and the number of hashes are computed from the capacity and the false positive rate:
+    a filter holding up to ``capacity`` items reports an item it does not hold with a probability
+    of ``error_rate``. Items cannot be removed, the filter is rebuilt instead.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        # Double hashing, the positions of the item are h1 + i * h2
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RevocationList:
+    """
+    RevocationList class, the revoked tokens of the RevokedToken table behind a Bloom filter.
+
+    Most tokens are not revoked, and the filter tells so without a query; the table is only
+    read when the filter reports a possible match. The filter is loaded from the table on the
+    first check of the process, the revocations of the other processes are added to it every
+    JWT_REVOCATION_REFRESH seconds, and it is rebuilt every rebuild_interval seconds, or when it
+    holds more than its capacity, to drop the expired tokens. A refresh is done by the request
+    that finds the filter stale, the concurrent requests keep using the current filter.
+    """
+
+    rebuild_interval = 3600
+
+    def __init__(self, capacity, error_rate, refresh):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh
+        self.filter = None
+        self.since = None
+        self.refreshed_at = 0
+        self.rebuilt_at = 0
+        self.lock = threading.Lock()
+
+    def rebuild(self):
+        """
+        Method to load the tokens that are revoked and not expired yet in a new filter.
+        """
+        since = timezone.now()
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=since).values_list("jti", flat=True))
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter = bloom
+        self.since = since
+        self.refreshed_at = self.rebuilt_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Method to add the tokens revoked since the last refresh, by any process, to the filter.
+        """
+        since = timezone.now()
+        for jti in RevokedToken.objects.filter(revoked_at__gte=self.since - REFRESH_OVERLAP).values_list(
+                "jti", flat=True):
+            self.filter.add(jti)
+        self.since = since
+        self.refreshed_at = time.monotonic()
+
+    def get_filter(self):
+        if self.filter is None:
+            with self.lock:
+                if self.filter is None:
+                    self.rebuild()
+        elif time.monotonic() - self.refreshed_at >= self.refresh_interval and self.lock.acquire(blocking=False):
+            try:
+                if time.monotonic() - self.rebuilt_at >= self.rebuild_interval or \
+                        self.filter.count > self.filter.capacity:
+                    self.rebuild()
+                elif time.monotonic() - self.refreshed_at >= self.refresh_interval:
+                    self.refresh()
+            finally:
+                self.lock.release()
+        return self.filter
+
+    def is_revoked(self, jti):
+        """
+        Method to check if a token is revoked.
+        Parameters:
+            - jti: The jti claim of the token, None for the tokens issued without one.
+        Returns:
+            - True if the token is in the RevokedToken table, which is only queried when the filter may hold it.
+        """
+        if jti is None or jti not in self.get_filter():
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def add(self, jti):
+        # The revocations of this process are checked immediately, without waiting for the refresh
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def clear(self):
+        with self.lock:
+            self.filter = None
+
+
+revocation_list = RevocationList(settings.JWT_REVOCATION_CAPACITY, settings.JWT_REVOCATION_ERROR_RATE,
+                                 settings.JWT_REVOCATION_REFRESH)
+
+
+def revoke_tokens(user, tokens):
+    """
+    Method to revoke tokens of a user before they expire.
+    The expired revocations of the user are deleted at the same time, they are no longer needed.
+    Parameters:
+        - user: The user the tokens were issued to.
+        - tokens: The validated access and refresh tokens to revoke.
+    """
+    RevokedToken.objects.filter(user=user, expires_at__lte=timezone.now()).delete()
+    RevokedToken.objects.bulk_create([
+        RevokedToken(user=user, jti=token[api_settings.JTI_CLAIM], expires_at=datetime_from_epoch(token["exp"]))
+        for token in tokens
+    ], ignore_conflicts=True)
+    for token in tokens:
+        revocation_list.add(token[api_settings.JTI_CLAIM])
@@ -62,4 +62,9 @@ class SigninSerializer(serializers.ModelSerializer):
 
 class ValidateTokenSerializer(serializers.Serializer):
 
-    token = serializers.CharField(max_length=255)
\ No newline at end of file
+    token = serializers.CharField(max_length=1024)
+
+
+class LogoutSerializer(serializers.Serializer):
+
+    refresh_token = serializers.CharField(max_length=1024, required=False)
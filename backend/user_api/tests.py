@@ -1,8 +1,23 @@
+import time
+from datetime import timedelta
+from io import StringIO
+
 from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework import status
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from .authentication import CachedJWTAuthentication, UserCache, user_cache
+from .models import RevokedToken
+from .revocation import BloomFilter, revocation_list
+
 User = get_user_model()
 
 
@@ -179,3 +194,196 @@ class UserTests(APITestCase):
                          status.HTTP_400_BAD_REQUEST)
         self.assertIn("Token is invalid or expired",
                       validation_response.data['message'])
+
+
+class TestCachedJWTAuthentication(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cacheduser', email='cacheduser@domain.com', password='Testpassword123!')
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        revocation_list.rebuild()
+        self.addCleanup(revocation_list.clear)
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return CachedJWTAuthentication().authenticate(Request(request))[0]
+
+    def signin(self):
+        response = self.client.post(reverse('auth-signin'), {
+            'username': 'cacheduser', 'password': 'Testpassword123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']['access_token']
+
+    def test_cached_user_skips_the_user_query(self):
+        """
+        Test that the user is loaded once, then read from the cache.
+        """
+        token = self.signin()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token).id, self.user.id)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.email, 'cacheduser@domain.com')
+
+        response = self.client.get(reverse('email-counters'), HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_saved_user_is_invalidated(self):
+        """
+        Test that a deactivated user is refused, although it was cached.
+        """
+        token = self.signin()
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_deleted_user_is_invalidated(self):
+        token = self.signin()
+        self.authenticate(token)
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_entries_expire_and_are_bounded(self):
+        """
+        Test that the entries of the cache expire after the TTL and that the least recently used is evicted.
+        """
+        cache = UserCache(size=2, ttl=60)
+        other = User.objects.create_user(username='other', email='other@domain.com', password='x')
+        third = User.objects.create_user(username='third', email='third@domain.com', password='x')
+        cache.set('1', self.user)
+        cache.set('2', other)
+        self.assertEqual(cache.get('1').username, 'cacheduser')
+        cache.set('3', third)
+        self.assertIsNone(cache.get('2'))
+        self.assertEqual(cache.get('1').username, 'cacheduser')
+        self.assertEqual(cache.get('3').username, 'third')
+        self.assertIsNot(cache.get('1'), cache.get('1'))
+
+        cache = UserCache(size=2, ttl=0)
+        cache.set('1', self.user)
+        time.sleep(0.001)
+        self.assertIsNone(cache.get('1'))
+
+    def test_user_from_claims(self):
+        """
+        Test that JWT_USER_FROM_CLAIMS builds the user from the claims of the signin token, without any query.
+        """
+        token = self.signin()
+        claims = AccessToken(token)
+        self.assertEqual(claims['username'], 'cacheduser')
+        self.assertEqual(claims['email'], 'cacheduser@domain.com')
+
+        with override_settings(JWT_USER_FROM_CLAIMS=True):
+            with self.assertNumQueries(0):
+                user = self.authenticate(token)
+            self.assertEqual(user.id, self.user.id)
+            self.assertEqual(user.username, 'cacheduser')
+            self.assertEqual(user.date_joined, self.user.date_joined)
+
+            response = self.client.get(reverse('email-counters'), HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            # Tokens issued without the claims fall back to the cache
+            token = str(RefreshToken.for_user(self.user).access_token)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.authenticate(token).id, self.user.id)
+
+    def test_benchmark_authentication(self):
+        output = StringIO()
+        call_command('benchmark_authentication', '--user', 'cacheduser@domain.com', '--requests', '5',
+                     stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['jwt', 'cached', 'claims'])
+
+
+class TestTokenRevocation(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='revokeduser', email='revokeduser@domain.com', password='Testpassword123!')
+        revocation_list.rebuild()
+        self.addCleanup(revocation_list.clear)
+
+    def signin(self):
+        response = self.client.post(reverse('auth-signin'), {
+            'username': 'revokeduser', 'password': 'Testpassword123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']['access_token'], response.data['data']['refresh_token']
+
+    def validate(self, token):
+        return CachedJWTAuthentication().get_validated_token(token.encode())
+
+    def test_logout_revokes_the_tokens(self):
+        """
+        Test the user API-logout, the access and the refresh tokens are refused afterwards.
+        """
+        access_token, refresh_token = self.signin()
+        other_access_token, _ = self.signin()
+        response = self.client.post(reverse('auth-logout'), {'refresh_token': refresh_token}, format='json',
+                                    HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(RevokedToken.objects.values_list('jti', flat=True)),
+                         {AccessToken(access_token)['jti'], RefreshToken(refresh_token)['jti']})
+
+        response = self.client.get(reverse('email-counters'), HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('auth-validate-token'), {'token': access_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Token is revoked')
+
+        # The other sessions of the user are not signed out
+        response = self.client.get(reverse('email-counters'), HTTP_AUTHORIZATION=f'Bearer {other_access_token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_requires_authentication(self):
+        response = self.client.post(reverse('auth-logout'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_with_refresh_token_of_another_user(self):
+        other = User.objects.create_user(username='other', email='other@domain.com', password='x')
+        access_token, _ = self.signin()
+        response = self.client.post(reverse('auth-logout'), {'refresh_token': str(RefreshToken.for_user(other))},
+                                    format='json', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_filter_skips_the_table(self):
+        """
+        Test that the tokens that are not revoked are checked without a query.
+        """
+        RevokedToken.objects.create(user=self.user, jti='revoked', expires_at=timezone.now() + timedelta(days=1))
+        revocation_list.rebuild()
+        access_token, _ = self.signin()
+        with self.assertNumQueries(0):
+            self.validate(access_token)
+        with self.assertNumQueries(1):
+            self.assertTrue(revocation_list.is_revoked('revoked'))
+
+    def test_refresh_adds_the_revocations_of_other_workers(self):
+        """
+        Test that a token revoked by another worker is refused after the refresh of the filter,
+        and that the rebuild drops the expired tokens.
+        """
+        access_token, _ = self.signin()
+        jti = AccessToken(access_token)['jti']
+        RevokedToken.objects.create(user=self.user, jti=jti, expires_at=timezone.now() + timedelta(days=1))
+        RevokedToken.objects.create(user=self.user, jti='expired', expires_at=timezone.now() - timedelta(days=1))
+        self.validate(access_token)
+        revocation_list.refresh()
+        with self.assertRaises(InvalidToken):
+            self.validate(access_token)
+        revocation_list.rebuild()
+        self.assertNotIn('expired', revocation_list.filter)
+        self.assertIn(jti, revocation_list.filter)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.001)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'valid-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
@@ -1,18 +1,21 @@
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 
 from django.contrib.auth import authenticate
 
-from .serializers import SignupSerializer, SigninSerializer, UserSerializer, ValidateTokenSerializer
+from .authentication import UserRefreshToken
+from .revocation import revocation_list, revoke_tokens
+from .serializers import LogoutSerializer, SignupSerializer, SigninSerializer, UserSerializer, ValidateTokenSerializer
 
 class AuthViewSet(GenericViewSet):
     """
-    AuthViewSet class  for user authentication and authorization operations such as signup, signin and token validation. 
+    AuthViewSet class  for user authentication and authorization operations such as signup, signin, logout and token validation. 
     """
     def get_serializer_class(self):
         """
@@ -24,6 +27,8 @@ class AuthViewSet(GenericViewSet):
             return SignupSerializer
         elif self.action == 'signin':
             return SigninSerializer
+        elif self.action == 'logout':
+            return LogoutSerializer
         else:
             return ValidateTokenSerializer
 
@@ -43,7 +48,7 @@ class AuthViewSet(GenericViewSet):
                 user.set_password(request.data['password'])
                 user.save()
                 user_data = UserSerializer(user).data
-                refresh = RefreshToken.for_user(user)
+                refresh = UserRefreshToken.for_user(user)
                 return Response(
                     {
                         "message": "User registered successfully",
@@ -81,7 +86,7 @@ class AuthViewSet(GenericViewSet):
             password = serializer.validated_data.get('password')
             user = authenticate(request, username=username, password=password)
             if user:
-                refresh = RefreshToken.for_user(user)
+                refresh = UserRefreshToken.for_user(user)
                 user_data = UserSerializer(user).data
                 return Response(
                         {
@@ -136,6 +141,15 @@ class AuthViewSet(GenericViewSet):
         try:
             valid_token = AccessToken(token_serializer.data['token'])
             valid_token.check_exp()
+            if revocation_list.is_revoked(valid_token.get(api_settings.JTI_CLAIM)):
+                return Response(
+                    {
+                        "message": "Token is revoked",
+                        "success": False,
+                        "status": status.HTTP_400_BAD_REQUEST
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
             return Response(
                 {
                     "message": "Token is valid",
@@ -153,3 +167,56 @@ class AuthViewSet(GenericViewSet):
                 }, 
                 status=status.HTTP_400_BAD_REQUEST
                 )
+
+    @action (detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def logout(self, request):
+        """
+        Method to sign out, by revoking the access token of the request and the refresh token.
+        The revoked tokens are refused until they expire, see user_api.revocation.
+        Parameters:
+        request: The request object with the access token in the Authorization header and the optional refresh_token.
+        Returns:
+        Response object with a message indicating if the tokens were revoked.
+        """
+        serializer = LogoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "message": serializer.errors,
+                    "success": False,
+                    "status": status.HTTP_400_BAD_REQUEST
+                },
+                status=status.HTTP_400_BAD_REQUEST
+                )
+        tokens = [request.auth]
+        if 'refresh_token' in serializer.validated_data:
+            try:
+                refresh = RefreshToken(serializer.validated_data['refresh_token'])
+            except TokenError as e:
+                return Response(
+                    {
+                        "message": str(e),
+                        "success": False,
+                        "status": status.HTTP_400_BAD_REQUEST
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+            if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response(
+                    {
+                        "message": "Refresh token was not issued to the user",
+                        "success": False,
+                        "status": status.HTTP_400_BAD_REQUEST
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+            tokens.append(refresh)
+        revoke_tokens(request.user, tokens)
+        return Response(
+            {
+                "message": "Logout successful",
+                "success": True,
+                "status": status.HTTP_200_OK
+            },
+            status=status.HTTP_200_OK
+            )